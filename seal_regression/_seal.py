@@ -0,0 +1,27 @@
+"""
+Optional import of PySEAL. Without it the package stays importable (e.g. for seal_regression.simulation), and SEAL
+objects raise ImportError as soon as they are created.
+"""
+_NAMES = ['Ciphertext', 'Decryptor', 'Encryptor', 'EncryptionParameters', 'EvaluationKeys', 'Evaluator',
+          'FractionalEncoder', 'GaloisKeys', 'KeyGenerator', 'Plaintext', 'PolyCRTBuilder', 'PublicKey', 'SEALContext',
+          'SecretKey', 'SmallModulus']
+
+try:
+    from seal import Ciphertext, Decryptor, Encryptor, EncryptionParameters, EvaluationKeys, Evaluator, \
+        FractionalEncoder, GaloisKeys, KeyGenerator, Plaintext, PolyCRTBuilder, PublicKey, SEALContext, SecretKey, \
+        SmallModulus, dbc_max
+    HAVE_SEAL = True
+except ImportError:
+    HAVE_SEAL = False
+
+    def _missing(*args, **kwargs):
+        raise ImportError('PySEAL is not installed, see install_pyseal.sh')
+
+    class _Unavailable:
+        # Placeholder classes keep type checks like type(x) == Ciphertext working
+        def __init__(self, *args, **kwargs):
+            _missing()
+
+    dbc_max = _missing
+    for _name in _NAMES:
+        globals()[_name] = type(_name, (_Unavailable,), {})
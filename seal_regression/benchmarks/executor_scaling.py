@@ -0,0 +1,92 @@
+from seal_regression.fractions_utils import FracContext, FractionalEncoderUtils
+from seal_regression.encarray import EncArray
+from seal_regression.executor import ProcessExecutor, ThreadExecutor
+from seal_regression.gradient import ResidualGradientEngine
+from seal_regression.main import generate_dataset
+from seal_regression.sharded import ShardedGradientEngine
+
+from time import time
+import argparse
+import os
+
+
+def time_workload(encode_utils: FractionalEncoderUtils, X, y) -> dict:
+    """
+    Times main.py-style workload: encryption of the dataset, element-wise product, sum, matrix product and one
+    gradient of SecureLinearRegression.fit
+    :return: seconds per stage
+    """
+    timings = {}
+    start = time()
+    X_enc, y_enc = EncArray.from_numpy(X, encode_utils), EncArray.from_numpy(y, encode_utils)
+    timings['encrypt'] = time() - start
+
+    start = time()
+    product = X_enc * X_enc
+    timings['multiply'] = time() - start
+
+    start = time()
+    product.T[0].sum()
+    timings['sum'] = time() - start
+
+    weights = EncArray(X.shape[1] * [0.5], enc_utils=encode_utils)
+    start = time()
+    X_enc @ EncArray._wrap([[weight] for weight in weights.enc_arr], enc_utils=encode_utils)
+    timings['matmul'] = time() - start
+
+    start = time()
+    ResidualGradientEngine(X_enc, y_enc).gradient(weights)
+    timings['gradient'] = time() - start
+    return timings
+
+
+def time_sharded(encode_utils: FractionalEncoderUtils, X, y, n_shards: int) -> dict:
+    """
+    Times ShardedGradientEngine with local worker processes: setup (serialization of row blocks and start of
+    workers) and one gradient, the counterpart of the 'gradient' stage of time_workload
+    :return: seconds per stage
+    """
+    X_enc, y_enc = EncArray.from_numpy(X, encode_utils), EncArray.from_numpy(y, encode_utils)
+    weights = EncArray(X.shape[1] * [0.5], enc_utils=encode_utils)
+    start = time()
+    with ShardedGradientEngine(X_enc, y_enc, n_shards=n_shards) as engine:
+        timings = {'setup': time() - start}
+        start = time()
+        engine.gradient(weights)
+        timings['gradient'] = time() - start
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scaling of EncArray executors with the number of cores')
+    parser.add_argument('--n_samples', type=int, default=100)
+    parser.add_argument('--n_features', type=int, default=4)
+    parser.add_argument('--executor', choices=['process', 'thread', 'sharded'], default='process')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    args = parser.parse_args()
+
+    context = FracContext()
+    encode_utils = FractionalEncoderUtils(context)
+    X, y = generate_dataset(args.n_samples, args.n_features, 15)
+
+    serial = time_workload(encode_utils, X, y)
+    print(f'serial: {serial}')
+    for n_workers in [n for n in args.workers if n <= os.cpu_count()]:
+        if args.executor == 'sharded':
+            timings = time_sharded(encode_utils, X, y, n_workers)
+            print(f'sharded x{n_workers}: {timings}. Speedup of gradient: '
+                  f'{round(serial["gradient"] / timings["gradient"], 2)}')
+            continue
+        if args.executor == 'process':
+            encode_utils.executor = ProcessExecutor(encode_utils, n_workers)
+        else:
+            encode_utils.executor = ThreadExecutor(n_workers)
+        with encode_utils.executor:
+            timings = time_workload(encode_utils, X, y)
+        encode_utils.executor = None
+        speedups = {stage: round(serial[stage] / timings[stage], 2) for stage in timings}
+        print(f'{args.executor} x{n_workers}: {timings}. Speedup: {speedups}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+from seal_regression.fractions_utils import FracContext, FractionalEncoderUtils, RelinearizationPolicy
+from seal_regression.encarray import EncArray
+from seal_regression._seal import Plaintext
+
+from statistics import median
+from time import perf_counter
+import argparse
+import numpy as np
+
+
+def legacy_matmul(a: EncArray, b: EncArray) -> EncArray:
+    """
+    Matrix product as __matmul__ computed it before the dot kernel: an EncArray of element-wise products and another
+    one of their sum per output element, every product relinearized by the policy. Encoded elements of b (Plaintext
+    dtype) are multiplied with multiply_plain
+    """
+    enc_utils = a.enc_utils
+
+    def multiply(ele_a, ele_b):
+        if type(ele_b) == Plaintext:
+            return enc_utils.multiply_plain(ele_a, ele_b)
+        return enc_utils.multiply(ele_a, ele_b)
+
+    return EncArray._wrap([[enc_utils.sum_enc_array([multiply(ele_a, ele_b) for ele_a, ele_b in zip(row_a, col_b)])
+                            for col_b in b.T.enc_arr]
+                           for row_a in a.enc_arr], enc_utils)
+
+
+def legacy_sum_columns(a: EncArray) -> EncArray:
+    """
+    Sums of columns of a 2D array with the former 1D-only sum
+    """
+    return EncArray._wrap([a.T[j].sum().enc_arr for j in range(a.shape[1])], a.enc_utils)
+
+
+def measure(fun, enc_utils: FractionalEncoderUtils, repeats: int) -> tuple:
+    """
+    :return: median time in seconds and homomorphic operations of one call
+    """
+    times = []
+    for _ in range(repeats):
+        counts_before = enc_utils.op_counts.copy()
+        start = perf_counter()
+        fun()
+        times.append(perf_counter() - start)
+        op_counts = enc_utils.op_counts - counts_before
+    return median(times), dict(op_counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Speedup of the reduction and dot product kernels of EncArray')
+    parser.add_argument('--n_rows', type=int, default=8)
+    parser.add_argument('--n_cols', type=int, default=8)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--policies', nargs='+', default=['always', 'never'])
+    args = parser.parse_args()
+
+    context = FracContext(verbose=False)
+    rng = np.random.RandomState(0)
+    A, B = rng.uniform(-1, 1, (args.n_rows, args.n_cols)), rng.uniform(-1, 1, (args.n_cols, args.n_rows))
+
+    for mode in args.policies:
+        enc_utils = FractionalEncoderUtils(context, relin_policy=RelinearizationPolicy(mode))
+        A_enc, B_enc = EncArray.from_numpy(A, enc_utils), EncArray.from_numpy(B, enc_utils)
+        B_plain = EncArray.from_numpy(B, enc_utils, dtype=Plaintext)
+        kernels = [
+            ('matmul', lambda: legacy_matmul(A_enc, B_enc), lambda: A_enc @ B_enc),
+            ('matmul plain', lambda: legacy_matmul(A_enc, B_plain), lambda: A_enc @ B_plain),
+            ('matvec', lambda: legacy_matmul(A_enc, B_enc[:, :1]), lambda: A_enc @ B_enc.T[0]),
+            ('sum axis=0', lambda: legacy_sum_columns(A_enc), lambda: A_enc.sum(axis=0)),
+        ]
+        print(f'Relinearization policy: {mode}')
+        for name, legacy, current in kernels:
+            legacy_time, legacy_ops = measure(legacy, enc_utils, args.repeats)
+            current_time, current_ops = measure(current, enc_utils, args.repeats)
+            print(f'  {name:14} legacy: {legacy_time:8.4f}s {legacy_ops}')
+            print(f'  {"":14} kernel: {current_time:8.4f}s {current_ops}. Speedup: {legacy_time / current_time:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
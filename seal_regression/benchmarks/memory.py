@@ -0,0 +1,72 @@
+from seal_regression.fractions_utils import FracContext, FractionalEncoderUtils
+from seal_regression.encarray import EncArray
+from seal_regression.linear_regression import SecureLinearRegression
+from seal_regression.main import generate_dataset
+from seal_regression.pool import CiphertextPool, MemoryProfiler
+
+from copy import deepcopy
+from time import perf_counter
+import argparse
+
+
+def peak_in_use(context: FracContext, X, y, n_iter: int, pool: CiphertextPool = None) -> tuple:
+    """
+    Runs fit under MemoryProfiler
+    :return: peak ciphertexts in use per iteration, ciphertexts allocated by operations per iteration
+    """
+    encode_utils = FractionalEncoderUtils(context, pool=pool)
+    X_enc, y_enc = EncArray.from_numpy(X, encode_utils), EncArray.from_numpy(y, encode_utils)
+    profiler = MemoryProfiler()
+    with profiler.profile(encode_utils):
+        SecureLinearRegression().fit(X_enc, y_enc, n_iter=n_iter)
+    peaks, allocations = profiler.peaks(), profiler.allocations()
+    iterations = [f'iteration {it}' for it in range(n_iter)]
+    return [peaks.get(it, 0) for it in iterations], [allocations.get(it, 0) for it in iterations]
+
+
+def copy_seconds(context: FracContext, n_copies: int) -> dict:
+    """
+    Time of copying a ciphertext into a new one with deepcopy (operations without a pool) and into a recycled one
+    with FractionalEncoderUtils.assign (operations with a pool)
+    :return: seconds per copy of both
+    """
+    encode_utils = FractionalEncoderUtils(context, pool=CiphertextPool())
+    source = encode_utils.encrypt_num(0.5)
+    destination = encode_utils.encrypt_num(0.0)
+    start = perf_counter()
+    for _ in range(n_copies):
+        deepcopy(source)
+    deepcopy_seconds = (perf_counter() - start) / n_copies
+    start = perf_counter()
+    for _ in range(n_copies):
+        encode_utils.assign(destination, source)
+    return {'deepcopy': deepcopy_seconds, 'assign': (perf_counter() - start) / n_copies}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Peak ciphertexts in use per iteration of fit, with and without '
+                                                 'a ciphertext pool')
+    parser.add_argument('--n_samples', type=int, default=20)
+    parser.add_argument('--n_features', type=int, default=2)
+    parser.add_argument('--n_iter', type=int, default=3)
+    parser.add_argument('--n_copies', type=int, default=200)
+    args = parser.parse_args()
+
+    context = FracContext(verbose=False)
+    X, y = generate_dataset(args.n_samples, args.n_features, 15)
+    before, allocations = peak_in_use(context, X, y, args.n_iter)
+    pool = CiphertextPool()
+    after, _ = peak_in_use(context, X, y, args.n_iter, pool)
+
+    print(f'Dataset: {X.size + y.size} ciphertexts')
+    for it in range(args.n_iter):
+        print(f'Iteration: {it}. Peak ciphertexts in use: {before[it]} without pool ({allocations[it]} '
+              f'allocations), {after[it]} with pool')
+    print(f'Pool: {pool.stats()}')
+    copies = copy_seconds(context, args.n_copies)
+    print(f'Copy of a ciphertext: {1e6 * copies["deepcopy"]:.1f} us with deepcopy, '
+          f'{1e6 * copies["assign"]:.1f} us with assign into a pooled ciphertext')
+
+
+if __name__ == '__main__':
+    main()
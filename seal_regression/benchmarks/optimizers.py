@@ -0,0 +1,99 @@
+from seal_regression.fractions_utils import FracContext, FractionalEncoderUtils, FractionalDecryptorUtils
+from seal_regression.encarray import EncArray
+from seal_regression.linear_regression import SecureLinearRegression
+from seal_regression.optimizers import ChebyshevInverse, DiagonalPreconditioned, GradientDescent, Nesterov
+from seal_regression.simulation import SimArray, SimUtils
+
+import argparse
+import numpy as np
+
+
+def make_dataset(n_samples: int, scales: list, noise=0.1, seed=0) -> tuple:
+    """
+    Poorly conditioned regression problem: columns of very different scales plus an intercept
+    """
+    rng = np.random.RandomState(seed)
+    X = np.hstack([rng.randn(n_samples, len(scales)) * np.asarray(scales), np.ones((n_samples, 1))])
+    y = X @ rng.uniform(-1, 1, X.shape[1]) + noise * rng.randn(n_samples)
+    return X, y.reshape(-1, 1)
+
+
+def optimizers(X: np.ndarray, n_iter: int) -> dict:
+    """
+    Optimizers to compare, tuned with what the data owner knows in plaintext: column scales and eigenvalues of
+    X^T X / n (here computed exactly, in practice bounded from the scales)
+    """
+    eigenvalues = np.linalg.eigvalsh(X.T @ X / X.shape[0])
+    low, high = eigenvalues[0], eigenvalues[-1]
+    condition = high / low
+    return {
+        'gd': None,
+        'nesterov': Nesterov(lr=1 / high, momentum=(np.sqrt(condition) - 1) / (np.sqrt(condition) + 1)),
+        'diagonal': DiagonalPreconditioned(DiagonalPreconditioned.scales(X), lr=0.5),
+        'chebyshev': ChebyshevInverse((low, high), n_iter),
+    }
+
+
+def loss(X: np.ndarray, y: np.ndarray, weights) -> float:
+    return float(np.mean((X @ np.asarray(weights, dtype=float).ravel() - y[:, 0]) ** 2))
+
+
+def iterations_to(X: np.ndarray, y: np.ndarray, name: str, target: float, max_iter: int, lr: float) -> int:
+    """
+    Smallest number of unencrypted iterations, after which the loss is below target (None if not reached)
+    """
+    for n_iter in range(1, max_iter + 1):
+        model = SecureLinearRegression()
+        model.fit_unencrypted(X, y, lr=lr, n_iter=n_iter, optimizer=optimizers(X, n_iter)[name])
+        if loss(X, y, model.weigths) <= target:
+            return n_iter
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Accelerated optimizers against plain gradient descent')
+    parser.add_argument('--n_samples', type=int, default=50)
+    parser.add_argument('--scales', type=float, nargs='+', default=[3.0, 0.3])
+    parser.add_argument('--n_iter', type=int, default=4,
+                        help='number of encrypted iterations, limited by plaintext coefficient growth')
+    parser.add_argument('--max_iter', type=int, default=200)
+    parser.add_argument('--tolerance', type=float, default=0.05, help='relative excess loss over least squares')
+    parser.add_argument('--encrypted', action='store_true', help='also run encrypted fit (needs PySEAL)')
+    args = parser.parse_args()
+
+    X, y = make_dataset(args.n_samples, args.scales)
+    least_squares = loss(X, y, np.linalg.lstsq(X, y[:, 0], rcond=None)[0])
+    target = least_squares * (1 + args.tolerance)
+    lr = 1 / np.linalg.eigvalsh(X.T @ X / X.shape[0])[-1]
+    sim_utils = SimUtils(plain_modulus=1 << 60, coef_modulus_n_primes=40)
+    print(f'Least-squares loss: {least_squares:.4f}')
+
+    for name, optimizer in optimizers(X, args.n_iter).items():
+        model = SecureLinearRegression()
+        model.fit_unencrypted(X, y, lr=lr, n_iter=args.n_iter, optimizer=optimizer)
+        cost = (optimizer or GradientDescent(lr)).step_cost(sim_utils, *X.shape, max_value=np.abs(X).max())
+        print(f'{name:10} loss after {args.n_iter} iterations: {loss(X, y, model.weigths):.4f}. '
+              f'Iterations to {target:.4f}: {iterations_to(X, y, name, target, args.max_iter, lr)}. '
+              f'Per step: depth {cost["depth"]}, {cost["plain_multiplications"]} plaintext multiplications, '
+              f'{cost["noise_bits"]:.0f} bits of noise budget, {cost["coeff_bits"]:.1f} bits of coefficient growth '
+              f'({cost["max_steps"]} steps before a refresh)')
+
+        model = SecureLinearRegression()
+        model.fit(SimArray(X, sim_utils), SimArray(y, sim_utils), lr=lr, n_iter=args.n_iter,
+                  optimizer=optimizers(X, args.n_iter)[name])
+        # nan marks weights, which would not decrypt correctly (noise budget or plaintext coefficients exhausted)
+        print(f'{"":10} simulated: loss {loss(X, y, model.weigths.decrypt_array()):.4f}, '
+              f'noise budget left {np.min(model.weigths.noise_budget()):.0f} bits')
+
+        if args.encrypted:
+            context = FracContext(coef_modulus_n_primes=40, plain_modulus=1 << 60, verbose=False)
+            encode_utils, decode_utils = FractionalEncoderUtils(context), FractionalDecryptorUtils(context)
+            model = SecureLinearRegression()
+            model.fit(EncArray.from_numpy(X, encode_utils), EncArray.from_numpy(y, encode_utils), lr=lr,
+                      n_iter=args.n_iter, optimizer=optimizers(X, args.n_iter)[name])
+            print(f'{"":10} encrypted: loss {loss(X, y, model.weigths.decrypt_array(decode_utils)):.4f}, '
+                  f'noise budget left {np.min(model.weigths.noise_budget(decode_utils)):.0f} bits')
+
+
+if __name__ == '__main__':
+    main()
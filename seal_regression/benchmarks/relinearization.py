@@ -0,0 +1,37 @@
+from seal_regression.fractions_utils import FracContext, FractionalEncoderUtils, FractionalDecryptorUtils, \
+    RelinearizationPolicy
+from seal_regression.encarray import EncArray
+from seal_regression.linear_regression import SecureLinearRegression
+from seal_regression.main import generate_dataset
+
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time/memory trade-off of relinearization policies in fit')
+    parser.add_argument('--n_samples', type=int, default=7)
+    parser.add_argument('--n_features', type=int, default=1)
+    parser.add_argument('--n_iter', type=int, default=3)
+    parser.add_argument('--dbc', type=int, nargs='+', default=[60, 30])
+    args = parser.parse_args()
+
+    context = FracContext()
+    decode_utils = FractionalDecryptorUtils(context)
+    X, y = generate_dataset(args.n_samples, args.n_features, 15)
+    policies = [RelinearizationPolicy('never'), RelinearizationPolicy('always'), RelinearizationPolicy('lazy'),
+                RelinearizationPolicy('size', max_size=4)]
+
+    for dbc in args.dbc:
+        for policy in policies:
+            encode_utils = FractionalEncoderUtils(context, relin_policy=policy, decomposition_bit_count=dbc)
+            X_enc, y_enc = EncArray.from_numpy(X, encode_utils), EncArray.from_numpy(y, encode_utils)
+            model = SecureLinearRegression()
+            model.fit(X_enc, y_enc, n_iter=args.n_iter)
+            print(f'{policy}, dbc={dbc}. Noise budget: {model.weigths.noise_budget(decode_utils)}')
+            for it, record in enumerate(model.history):
+                print(f'  Iteration: {it}. Time: {record["time"]:.2f}s. Size of weights: {record["weights_size"]}. '
+                      f'Relinearizations: {record["relinearizations"]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+from seal_regression.fractions_utils import FracContext, FractionalEncoderUtils, FractionalDecryptorUtils
+from seal_regression.encarray import EncArray
+from seal_regression.linear_regression import SecureLinearRegression
+from seal_regression.main import generate_dataset
+from seal_regression.serialization import to_bytes
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from statistics import median
+from time import perf_counter
+import argparse
+import datetime
+import json
+import multiprocessing
+import platform
+import resource
+import subprocess
+import sys
+
+# Parameter grids, swept as a full product
+FULL_GRID = dict(poly_modulus=['1x^1024 + 1', '1x^2048 + 1', '1x^4096 + 1'], n_primes=[10, 20],
+                 n_samples=[10, 50], n_features=[1, 3])
+SMOKE_GRID = dict(poly_modulus=['1x^1024 + 1'], n_primes=[20], n_samples=[5], n_features=[1])
+# Metrics, for which larger values are better; for the rest (times, memory) smaller values are better
+HIGHER_IS_BETTER = {'encrypt_per_second'}
+CONFIG_KEYS = ['poly_modulus', 'n_primes', 'n_samples', 'n_features']
+
+
+def _median_time(fun, repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        start = perf_counter()
+        fun()
+        times.append(perf_counter() - start)
+    return median(times)
+
+
+def op_latencies(encode_utils: FractionalEncoderUtils, decode_utils: FractionalDecryptorUtils, repeats=5) -> dict:
+    """
+    Median latency of single operations in seconds
+    """
+    # Evaluation keys are generated on first use, which must not be timed as relinearization
+    encode_utils.ev_keys
+    a, b = encode_utils.encrypt_num(0.7), encode_utils.encrypt_num(-1.3)
+    plain = encode_utils.encoder.encode(0.25)  # not cached, so encode is timed as well
+    product_ = encode_utils.multiply(a, b)
+    return {
+        'encode': _median_time(lambda: encode_utils.encoder.encode(0.25), repeats),
+        'encrypt': _median_time(lambda: encode_utils.encrypt_num(plain), repeats),
+        'add': _median_time(lambda: encode_utils.add(a, b), repeats),
+        'add_plain': _median_time(lambda: encode_utils.add_plain(a, plain), repeats),
+        'multiply': _median_time(lambda: encode_utils.multiply(a, b), repeats),
+        'multiply_plain': _median_time(lambda: encode_utils.multiply_plain(a, plain), repeats),
+        'relinearize': _median_time(lambda: encode_utils.relinearize(product_), repeats),
+        'decrypt': _median_time(lambda: decode_utils.decrypt(a), repeats),
+    }
+
+
+def run_config(poly_modulus: str, n_primes: int, n_samples: int, n_features: int, n_iter=2, repeats=5) -> dict:
+    """
+    Measures one point of the grid. Peak memory is that of the whole process, so every point runs in its own
+    process (see run)
+    :return: configuration and metrics (seconds, bytes, ciphertexts per second)
+    """
+    context = FracContext(poly_modulus=poly_modulus, coef_modulus_n_primes=n_primes, verbose=False)
+    encode_utils = FractionalEncoderUtils(context)
+    decode_utils = FractionalDecryptorUtils(context)
+    # The same data in every run, so that runs are comparable
+    X, y = generate_dataset(n_samples, n_features, 15, random_state=0)
+
+    X_enc = EncArray.from_numpy(X, encode_utils)
+    y_enc = EncArray.from_numpy(y, encode_utils)
+    metrics = {'encrypt_per_second': X_enc.encryption_stats['per_second']}
+    metrics.update({f'latency_{op}': seconds for op, seconds in op_latencies(encode_utils, decode_utils,
+                                                                             repeats).items()})
+
+    model = SecureLinearRegression()
+    model.fit(X_enc, y_enc, n_iter=n_iter)
+    metrics['fit_iteration'] = median(record['time'] for record in model.history)
+    metrics['predict'] = _median_time(lambda: model.predict(X_enc), max(1, repeats // 2))
+
+    ciphertext_bytes = len(to_bytes(X_enc.enc_arr[0][0]))
+    metrics['ciphertext_bytes'] = ciphertext_bytes
+    metrics['dataset_bytes'] = ciphertext_bytes * (X.size + y.size)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    metrics['max_rss_bytes'] = max_rss if sys.platform == 'darwin' else max_rss * 1024
+    return dict(poly_modulus=poly_modulus, n_primes=n_primes, n_samples=n_samples, n_features=n_features,
+                metrics=metrics)
+
+
+def _git_revision() -> str:
+    try:
+        revision = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL)
+        return revision.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(grid: dict, n_iter=2, repeats=5) -> dict:
+    results = []
+    for values in product(*[grid[key] for key in CONFIG_KEYS]):
+        config = dict(zip(CONFIG_KEYS, values))
+        print(f'Running {config}')
+        # A fresh process per configuration, so that max_rss_bytes is not the peak of earlier configurations
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            results.append(pool.submit(run_config, **config, n_iter=n_iter, repeats=repeats).result())
+    return {'meta': {'revision': _git_revision(), 'python': platform.python_version(),
+                     'machine': platform.machine(), 'date': datetime.datetime.now().isoformat(),
+                     'n_iter': n_iter, 'repeats': repeats},
+            'results': results}
+
+
+def compare(baseline: dict, current: dict, threshold=0.1) -> list:
+    """
+    Relative change of every metric between two runs, for configurations present in both
+    :param threshold: relative change, above which a worse metric counts as a regression
+    :return: list of (config, metric, baseline value, current value, relative change, is regression)
+    """
+    def key(result):
+        return tuple(result[name] for name in CONFIG_KEYS)
+
+    baseline_results = {key(result): result['metrics'] for result in baseline['results']}
+    rows = []
+    for result in current['results']:
+        if key(result) not in baseline_results:
+            continue
+        for metric, value in result['metrics'].items():
+            old = baseline_results[key(result)].get(metric)
+            if old is None or old == 0:
+                continue
+            change = (value - old) / old
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            rows.append((key(result), metric, old, value, change, worse > threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark suite of encrypted linear regression')
+    subparsers = parser.add_subparsers(dest='command')
+    run_parser = subparsers.add_parser('run', help='run benchmarks and write results to a JSON file')
+    run_parser.add_argument('--output', default='benchmark_results.json')
+    run_parser.add_argument('--smoke', action='store_true', help='smallest configuration only, e.g. for CI')
+    run_parser.add_argument('--n_iter', type=int, default=2)
+    run_parser.add_argument('--repeats', type=int, default=5)
+    for name, values in FULL_GRID.items():
+        run_parser.add_argument(f'--{name}', nargs='+', type=type(values[0]), default=None)
+    compare_parser = subparsers.add_parser('compare', help='compare two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='relative change, above which a worse metric is reported as regression')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        grid = dict(SMOKE_GRID if args.smoke else FULL_GRID)
+        grid.update({name: getattr(args, name) for name in FULL_GRID if getattr(args, name) is not None})
+        n_iter, repeats = (1, 1) if args.smoke else (args.n_iter, args.repeats)
+        results = run(grid, n_iter, repeats)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Results are saved to {args.output}')
+    elif args.command == 'compare':
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        rows = compare(baseline, current, args.threshold)
+        for config, metric, old, new, change, regression in rows:
+            print(f'{str(config):45} {metric:24} {old:12.4g} {new:12.4g} {change:+8.1%}'
+                  f'{"  REGRESSION" if regression else ""}')
+        n_regressions = sum(row[-1] for row in rows)
+        print(f'{n_regressions} regressions out of {len(rows)} compared metrics')
+        sys.exit(1 if n_regressions else 0)
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
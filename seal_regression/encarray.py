@@ -1,11 +1,18 @@
 from seal_regression.fractions_utils import FractionalEncoderUtils, FracContext, FractionalDecryptorUtils
+from seal_regression.executor import SerialExecutor
+from seal_regression import kernels
 import numpy as np
 from copy import deepcopy
-from seal import Ciphertext, Plaintext
+from seal_regression._seal import Ciphertext, Plaintext
 from typing import List
+from time import time
 
 
 class EncArray:
+    # Elements are kept in one NumPy object array (shape and strides are its own), so views like T and slices share
+    # ciphertexts without copying and element-wise operations iterate over a flat list
+    __slots__ = ('dtype', 'enc_utils', '_data', 'encryption_stats')
+
     def __init__(self, arr, enc_utils: FractionalEncoderUtils = None, dtype=Ciphertext):
         """
         Class representing array of encrypted or encoded fractional numbers.
@@ -20,36 +27,251 @@ class EncArray:
         >> a = EncArray([12, 13], encode_utils)
         """
         self.dtype = dtype
-        if type(arr) == EncArray:
+        if isinstance(arr, np.ndarray):
+            bulk = EncArray.from_numpy(arr, enc_utils, dtype)
+            self.enc_utils, self._data = bulk.enc_utils, bulk._data
+        elif type(arr) == EncArray:
             self.enc_utils = arr.enc_utils
-            self.enc_arr = deepcopy(arr.enc_arr)
+            self.dtype = arr.dtype
+            self._data = self._object_array([deepcopy(ele) for ele in arr._flat()], arr.shape)
         else:
             self.enc_utils = enc_utils
+            # Ciphertexts (Plaintexts) inside arr are not copied, but shared with the new array
             if dtype == Ciphertext:
-                self.enc_arr = self._recur_apply(arr, fun=self.enc_utils.encrypt_num)
+                self.enc_arr = self._apply('encrypt_num', arr)
             elif dtype == Plaintext:
-                self.enc_arr = self._recur_apply(arr, fun=self.enc_utils.encode_num)
+                self.enc_arr = self._apply('encode_num', arr)
+            else:
+                raise ValueError(f'Unknown data type: {dtype}, expected Ciphertext or Plaintext')
+
+    @classmethod
+    def _wrap(cls, enc_arr, enc_utils: FractionalEncoderUtils, dtype=Ciphertext):
+        """
+        Array over already encrypted/encoded nested list, without traversing or copying it
+        """
+        return cls._from_flat(cls._flatten(enc_arr), cls._nested_shape(enc_arr), enc_utils, dtype)
+
+    @classmethod
+    def _from_flat(cls, flat: List, shape: tuple, enc_utils: FractionalEncoderUtils, dtype=Ciphertext):
+        """
+        Array over a flat (row-major) list of ciphertexts/plaintexts
+        """
+        return cls._view(cls._object_array(flat, shape), enc_utils, dtype)
+
+    @classmethod
+    def _view(cls, data: np.ndarray, enc_utils: FractionalEncoderUtils, dtype=Ciphertext):
+        array = cls.__new__(cls)
+        array.dtype = dtype
+        array.enc_utils = enc_utils
+        array._data = data
+        return array
+
+    @staticmethod
+    def _object_array(flat: List, shape: tuple) -> np.ndarray:
+        # Filled element by element, so that NumPy does not try to convert ciphertexts
+        data = np.empty(len(flat), dtype=object)
+        for i, ele in enumerate(flat):
+            data[i] = ele
+        return data.reshape(shape)
+
+    @property
+    def enc_arr(self):
+        """
+        Elements as nested lists (a single element for 0-dimensional arrays). Lists are built on access and share
+        ciphertexts with the array
+        """
+        return self._data.tolist()
+
+    @enc_arr.setter
+    def enc_arr(self, enc_arr):
+        self._data = self._object_array(self._flatten(enc_arr), self._nested_shape(enc_arr))
+
+    @property
+    def shape(self) -> tuple:
+        return self._data.shape
+
+    @property
+    def ndim(self) -> int:
+        return self._data.ndim
+
+    @property
+    def strides(self) -> tuple:
+        """
+        Strides in elements, e.g. (1, d) for the transpose of an (n, d) array
+        """
+        return tuple(stride // self._data.itemsize for stride in self._data.strides)
+
+    def _flat(self) -> List:
+        """
+        Elements in row-major order
+        """
+        return self._data.ravel().tolist()
+
+    @classmethod
+    def from_numpy(cls, arr: np.ndarray, enc_utils: FractionalEncoderUtils, dtype=Ciphertext, chunk_size=4096,
+                   verbose=False):
+        """
+        Bulk encryption (or encoding) of a NumPy array without converting it to nested lists. Elements are processed
+        in chunks by the executor of enc_utils (if any) and encrypted into preallocated ciphertexts. Throughput is
+        stored in the encryption_stats attribute of the result.
+        :param arr: array of numbers of any shape
+        :param enc_utils: encoder utils
+        :param dtype: Ciphertext to encrypt, Plaintext to only encode
+        :param chunk_size: number of elements handed to the executor at once
+        :param verbose: if True, throughput is printed
+
+        Example:
+        >> X_enc = EncArray.from_numpy(X, encode_utils)
+        >> X_enc.encryption_stats
+        {'n_elements': 30000, 'seconds': 12.5, 'per_second': 2400.0}
+        """
+        start = time()
+        flat = np.asarray(arr, dtype=float).ravel()
+        executor = enc_utils.executor or SerialExecutor()
+        elements = []
+        for chunk_start in range(0, flat.size, chunk_size):
+            chunk = flat[chunk_start:chunk_start + chunk_size]
+            if dtype == Ciphertext:
+                out = [enc_utils.allocate() for _ in range(chunk.size)]
+                elements.extend(executor.map(enc_utils, 'encrypt_num', chunk, out=out))
             else:
-                self.enc_arr = None
-                print('Unknown data type!')
+                elements.extend(executor.map(enc_utils, 'encode_num', chunk))
 
-        self.shape = np.shape(self.enc_arr)
-        self.ndim = len(self.shape)
+        array = cls._from_flat(elements, np.shape(arr), enc_utils, dtype)
+        seconds = time() - start
+        array.encryption_stats = {'n_elements': flat.size, 'seconds': seconds,
+                                  'per_second': flat.size / seconds if seconds > 0 else float('inf')}
+        if verbose:
+            print(f'Encrypted {flat.size} elements in {seconds:.2f} s '
+                  f'({array.encryption_stats["per_second"]:.1f} ciphertexts/s)')
+        return array
+
+    @classmethod
+    def concatenate(cls, arrays: List):
+        """
+        Concatenation of arrays along the first axis. Ciphertexts are shared, not copied
+        """
+        return cls._view(np.concatenate([array._data for array in arrays]), arrays[0].enc_utils, arrays[0].dtype)
 
     @staticmethod
-    def _recur_apply(arr1: List, arr2: List = None, fun=None, result=None):
-        if result is None:  # First level of recurrence
-            result = deepcopy(arr1)
+    def _nested_shape(arr) -> tuple:
+        shape = []
+        while type(arr) == list:
+            shape.append(len(arr))
+            if len(arr) == 0:
+                break
+            arr = arr[0]
+        return tuple(shape)
 
+    @staticmethod
+    def _recur_apply(arr1: List, arr2: List = None, fun=None, out: List = None):
         if type(arr1) != list:
+            if out is not None:
+                return fun(arr1, arr2, out=out) if arr2 is not None else fun(arr1, out=out)
             return fun(arr1, arr2) if arr2 is not None else fun(arr1)
         else:
-            result = [
-                EncArray._recur_apply(arr1[i], arr2[i], fun=fun, result=result[i]) if arr2 is not None
-                else EncArray._recur_apply(arr1[i], fun=fun, result=result[i])
+            return [
+                EncArray._recur_apply(arr1[i],
+                                      arr2[i] if arr2 is not None else None,
+                                      fun=fun,
+                                      out=out[i] if out is not None else None)
                 for i in range(len(arr1))
             ]
-            return result
+
+    @staticmethod
+    def _flatten(arr) -> List:
+        if type(arr) != list:
+            return [arr]
+        return [ele for sub_arr in arr for ele in EncArray._flatten(sub_arr)]
+
+    @staticmethod
+    def _unflatten(flat: List, shape: tuple):
+        if len(shape) == 0:
+            return flat[0]
+        if len(shape) == 1:
+            return list(flat)
+        step = len(flat) // shape[0]
+        return [EncArray._unflatten(flat[i * step:(i + 1) * step], shape[1:]) for i in range(shape[0])]
+
+    def _apply(self, op: str, arr1: List, arr2: List = None, out: List = None):
+        """
+        Applies operation of enc_utils element-wise, in parallel if enc_utils has an executor
+        """
+        executor = self.enc_utils.executor
+        if executor is None:
+            return self._recur_apply(arr1, arr2, fun=getattr(self.enc_utils, op), out=out)
+        operands = [self._flatten(arr1)] + ([self._flatten(arr2)] if arr2 is not None else [])
+        results = executor.map(self.enc_utils, op, *operands, out=self._flatten(out) if out is not None else None)
+        return self._unflatten(results, self._nested_shape(arr1))
+
+    def copy(self):
+        """
+        Deep copy of array with its own ciphertexts
+        """
+        return EncArray(self)
+
+    def lazy(self, graph=None):
+        """
+        Lazy version of array: operations over it build an expression graph, evaluated on evaluate()/decrypt_array()
+        :param graph: ExpressionGraph to add the array to, by default the graph shared by all arrays of enc_utils
+        :return: LazyEncArray
+        """
+        from seal_regression.lazy import ExpressionGraph, LazyEncArray
+        graph = ExpressionGraph.default(self.enc_utils) if graph is None else graph
+        return LazyEncArray(graph.leaf(self), graph)
+
+    def _apply_binary(self, o, cipher_op: str, plain_op: str, commutative=True, out=None):
+        if not self._is_shape_equal(o):
+            return None
+        if out is not None and (not self._is_shape_equal(out) or out.dtype != Ciphertext):
+            print('Output array has to be encrypted array of the same shape')
+            return None
+        out_flat = out._flat() if out is not None else None
+
+        if self.dtype == Ciphertext and o.dtype == Ciphertext:
+            op, operands = cipher_op, (self._flat(), o._flat())
+        elif self.dtype == Ciphertext and o.dtype == Plaintext and plain_op is not None:
+            op, operands = plain_op, (self._flat(), o._flat())
+        elif self.dtype == Plaintext and o.dtype == Ciphertext and plain_op is not None and commutative:
+            op, operands = plain_op, (o._flat(), self._flat())
+        else:
+            print('Not supported opperation')
+            return None
+        # Flat operands, computed in parallel if enc_utils has an executor
+        result = (self.enc_utils.executor or SerialExecutor()).map(self.enc_utils, op, *operands, out=out_flat)
+        if out is not None:
+            return out
+        return EncArray._from_flat(result, self.shape, enc_utils=self.enc_utils)
+
+    def multiply(self, o, out=None):
+        """
+        Element-wise multiplication of 2 encrypted arrays or encrypted and encoded array
+        :param o: encrypted array to multiply
+        :param out: encrypted array of the same shape, whose ciphertexts are overwritten with the result
+        (may be self or o). If None, new array is allocated
+        :return: encrypted result
+        """
+        return self._apply_binary(o, 'multiply', 'multiply_plain', out=out)
+
+    def add(self, o, out=None):
+        """
+        Element-wise sum of 2 encrypted arrays or encrypted and encoded array
+        :param o: encrypted array to add
+        :param out: encrypted array of the same shape, whose ciphertexts are overwritten with the result
+        (may be self or o). If None, new array is allocated
+        :return: encrypted result
+        """
+        return self._apply_binary(o, 'add', 'add_plain', out=out)
+
+    def subtract(self, o, out=None):
+        """
+        Substraction of encrypted array from encrypted array
+        :param o: encrypted array to substract
+        :param out: encrypted array of the same shape, whose ciphertexts are overwritten with the result
+        (may be self or o). If None, new array is allocated
+        :return: encrypted result
+        """
+        return self._apply_binary(o, 'subtract', None, commutative=False, out=out)
 
     def __mul__(self, o):
         """
@@ -59,19 +281,7 @@ class EncArray:
         Example:
         a * b
         """
-        if not self._is_shape_equal(o):
-            return None
-        if self.dtype == Ciphertext and o.dtype == Ciphertext:
-            result = self._recur_apply(self.enc_arr, o.enc_arr, fun=self.enc_utils.multiply)
-            # result = self._recur_apply(result, fun=self.enc_utils.relinearize)
-        elif self.dtype == Ciphertext and o.dtype == Plaintext:
-            result = self._recur_apply(self.enc_arr, o.enc_arr, fun=self.enc_utils.multiply_plain)
-        elif self.dtype == Plaintext and o.dtype == Ciphertext:
-            result = self._recur_apply(o.enc_arr, self.enc_arr, fun=self.enc_utils.multiply_plain)
-        else:
-            print('Not supported opperation')
-            result = None
-        return EncArray(result, enc_utils=self.enc_utils)
+        return self.multiply(o)
 
     def __add__(self, o):
         """
@@ -82,19 +292,7 @@ class EncArray:
         Example:
         a + b
         """
-        if not self._is_shape_equal(o):
-            return None
-        if self.dtype == Ciphertext and o.dtype == Ciphertext:
-            result = self._recur_apply(self.enc_arr, o.enc_arr, fun=self.enc_utils.add)
-
-        elif self.dtype == Ciphertext and o.dtype == Plaintext:
-            result = self._recur_apply(self.enc_arr, o.enc_arr, fun=self.enc_utils.add_plain)
-        elif self.dtype == Plaintext and o.dtype == Ciphertext:
-            result = self._recur_apply(o.enc_arr, self.enc_arr, fun=self.enc_utils.add_plain)
-        else:
-            print('Not supported opperation')
-            result = None
-        return EncArray(result, enc_utils=self.enc_utils)
+        return self.add(o)
 
     def __sub__(self, o):
         """
@@ -104,9 +302,31 @@ class EncArray:
         Example:
         a - b
         """
-        if not self._is_shape_equal(o):
-            return None
-        return EncArray(self._recur_apply(self.enc_arr, o.enc_arr, fun=self.enc_utils.subtract), enc_utils=self.enc_utils)
+        return self.subtract(o)
+
+    def __imul__(self, o):
+        """
+        In-place element-wise multiplication, ciphertexts of the array are overwritten
+        Example:
+        a *= b
+        """
+        return self.multiply(o, out=self)
+
+    def __iadd__(self, o):
+        """
+        In-place element-wise sum, ciphertexts of the array are overwritten
+        Example:
+        a += b
+        """
+        return self.add(o, out=self)
+
+    def __isub__(self, o):
+        """
+        In-place substraction, ciphertexts of the array are overwritten
+        Example:
+        a -= b
+        """
+        return self.subtract(o, out=self)
 
     def _is_shape_equal(self, o):
         if np.array_equal(self.shape, o.shape):
@@ -124,67 +344,127 @@ class EncArray:
         >> decode_utils = FractionalDecryptorUtils(context)
         >> a.decrypt_array(decode_utils)
         """
-        return self._recur_apply(self.enc_arr, fun=decode_utils.decrypt)
+        return self._unflatten([decode_utils.decrypt(ele) for ele in self._flat()], self.shape)
 
     def noise_budget(self, decode_utils: FractionalDecryptorUtils):
         """
         Compute noise budget consumption for each encrypted number in an array
         :return: left amount of budget in bits for every element in array
         """
-        return self._recur_apply(self.enc_arr, fun=decode_utils.decryptor.invariant_noise_budget)
+        return self._unflatten([decode_utils.decryptor.invariant_noise_budget(ele) for ele in self._flat()],
+                               self.shape)
 
     def __len__(self):
-        return len(self.enc_arr)
+        return self.shape[0]
+
+    def sum(self, axis: int = None):
+        """
+        Sum of elements, reduced with add_many (balanced tree across workers, if enc_utils has an executor)
+        :param axis: None sums all elements, 0 sums columns, 1 sums rows of a 2D array
+        :returns encrypted sum: array with a single ciphertext if axis is None, 1D array otherwise
 
-    def sum(self):
+        Example:
+        >> X.sum()  # sum of all elements
+        >> X.sum(axis=0)  # sums of columns
         """
-        Sums of elements of 1D array
-        :returns encrypted sum
+        if self.dtype != Ciphertext:
+            print('Sum is supported for encrypted arrays only')
+            return None
+        if axis is None or self.ndim == 1:
+            if axis not in (None, 0):
+                print(f'Axis {axis} is out of bounds for 1D array')
+                return None
+            return EncArray._wrap(kernels.reduce_sum(self.enc_utils, self._flat()), enc_utils=self.enc_utils)
+        if self.ndim != 2 or axis not in (0, 1):
+            print('Sum along an axis is supported for 2D arrays and axis 0 or 1 only')
+            return None
+        vectors = self.T.enc_arr if axis == 0 else self.enc_arr
+        return EncArray._wrap(kernels.sum_vectors(self.enc_utils, vectors), enc_utils=self.enc_utils)
+
+    def dot(self, other):
+        """
+        Dot product of 1D arrays, matrix-vector or matrix product of 2D arrays, the same as self @ other
         """
-        return EncArray(self.enc_utils.sum_enc_array(self.enc_arr), enc_utils=self.enc_utils)
+        return self @ other
 
     @property
     def T(self):
         """
-        Transposed array
+        Transposed array. It is a view: ciphertexts are shared with the original array
         """
         if self.ndim != 1:
-            return EncArray(list(map(list, zip(*self.enc_arr))), enc_utils=self.enc_utils)
+            return EncArray._view(self._data.T, enc_utils=self.enc_utils, dtype=self.dtype)
         else:
             return self
 
     def __getitem__(self, item):
         """
-        Access array elements by index
+        Access array elements by index. Result is a view: ciphertexts are shared with the original array
+        Examples:
+        >> X[i]  # i-th row
+        >> X[1:3]  # rows 1 and 2
+        >> X[:, j]  # j-th column
         """
-        return EncArray(self.enc_arr[item], enc_utils=self.enc_utils)
+        data = self._data[item]
+        if not isinstance(data, np.ndarray):  # single element
+            data = self._object_array([data], ())
+        return EncArray._view(data, enc_utils=self.enc_utils, dtype=self.dtype)
 
     def __matmul__(self, other):
         """
-        Matrix multiplication of 2 encrypted arrays
+        Matrix product of 2 arrays, either of which may be only encoded (Plaintext dtype), e.g. encrypted data and
+        encoded model. 1D operands are treated as vectors, as in NumPy
         :param other: array to multiply
         :return: encrypted result
         Example:
         a @ b
         """
-        a = self.enc_arr
-        b = other.T.enc_arr
+        if self.dtype == Plaintext and other.dtype == Plaintext:
+            raise ValueError('At least one of the operands has to be encrypted')
+        if self.shape[-1] != other.shape[0]:
+            raise ValueError(f'Dimensions are not aligned: {self.shape} and {other.shape}')
+        rows = self.enc_arr if self.ndim != 1 else [self.enc_arr]
+        columns = other.T.enc_arr if other.ndim != 1 else [other.enc_arr]
 
-        result = [
-            [
-                EncArray([(EncArray(ele_a, enc_utils=self.enc_utils) * EncArray(ele_b, enc_utils=self.enc_utils)).enc_arr
-                           for ele_a, ele_b in zip(row_a, col_b)], enc_utils=self.enc_utils)
-                    .sum()
-                    .enc_arr
-                for col_b in b]
-            for row_a in a
-        ]
-        return EncArray(result, enc_utils=self.enc_utils)
+        # Every element of the result is one dot product, computed in parallel if enc_utils has an executor
+        result = kernels.matmul(self.enc_utils, rows, columns)
+        if self.ndim == 1 and other.ndim == 1:
+            return EncArray._wrap(result[0][0], enc_utils=self.enc_utils)
+        if self.ndim == 1:
+            return EncArray._wrap(result[0], enc_utils=self.enc_utils)
+        if other.ndim == 1:
+            return EncArray._wrap([row[0] for row in result], enc_utils=self.enc_utils)
+        return EncArray._wrap(result, enc_utils=self.enc_utils)
+
+    def save(self, path: str):
+        """
+        Saves array to a file: header with shape, dtype and hash of encryption parameters, offset index and
+        serialized elements (see seal_regression.storage)
+        :param path: file path
+        """
+        from seal_regression.storage import save
+        save(self, path)
+
+    @staticmethod
+    def load(path: str, enc_utils: FractionalEncoderUtils, lazy=False):
+        """
+        Loads array, saved by EncArray.save
+        :param path: file path
+        :param enc_utils: encoder utils with the same encryption parameters as the saved array
+        :param lazy: if True, the file is memory-mapped and StoredEncArray is returned, which reads only accessed
+        rows and columns
+        :return: EncArray or StoredEncArray
+        """
+        from seal_regression.storage import StoredEncArray
+        stored = StoredEncArray(path, enc_utils)
+        if lazy:
+            return stored
+        with stored:
+            return stored.load()
 
     def mem_size(self) -> int:
         """
         Sum of all ciphertexts' sizes in array. Note, that the size of freshly ecrypted plaintext always equals to 2.
         :return: Overall size of array
         """
-        sizes = np.array(self._recur_apply(self.enc_arr, fun=lambda num: num.size()))
-        return sizes.sum()
+        return sum(ele.size() for ele in self._flat())
@@ -0,0 +1,166 @@
+from seal_regression.fractions_utils import FracContext, FractionalEncoderUtils
+from seal_regression.serialization import serialize, deserialize, to_bytes, from_bytes
+from seal_regression.keystore import KeyStore
+from seal_regression.profiler import current_scopes, inherit_scopes
+from seal_regression._seal import EvaluationKeys, PublicKey
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import List
+import os
+
+# Encoder utils of a worker process, set up once by _init_worker
+_worker_utils = None
+
+
+def chunk_slices(n_tasks: int, n_chunks: int) -> List[slice]:
+    """
+    Splits range(n_tasks) into at most n_chunks contiguous slices of almost equal length
+    """
+    n_chunks = max(1, min(n_chunks, n_tasks))
+    bounds = [n_tasks * i // n_chunks for i in range(n_chunks + 1)]
+    return [slice(bounds[i], bounds[i + 1]) for i in range(n_chunks)]
+
+
+class SerialExecutor:
+    n_workers = 1
+
+    def map(self, enc_utils: FractionalEncoderUtils, op: str, *operands: List, out: List = None) -> List:
+        """
+        Applies operation of FractionalEncoderUtils to every tuple of operands
+        :param enc_utils: encoder utils
+        :param op: name of FractionalEncoderUtils method, e.g. 'multiply', 'dot', 'encrypt_num'
+        :param operands: lists of equal length, one per argument of op
+        :param out: list of ciphertexts to write the results into
+        :return: list of results
+        """
+        enc_utils.relinearize_operands(op, operands)
+        return self._map_chunk(enc_utils, op, *operands, out=out)
+
+    @staticmethod
+    def _map_chunk(enc_utils: FractionalEncoderUtils, op: str, *operands: List, out: List = None) -> List:
+        fun = getattr(enc_utils, op)
+        if out is not None:
+            return [fun(*args, out=out_ele) for *args, out_ele in zip(*operands, out)]
+        return [fun(*args) for args in zip(*operands)]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ThreadExecutor(SerialExecutor):
+    def __init__(self, n_workers: int = None):
+        """
+        Thread pool executor. Threads share ciphertexts without copying, but run in parallel only as far as the SEAL
+        bindings release the GIL; otherwise ProcessExecutor has to be used. Encoder utils give every thread its own
+        evaluator, encryptor and encoder, keys and caches are shared.
+        :param n_workers: number of threads, default is the number of cores
+        """
+        self.n_workers = n_workers or os.cpu_count()
+        self.pool = ThreadPoolExecutor(self.n_workers)
+
+    def map(self, enc_utils: FractionalEncoderUtils, op: str, *operands: List, out: List = None) -> List:
+        enc_utils.relinearize_operands(op, operands)
+        # Operations of workers are attributed to the profiler scope of the caller
+        scopes = current_scopes()
+        futures = [
+            self.pool.submit(self._map_scoped, scopes, enc_utils, op, *[operand[chunk] for operand in operands],
+                             out=out[chunk] if out is not None else None)
+            for chunk in chunk_slices(len(operands[0]), self.n_workers)
+        ]
+        return [result for future in futures for result in future.result()]
+
+    def _map_scoped(self, scopes: list, enc_utils: FractionalEncoderUtils, op: str, *operands: List,
+                    out: List = None) -> List:
+        with inherit_scopes(scopes):
+            return self._map_chunk(enc_utils, op, *operands, out=out)
+
+    def close(self):
+        self.pool.shutdown()
+
+
+def export_encoder_utils(enc_utils: FractionalEncoderUtils, use_key_store=True) -> tuple:
+    """
+    Picklable description of encoder utils: encryption parameters and keys. If the context has a key store, only its
+    directory and the key pair identity are passed, otherwise serialized public and evaluation keys
+    :param use_key_store: False for workers on other hosts, which cannot read the key store
+    """
+    context = enc_utils.frac_context
+    utils_config = dict(relin_policy=enc_utils.relin_policy, decomposition_bit_count=enc_utils.decomposition_bit_count)
+    # Evaluation keys are needed by workers only if they relinearize; accessing them generates (and stores) them once
+    ev_keys = enc_utils.ev_keys if enc_utils.relin_policy.mode != 'never' else None
+    if context.key_store is not None and use_key_store:
+        keys = dict(key_store=context.key_store.directory, key_id=context.key_id)
+    else:
+        keys = dict(public_key=to_bytes(context.public_key),
+                    ev_keys=to_bytes(ev_keys) if ev_keys is not None else None)
+    return context.config(), keys, utils_config
+
+
+def attach_encoder_utils(config: dict, keys: dict, utils_config: dict) -> FractionalEncoderUtils:
+    """
+    Recreates encoder utils from export_encoder_utils result (e.g. in another process) without key generation
+    """
+    if 'key_store' in keys:
+        context = FracContext(**config, key_store=KeyStore(keys['key_store']), verbose=False, load_secret_key=False,
+                              key_id=keys['key_id'])
+        return FractionalEncoderUtils(context, **utils_config)
+    context = FracContext(**config, public_key=from_bytes(keys['public_key'], PublicKey()), verbose=False)
+    enc_utils = FractionalEncoderUtils(context, **utils_config)
+    if keys['ev_keys'] is not None:
+        enc_utils.ev_keys = from_bytes(keys['ev_keys'], EvaluationKeys())
+    return enc_utils
+
+
+def _init_worker(*exported_utils):
+    global _worker_utils
+    _worker_utils = attach_encoder_utils(*exported_utils)
+
+
+def _run_chunk(op: str, operands: List):
+    memo = []
+    operands = [deserialize(operand, memo=memo) for operand in operands]
+    counts_before = _worker_utils.op_counts.copy()
+    results = SerialExecutor._map_chunk(_worker_utils, op, *operands)
+    return serialize(results), _worker_utils.op_counts - counts_before
+
+
+class ProcessExecutor(SerialExecutor):
+    def __init__(self, enc_utils: FractionalEncoderUtils, n_workers: int = None):
+        """
+        Process pool executor. Every worker rebuilds the encryption context from parameters and the public and
+        evaluation keys of enc_utils, or loads them from the key store of the context (no key generation).
+        Ciphertexts are exchanged with SEAL save/load; operands repeated within a chunk (e.g. weights for every row)
+        are sent once.
+        :param enc_utils: encoder utils, whose context is replicated in workers
+        :param n_workers: number of processes, default is the number of cores
+
+        Example:
+        >> encode_utils = FractionalEncoderUtils(context)
+        >> encode_utils.executor = ProcessExecutor(encode_utils, n_workers=16)
+        >> X_enc = EncArray.from_numpy(X, encode_utils)  # encrypted by 16 processes
+        """
+        self.n_workers = n_workers or os.cpu_count()
+        self.pool = ProcessPoolExecutor(self.n_workers, initializer=_init_worker,
+                                        initargs=export_encoder_utils(enc_utils))
+
+    def map(self, enc_utils: FractionalEncoderUtils, op: str, *operands: List, out: List = None) -> List:
+        enc_utils.relinearize_operands(op, operands)
+        chunks = chunk_slices(len(operands[0]), self.n_workers)
+        futures = []
+        for chunk in chunks:
+            memo = {}
+            futures.append(self.pool.submit(_run_chunk, op, [serialize(operand[chunk], memo) for operand in operands]))
+        results = []
+        for chunk, future in zip(chunks, futures):
+            serialized, op_counts = future.result()
+            results.extend(deserialize(serialized, out[chunk] if out is not None else None))
+            enc_utils.op_counts.update(op_counts)
+        return results
+
+    def close(self):
+        self.pool.shutdown()
@@ -1,8 +1,11 @@
-import seal
-from seal import EvaluationKeys, Ciphertext, Decryptor, Encryptor, EncryptionParameters, Evaluator, FractionalEncoder, \
-    KeyGenerator, Plaintext, SEALContext
+from seal_regression._seal import EvaluationKeys, Ciphertext, Decryptor, Encryptor, EncryptionParameters, Evaluator, \
+    FractionalEncoder, GaloisKeys, KeyGenerator, Plaintext, PublicKey, SEALContext, SecretKey, SmallModulus, dbc_max
+from seal_regression.keystore import KeyStore
+from seal_regression import kernels
 from typing import List
 from copy import deepcopy
+from collections import Counter, OrderedDict
+import threading
 
 
 class FracContext:
@@ -24,26 +27,134 @@ class FracContext:
         0xfffffffecec0001,  0xfffffffecb00001,  0xfffffffec380001,  0xfffffffebb40001
     ]
 
-    def __init__(self, poly_modulus="1x^1024 + 1", coef_modulus_n_primes=20, plain_modulus=1 << 32):
+    def __init__(self, poly_modulus="1x^1024 + 1", coef_modulus_n_primes=20, plain_modulus=1 << 32, public_key=None,
+                 verbose=True, integer_coeff_count=64, fraction_coeff_count=32, base=3, key_store=None,
+                 load_secret_key=True, key_id: str = None):
         """
         Set up encryption context for encoder and decoder
         :param poly_modulus:
         :param coef_modulus_n_primes:
         :param plain_modulus:
+        :param public_key: existing public key (e.g. in a worker process). If given, no keys are generated and the
+        context can only encrypt and evaluate
+        :param verbose: if True, parameters are printed
+        :param integer_coeff_count: number of polynomial coefficients, FractionalEncoder reserves for integer part
+        :param fraction_coeff_count: number of polynomial coefficients, FractionalEncoder reserves for fractional part
+        :param base: base of FractionalEncoder expansion
+        :param key_store: KeyStore (seal_regression.keystore). A key holder loads the current key pair of the
+        parameters, if the store holds its secret key (KeyStore(save_secret_key=True)), and otherwise generates a new
+        key pair; its public, evaluation and Galois keys are saved to the store under key_id
+        :param load_secret_key: False for contexts, which only encrypt and evaluate (e.g. workers): only public and
+        evaluation keys of key pair key_id are loaded from the key store, which has to hold them
+        :param key_id: key pair to load from the key store (see KeyStore.key_id), e.g. the key_id of the key holder's
+        context in its workers
         """
+        self.poly_modulus = poly_modulus
+        self.coef_modulus_n_primes = coef_modulus_n_primes
+        self.plain_modulus = plain_modulus
+        self.integer_coeff_count = integer_coeff_count
+        self.fraction_coeff_count = fraction_coeff_count
+        self.base = base
+
         self.params = EncryptionParameters()
         self.params.set_poly_modulus(poly_modulus)
-        self.params.set_coeff_modulus([seal.SmallModulus(p) for p in FracContext.primes[:coef_modulus_n_primes]])
+        self.params.set_coeff_modulus([SmallModulus(p) for p in FracContext.primes[:coef_modulus_n_primes]])
         self.params.set_plain_modulus(plain_modulus)
 
         self.context = SEALContext(self.params)
-        self.print_parameters(self.context)
+        if verbose:
+            self.print_parameters(self.context)
 
-        self.keygen = KeyGenerator(self.context)
-        self.public_key = self.keygen.public_key()
-        self.secret_key = self.keygen.secret_key()
+        self.key_store = key_store
+        # Identifies encryption parameters in the key store and in saved arrays
+        self.params_hash = KeyStore.params_hash(FracContext.primes[:coef_modulus_n_primes], poly_modulus, plain_modulus)
+        # Evaluation and Galois keys, generated or loaded on first use
+        self._keys = {}
+        self._keygen = None
+        if key_id is None and key_store is not None and load_secret_key:
+            key_id = key_store.current_key_id(self.params_hash)
+        if public_key is not None:
+            self.public_key = public_key
+            self.secret_key = None
+            self.key_id = KeyStore.key_id(public_key) if key_store is not None else None
+        elif key_id is not None and key_store.has(self.params_hash, key_id, 'public_key') and \
+                (not load_secret_key or key_store.has(self.params_hash, key_id, 'secret_key')):
+            self.public_key = key_store.load(self.params_hash, key_id, 'public_key', PublicKey())
+            self.secret_key = key_store.load(self.params_hash, key_id, 'secret_key', SecretKey()) \
+                if load_secret_key else None
+            self.key_id = key_id
+        elif not load_secret_key:
+            raise ValueError(f'Key store has no public key of key pair {key_id} for the encryption parameters')
+        else:
+            self._keygen = KeyGenerator(self.context)
+            self.public_key = self._keygen.public_key()
+            self.secret_key = self._keygen.secret_key()
+            self.key_id = None
+            if key_store is not None:
+                self.key_id = KeyStore.key_id(self.public_key)
+                key_store.save_params(self.params_hash, self.config())
+                key_store.save(self.params_hash, self.key_id, 'public_key', self.public_key)
+                key_store.save(self.params_hash, self.key_id, 'secret_key', self.secret_key)
         self.evaluator = Evaluator(self.context)
 
+    @property
+    def keygen(self):
+        """
+        Key generator, recreated from loaded keys when needed; None if the context has no secret key
+        """
+        if self._keygen is None and self.secret_key is not None:
+            self._keygen = KeyGenerator(self.context, self.secret_key, self.public_key)
+        return self._keygen
+
+    def _cached_keys(self, name: str, generate, keys):
+        if name not in self._keys:
+            loaded = self.key_store.load(self.params_hash, self.key_id, name, keys) \
+                if self.key_store is not None else None
+            if loaded is None:
+                if self.keygen is None:
+                    raise ValueError(f'{name} are neither stored nor can be generated without the secret key')
+                generate(keys)
+                if self.key_store is not None:
+                    self.key_store.save(self.params_hash, self.key_id, name, keys)
+            self._keys[name] = keys
+        return self._keys[name]
+
+    def evaluation_keys(self, decomposition_bit_count: int, count: int = 1) -> EvaluationKeys:
+        """
+        Evaluation keys for relinearization, generated (or loaded from the key store) once per arguments
+        :param decomposition_bit_count: decomposition bit count
+        :param count: number of keys, relinearization of size k ciphertext needs k - 2 keys
+        """
+        def generate(keys):
+            if count > 1:
+                self.keygen.generate_evaluation_keys(decomposition_bit_count, count, keys)
+            else:
+                self.keygen.generate_evaluation_keys(decomposition_bit_count, keys)
+        return self._cached_keys(f'evaluation_keys_{decomposition_bit_count}_{count}', generate, EvaluationKeys())
+
+    def galois_keys(self, decomposition_bit_count: int) -> GaloisKeys:
+        """
+        Galois keys for batching rotations, generated (or loaded from the key store) once per argument
+        """
+        return self._cached_keys(f'galois_keys_{decomposition_bit_count}',
+                                 lambda keys: self.keygen.generate_galois_keys(decomposition_bit_count, keys),
+                                 GaloisKeys())
+
+    def config(self) -> dict:
+        """
+        Arguments, which recreate the same encryption parameters
+        """
+        return dict(poly_modulus=self.poly_modulus, coef_modulus_n_primes=self.coef_modulus_n_primes,
+                    plain_modulus=self.plain_modulus, integer_coeff_count=self.integer_coeff_count,
+                    fraction_coeff_count=self.fraction_coeff_count, base=self.base)
+
+    def fractional_encoder(self) -> FractionalEncoder:
+        """
+        FractionalEncoder with coefficient split of the context
+        """
+        return FractionalEncoder(self.context.plain_modulus(), self.context.poly_modulus(),
+                                 self.integer_coeff_count, self.fraction_coeff_count, self.base)
+
     def print_parameters(self, context: SEALContext):
         """
         Parameters description
@@ -68,9 +179,7 @@ class FractionalDecryptorUtils:
         self.context = context.context
         self.secret_key = context.secret_key
         self.decryptor = Decryptor(self.context, self.secret_key)
-        self.encoder = FractionalEncoder(self.context.plain_modulus(),
-                                         self.context.poly_modulus(),
-                                         64, 32, 3)
+        self.encoder = context.fractional_encoder()
         self.evaluator = context.evaluator
 
     def decrypt(self, encrypted_res):
@@ -80,52 +189,206 @@ class FractionalDecryptorUtils:
         return result
 
 
+class PlaintextCache:
+    def __init__(self, max_size=1024):
+        """
+        Bounded LRU cache of encoded numbers. Cached plaintexts are shared, so they must never be modified in place
+        (evaluator operations only modify ciphertexts).
+        :param max_size: maximal number of cached plaintexts, 0 disables caching
+        """
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Shared by worker copies of encoder utils in different threads
+        self._lock = threading.Lock()
+
+    def get(self, key, encode) -> Plaintext:
+        """
+        :param key: hashable key of the value, including encoder configuration
+        :param encode: function, which encodes the value on a miss
+        :return: cached or freshly encoded plaintext
+        """
+        with self._lock:
+            plain = self.entries.get(key)
+            if plain is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return plain
+            self.misses += 1
+        plain = encode()
+        if self.max_size > 0:
+            with self._lock:
+                self.entries[key] = plain
+                if len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+        return plain
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return dict(hits=self.hits, misses=self.misses, size=len(self.entries),
+                    hit_rate=self.hits / total if total else 0.0)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.misses = 0
+
+    def __repr__(self):
+        return f'PlaintextCache({self.stats()})'
+
+
+class RelinearizationPolicy:
+    MODES = ('never', 'always', 'lazy', 'size')
+
+    def __init__(self, mode='never', max_size=3):
+        """
+        When to relinearize results of ciphertext multiplications. Size of a product is the sum of operands' sizes
+        minus 1, and every later operation on a bigger ciphertext is slower and takes more memory.
+        :param mode: 'never' - ciphertexts grow with every multiplication,
+                     'always' - every product is relinearized back to size 2,
+                     'lazy' - operands of a multiplication are relinearized right before it, so products which are only
+                     added up (e.g. dot products) are never relinearized,
+                     'size' - products bigger than max_size are relinearized
+        :param max_size: size threshold for 'size' mode
+        """
+        if mode not in RelinearizationPolicy.MODES:
+            raise ValueError(f'Unknown relinearization mode: {mode}')
+        self.mode = mode
+        self.max_size = max_size
+
+    @property
+    def ev_key_count(self) -> int:
+        """
+        Number of evaluation keys, needed to bring the biggest ciphertext the policy allows back to size 2
+        """
+        if self.mode == 'size':
+            return max(1, 2 * self.max_size - 3)
+        return 1
+
+    def __repr__(self):
+        return f'RelinearizationPolicy({self.mode}, max_size={self.max_size})'
+
+
 class FractionalEncoderUtils:
-    def __init__(self, context: FracContext):
+    def __init__(self, context: FracContext, executor=None, relin_policy: RelinearizationPolicy = None,
+                 decomposition_bit_count: int = None, plain_cache: PlaintextCache = None, pool=None):
         """
         Class providing encoding and encryption operations, operations over
         encrypted data
         :param context: Context initialising HE parameters
+        :param executor: executor from seal_regression.executor, used by EncArray to run element-wise operations,
+        reductions and products in parallel. If None, everything runs serially
+        :param relin_policy: relinearization policy for multiplications, default is RelinearizationPolicy('never')
+        :param decomposition_bit_count: decomposition bit count of evaluation keys, default is dbc_max().
+        Smaller values make relinearization slower, but consume less noise budget
+        :param plain_cache: cache of encoded numbers, used by every encode path, default PlaintextCache(). May be
+        shared between encoder utils, keys include the encoder configuration
+        :param pool: CiphertextPool (seal_regression.pool), results of operations are written into its recycled
+        ciphertexts. If None, every result is a new ciphertext
         """
+        self.relin_policy = RelinearizationPolicy() if relin_policy is None else relin_policy
+        self.decomposition_bit_count = dbc_max() if decomposition_bit_count is None else decomposition_bit_count
+        self.frac_context = context
+        self.executor = executor
+        self.pool = pool
         self.context = context.context
         self.public_key = context.public_key
-        self.encryptor = Encryptor(self.context, self.public_key)
-        self.encoder = FractionalEncoder(self.context.plain_modulus(),
-                                         self.context.poly_modulus(),
-                                         64, 32, 3)
-        self.evaluator = context.evaluator
-        self.ev_keys = EvaluationKeys()
-        context.keygen.generate_evaluation_keys(seal.dbc_max(), self.ev_keys)
+        # Evaluator, encryptor and encoder are not thread-safe, every thread (e.g. of ThreadExecutor) gets its own
+        self._local = threading.local()
+        self._encoder_key = (context.plain_modulus, context.poly_modulus, context.integer_coeff_count,
+                             context.fraction_coeff_count, context.base)
+        self.plain_cache = PlaintextCache() if plain_cache is None else plain_cache
+        self._ev_keys = None
+        # Number of homomorphic operations issued through this object, keyed by evaluator method
+        self.op_counts = Counter()
+        self._counts_lock = threading.Lock()
+
+    def _thread_local(self, name: str, create):
+        value = getattr(self._local, name, None)
+        if value is None:
+            value = create()
+            setattr(self._local, name, value)
+        return value
+
+    @property
+    def evaluator(self) -> Evaluator:
+        return self._thread_local('evaluator', lambda: Evaluator(self.context))
+
+    @property
+    def encryptor(self) -> Encryptor:
+        return self._thread_local('encryptor', lambda: Encryptor(self.context, self.public_key))
+
+    @property
+    def encoder(self) -> FractionalEncoder:
+        return self._thread_local('encoder', self.frac_context.fractional_encoder)
+
+    @property
+    def ev_keys(self) -> EvaluationKeys:
+        """
+        Evaluation keys of the relinearization policy, generated on first relinearization
+        """
+        if self._ev_keys is None:
+            self._ev_keys = self.frac_context.evaluation_keys(self.decomposition_bit_count,
+                                                              self.relin_policy.ev_key_count)
+        return self._ev_keys
+
+    @ev_keys.setter
+    def ev_keys(self, ev_keys: EvaluationKeys):
+        self._ev_keys = ev_keys
+
+    def _count(self, op: str, n: int = 1):
+        # Operations may be issued by several threads at once
+        with self._counts_lock:
+            self.op_counts[op] += n
+
+    def encode(self, num) -> Plaintext:
+        """
+        Cached encoding of a number. The result is shared and must not be modified in place
+        """
+        num = float(num)
+        return self.plain_cache.get((num, self._encoder_key), lambda: self.encoder.encode(num))
 
     def encode_rationals(self, numbers) -> List[Plaintext]:
         # encoding without encryption
         encoded_coefficients = []
         for i in range(len(numbers)):
-            encoded_coefficients.append(self.encoder.encode(numbers[i]))
+            encoded_coefficients.append(self.encode(numbers[i]))
         return encoded_coefficients
 
     def encode_num(self, num) -> Plaintext:
         if type(num) == Plaintext or num is None:
             return num
         else:  # encoding without encryption
-            return self.encoder.encode(num)
+            return self.encode(num)
 
-    def sum_enc_array(self, array: List[Ciphertext]) -> Ciphertext:
+    def sum_enc_array(self, array: List[Ciphertext], out: Ciphertext = None) -> Ciphertext:
         # can applied for 1D array only
-        encrypted_result = Ciphertext()
+        encrypted_result = self._new() if out is None else out
         self.evaluator.add_many(array, encrypted_result)
+        self._count('add', len(array) - 1)
         return encrypted_result
 
+    def dot(self, a: List, b: List) -> Ciphertext:
+        """
+        Dot product of 2 vectors of encrypted (or encoded) values
+        :param a: list of ciphertexts or plaintexts
+        :param b: list of ciphertexts or plaintexts
+        :return: encrypted dot product
+        """
+        return kernels.dot(self, a, b)
+
     def encrypt_rationals(self, rational_numbers: List) -> List[Ciphertext]:
         """
         :param rational_numbers: array of rational numbers
         :return: encrypted result
         """
-        encrypted_rationals = []
-        for i in range(len(rational_numbers)):
-            encrypted_rationals.append(Ciphertext(self.context.params))
-            self.encryptor.encrypt(self.encoder.encode(rational_numbers[i]), encrypted_rationals[i])
-        return encrypted_rationals
+        return [self.encrypt_num(num, out=self.allocate()) for num in rational_numbers]
+
+    def allocate(self) -> Ciphertext:
+        """
+        Ciphertext with memory allocated for a fresh encryption
+        """
+        return Ciphertext(self.frac_context.params)
 
     def weighted_average(self, encrypted_rationals, encoded_coefficients, encoded_divide_by) -> Ciphertext:
         """
@@ -142,76 +405,174 @@ class FractionalEncoderUtils:
 
         return encrypted_result
 
-    def subtract(self, a: Ciphertext, b: Ciphertext) -> Ciphertext:
+    def subtract(self, a: Ciphertext, b: Ciphertext, out: Ciphertext = None) -> Ciphertext:
         """
         Substruction operation of 2 fractional numbers
         :param a: encrypted fractional value
         :param b: encrypted fractional value
+        :param out: ciphertext to write the result into (may be a itself), if None a new ciphertext is allocated
         :return: substracted result
         """
-        a = deepcopy(a)
-        minus_sign = self.encoder.encode(-1)
-        self.evaluator.multiply_plain(b, minus_sign)
-        self.evaluator.add(a, b)
-        return a
+        if out is b:
+            # a - b = -(b - a), computed in place of b
+            self.evaluator.sub(out, a)
+            self.evaluator.negate(out)
+            self._count('negate')
+        else:
+            out = self._destination(a, out)
+            self.evaluator.sub(out, b)
+        self._count('sub')
+        return out
 
-    def encrypt_num(self, value) -> Ciphertext:
+    def encrypt_num(self, value, out: Ciphertext = None) -> Ciphertext:
+        """
+        :param value: number or encoded number, ciphertexts are returned as is
+        :param out: preallocated ciphertext to encrypt into (see allocate), if None a new ciphertext is allocated
+        :return: encrypted value
+        """
         if type(value) == Ciphertext or value is None:
             return value
         else:
-            encrypted = Ciphertext()
+            encrypted = self._new() if out is None else out
             if type(value) == Plaintext:
                 self.encryptor.encrypt(value, encrypted)
             else:
-                plain = self.encoder.encode(value)
-                self.encryptor.encrypt(plain, encrypted)
+                self.encryptor.encrypt(self.encode(value), encrypted)
             return encrypted
 
-    def add(self, a: Ciphertext, b: Ciphertext) -> Ciphertext:
+    def add(self, a: Ciphertext, b: Ciphertext, out: Ciphertext = None) -> Ciphertext:
         """
         :param a: encrypted fractional value
         :param b: encrypted fractional value
+        :param out: ciphertext to write the result into (may be a itself), if None a new ciphertext is allocated
         :return: encrypted sum of a and b
         """
-        a = deepcopy(a)
-        self.evaluator.add(a, b)
-        return a
+        if out is b:  # commutative, b is updated in place
+            a, b = b, a
+        out = self._destination(a, out)
+        self.evaluator.add(out, b)
+        self._count('add')
+        return out
 
-    def add_plain(self, a: Ciphertext, b: Plaintext) -> Ciphertext:
+    def add_plain(self, a: Ciphertext, b: Plaintext, out: Ciphertext = None) -> Ciphertext:
         """
         :param a: encrypted fractional value
         :param b: encoded fractional value
+        :param out: ciphertext to write the result into (may be a itself), if None a new ciphertext is allocated
         :return: encrypted sum of a and b
         """
-        a = deepcopy(a)
-        self.evaluator.add_plain(a, b)
-        return a
+        out = self._destination(a, out)
+        self.evaluator.add_plain(out, b)
+        self._count('add_plain')
+        return out
 
-    def multiply(self, a: Ciphertext, b: Ciphertext) -> Ciphertext:
+    def multiply(self, a: Ciphertext, b: Ciphertext, out: Ciphertext = None, relinearize=True) -> Ciphertext:
         """
         :param a: encrypted fractional value
         :param b: encrypted fractional value
+        :param out: ciphertext to write the result into (may be a itself), if None a new ciphertext is allocated
+        :param relinearize: if False, the product is not relinearized by the 'always'/'size' policies (the caller
+        relinearizes later, e.g. after summation)
         :return: encrypted product of a and b
         """
-        a = deepcopy(a)
-        self.evaluator.multiply(a, b)
-        return a
+        copies = []
+        if self.relin_policy.mode == 'lazy':
+            # Operands may be shared (e.g. by threads of an executor), so they are relinearized into private copies;
+            # executors relinearize shared operands in place once before dispatching (see relinearize_operands)
+            operands = []
+            for operand in (a, b):
+                if operand.size() > 2:
+                    if operand is out:  # overwritten by the product anyway
+                        self.relinearize(operand, out=operand)
+                    else:
+                        operand = self.relinearize(operand)
+                        copies.append(operand)
+                operands.append(operand)
+            a, b = operands
+            if out is None and copies:
+                # The product is written into a private copy instead of one more new ciphertext
+                out = copies.pop(0)
+        if out is b:  # commutative, b is updated in place
+            a, b = b, a
+        out = self._destination(a, out)
+        self.evaluator.multiply(out, b)
+        self._count('multiply')
+        # Remaining private copies are temporaries
+        self.release(copies)
+        if relinearize and (self.relin_policy.mode == 'always' or
+                            (self.relin_policy.mode == 'size' and out.size() > self.relin_policy.max_size)):
+            self.relinearize(out, out=out)
+        return out
+
+    def relinearize_operands(self, op: str, operands: List):
+        """
+        With the 'lazy' policy, relinearizes ciphertext operands of multiply and dot in place before they are
+        dispatched to workers, so that every shared operand (e.g. weights repeated for every row) is relinearized once
+        and never modified while workers read it. Relinearization does not change the encrypted value
+        :param op: name of operation
+        :param operands: nested lists of operands
+        """
+        if self.relin_policy.mode != 'lazy' or op not in ('multiply', 'dot'):
+            return
+        seen = set()
+        stack = list(operands)
+        while stack:
+            operand = stack.pop()
+            if type(operand) == list:
+                stack.extend(operand)
+            elif type(operand) == Ciphertext and id(operand) not in seen:
+                seen.add(id(operand))
+                if operand.size() > 2:
+                    self.relinearize(operand, out=operand)
 
-    def multiply_plain(self, a: Ciphertext, b: Plaintext) -> Ciphertext:
+    def multiply_plain(self, a: Ciphertext, b: Plaintext, out: Ciphertext = None) -> Ciphertext:
         """
         :param a: encrypted fractional value
         :param b: encrypted fractional value
+        :param out: ciphertext to write the result into (may be a itself), if None a new ciphertext is allocated
         :return: encrypted product of a and b
         """
-        a = deepcopy(a)
-        self.evaluator.multiply_plain(a, b)
-        return a
+        out = self._destination(a, out)
+        self.evaluator.multiply_plain(out, b)
+        self._count('multiply_plain')
+        return out
 
-    def relinearize(self, a: Ciphertext) -> Ciphertext:
+    def relinearize(self, a: Ciphertext, out: Ciphertext = None) -> Ciphertext:
         """
         :param a: encrypted fractional value, supposedly result of multiplication
+        :param out: ciphertext to write the result into (may be a itself), if None a new ciphertext is allocated
         :return: relinearized a
         """
-        a = deepcopy(a)
-        self.evaluator.relinearize(a, self.ev_keys)
-        return a
+        out = self._destination(a, out)
+        self.evaluator.relinearize(out, self.ev_keys)
+        self._count('relinearize')
+        return out
+
+    def assign(self, destination: Ciphertext, source: Ciphertext) -> Ciphertext:
+        """
+        Copies source into an already allocated ciphertext with add_many. The binding converts [source] into a
+        vector, which copies source once more, so this is not cheaper than deepcopy by itself: the pool bounds the
+        number of resident ciphertexts, not the number of copies (see benchmarks/memory.py for both copies timed)
+        :param destination: ciphertext to overwrite
+        :param source: encrypted fractional value
+        :return: destination
+        """
+        self.evaluator.add_many([source], destination)
+        return destination
+
+    def _new(self) -> Ciphertext:
+        return Ciphertext() if self.pool is None else self.pool.acquire(self.allocate)
+
+    def release(self, ciphertexts: List[Ciphertext]):
+        """
+        Returns temporary ciphertexts to the pool (if any), the caller must not use them afterwards
+        """
+        if self.pool is not None:
+            self.pool.release(ciphertexts)
+
+    def _destination(self, a: Ciphertext, out: Ciphertext = None) -> Ciphertext:
+        if out is None:
+            return deepcopy(a) if self.pool is None else self.assign(self._new(), a)
+        if out is not a:
+            self.assign(out, a)
+        return out
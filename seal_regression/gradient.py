@@ -0,0 +1,129 @@
+from seal_regression.encarray import EncArray
+from seal_regression.executor import SerialExecutor
+from seal_regression._seal import Ciphertext
+from typing import List
+
+
+def _map(enc_utils, op: str, *operands: List, out: List = None) -> List:
+    # Independent operations are split across workers if enc_utils has an executor
+    executor = enc_utils.executor or SerialExecutor()
+    return executor.map(enc_utils, op, *operands, out=out)
+
+
+class ResidualGradientEngine:
+    def __init__(self, X: EncArray, y: EncArray):
+        """
+        Least-squares gradient X^T (X w - y) over encrypted data.
+        The residual vector X w - y is computed once per gradient and shared by all features. Row and column views
+        of X are built once at construction, so every gradient costs 2·n·d multiplications instead of n·d².
+        :param X: encrypted (or encoded) design matrix of shape (n, d)
+        :param y: encrypted target variable of shape (n, 1)
+
+        Example:
+        >> engine = ResidualGradientEngine(X_enc, y_enc)
+        >> gradient = engine.gradient(weights)
+        >> engine.last_op_counts
+        {'multiply': 2 * n * d, 'add': ..., ...}
+        """
+        self.enc_utils = X.enc_utils
+        self.n_samples, self.n_features = X.shape[0], X.shape[1]
+        self.rows = X.enc_arr
+        self.columns = [list(column) for column in zip(*X.enc_arr)]
+        self.targets = [row[0] for row in y.enc_arr]
+        self.last_op_counts = None
+
+    def _dots(self, lefts: List[List], rights: List[List]) -> List[Ciphertext]:
+        return _map(self.enc_utils, 'dot', lefts, rights)
+
+    def residual(self, weights: List[Ciphertext]) -> List[Ciphertext]:
+        """
+        Residual vector X w - y
+        :param weights: list of encrypted weights
+        :return: list of n encrypted residuals
+        """
+        dots = self._dots(self.n_samples * [weights], self.rows)
+        return _map(self.enc_utils, 'subtract', dots, self.targets, out=dots)
+
+    def gradient(self, weights: EncArray) -> EncArray:
+        """
+        Gradient of the least-squares loss (not divided by the sample size). Number of homomorphic operations, done
+        during the call, is stored in last_op_counts.
+        :param weights: encrypted weights, 1D array of length d
+        :return: encrypted gradient, 1D array of length d
+        """
+        counts_before = self.enc_utils.op_counts.copy()
+
+        residual = self.residual(weights.enc_arr)
+        gradient = self._dots(self.n_features * [residual], self.columns)
+        self.enc_utils.release(residual)
+
+        self.last_op_counts = dict(self.enc_utils.op_counts - counts_before)
+        return EncArray._wrap(gradient, enc_utils=self.enc_utils)
+
+
+class GramGradientEngine:
+    def __init__(self, X: EncArray, y: EncArray):
+        """
+        Least-squares gradient X^T X w - X^T y over encrypted data, with X^T X and X^T y computed once.
+        Only the upper triangle of the symmetric Gram matrix is computed (d·(d+1)/2 dot products of length n),
+        afterwards every gradient costs d² multiplications independently of n, and consumes the noise budget of one
+        multiplication per iteration instead of two.
+        :param X: encrypted (or encoded) design matrix of shape (n, d)
+        :param y: encrypted target variable of shape (n, 1)
+
+        Example:
+        >> engine = GramGradientEngine(X_enc, y_enc)
+        >> model.fit(X_enc, y_enc, gradient_engine=engine)
+        >> engine.append(X_new_enc, y_new_enc)  # O(m·d²) for m new rows
+        >> model.fit(X_enc, y_enc, gradient_engine=engine, init_weights=model.weigths)
+        """
+        self.enc_utils = X.enc_utils
+        self.n_samples, self.n_features = 0, X.shape[1]
+        self.gram = None
+        self.moments = None
+        self.last_op_counts = None
+        self.append(X, y)
+
+    def _products(self, X: EncArray, y: EncArray) -> tuple:
+        columns = [list(column) for column in zip(*X.enc_arr)]
+        targets = [row[0] for row in y.enc_arr]
+        pairs = [(i, j) for i in range(self.n_features) for j in range(i, self.n_features)]
+        dots = _map(self.enc_utils, 'dot', [columns[i] for i, _ in pairs] + columns,
+                    [columns[j] for _, j in pairs] + self.n_features * [targets])
+        return dict(zip(pairs, dots)), dots[len(pairs):]
+
+    def append(self, X: EncArray, y: EncArray):
+        """
+        Adds new rows to the Gram matrix and moments, without recomputing products of the rows seen before
+        :param X: encrypted (or encoded) new rows of shape (m, d)
+        :param y: encrypted target variable of new rows, shape (m, 1)
+        """
+        if X.shape[1] != self.n_features:
+            raise ValueError(f'Expected {self.n_features} features, got {X.shape[1]}')
+        upper, moments = self._products(X, y)
+        if self.gram is None:
+            # Lower triangle shares ciphertexts with the upper one
+            self.gram = [[upper[min(i, j), max(i, j)] for j in range(self.n_features)]
+                         for i in range(self.n_features)]
+            self.moments = moments
+        else:
+            pairs = list(upper.keys())
+            _map(self.enc_utils, 'add', [self.gram[i][j] for i, j in pairs], list(upper.values()),
+                 out=[self.gram[i][j] for i, j in pairs])
+            _map(self.enc_utils, 'add', self.moments, moments, out=self.moments)
+        self.n_samples += X.shape[0]
+
+    def gradient(self, weights: EncArray) -> EncArray:
+        """
+        Gradient of the least-squares loss (not divided by the sample size). Number of homomorphic operations, done
+        during the call, is stored in last_op_counts.
+        :param weights: encrypted weights, 1D array of length d
+        :return: encrypted gradient, 1D array of length d
+        """
+        counts_before = self.enc_utils.op_counts.copy()
+
+        dots = _map(self.enc_utils, 'dot', self.gram, self.n_features * [weights.enc_arr])
+        gradient = _map(self.enc_utils, 'subtract', dots, self.moments, out=dots)
+
+        self.last_op_counts = dict(self.enc_utils.op_counts - counts_before)
+        return EncArray._wrap(gradient, enc_utils=self.enc_utils)
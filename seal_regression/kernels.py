@@ -0,0 +1,147 @@
+from seal_regression._seal import Ciphertext, Plaintext
+from typing import List
+import threading
+import weakref
+
+# Per-thread scratch ciphertexts for products, reused by every dot product of the thread. Longer dot products are
+# summed in chunks of _SCRATCH_SIZE products, so every thread keeps at most _SCRATCH_SIZE of them per context
+_scratch = threading.local()
+_SCRATCH_SIZE = 32
+# Scratch ciphertexts of all threads, for memory accounting (see MemoryProfiler)
+_scratch_ciphertexts = weakref.WeakSet()
+_scratch_lock = threading.Lock()
+
+
+def _scratch_buffer(enc_utils, n: int) -> List[Ciphertext]:
+    buffers = _scratch.__dict__.setdefault('buffers', {})
+    key = enc_utils.frac_context.params_hash
+    buffer = buffers.setdefault(key, [])
+    while len(buffer) < n:
+        buffer.append(enc_utils.allocate())
+        with _scratch_lock:
+            _scratch_ciphertexts.add(buffer[-1])
+    return buffer
+
+
+def scratch_count() -> int:
+    """
+    Number of scratch ciphertexts, held by the dot kernel in all threads
+    """
+    with _scratch_lock:
+        return len(_scratch_ciphertexts)
+
+
+def _executor(enc_utils):
+    from seal_regression.executor import SerialExecutor
+    return enc_utils.executor or SerialExecutor()
+
+
+def _needs_relinearization(enc_utils, ciphertext: Ciphertext) -> bool:
+    policy = enc_utils.relin_policy
+    if policy.mode == 'always':
+        return ciphertext.size() > 2
+    if policy.mode == 'size':
+        return ciphertext.size() > policy.max_size
+    return False
+
+
+def dot(enc_utils, a: List, b: List, out: Ciphertext = None) -> Ciphertext:
+    """
+    Dot product kernel of FractionalEncoderUtils.dot and EncArray.__matmul__:
+    - products are written into preallocated scratch ciphertexts of the calling thread, at most _SCRATCH_SIZE of them;
+      longer dot products are accumulated chunk by chunk
+    - pairs with an encoded operand use multiply_plain, which neither grows the ciphertext nor needs relinearization;
+      zero plaintexts are skipped
+    - with the 'always' and 'size' relinearization policies, products are summed before relinearization, so every
+      dot product is relinearized at most once instead of once per product
+    - products are summed with a single add_many
+    :param enc_utils: FractionalEncoderUtils
+    :param a: list of ciphertexts or plaintexts
+    :param b: list of ciphertexts or plaintexts
+    :param out: ciphertext to write the result into (must not be an element of a or b), if None a new ciphertext is
+    allocated
+    :return: encrypted dot product
+    """
+    deferred_relinearization = enc_utils.relin_policy.mode in ('always', 'size')
+    scratch = _scratch_buffer(enc_utils, min(len(a), _SCRATCH_SIZE))
+    result = None
+    products = []
+    for ele_a, ele_b in zip(a, b):
+        if type(ele_a) == Plaintext:
+            ele_a, ele_b = ele_b, ele_a
+        if type(ele_a) == Plaintext:
+            raise ValueError('Dot product of two encoded vectors is not encrypted, compute it on plain values')
+        product = scratch[len(products)]
+        if type(ele_b) == Plaintext:
+            if not ele_b.is_zero():  # multiply_plain rejects zero plaintexts
+                products.append(enc_utils.multiply_plain(ele_a, ele_b, out=product))
+        else:
+            products.append(enc_utils.multiply(ele_a, ele_b, out=product, relinearize=not deferred_relinearization))
+        if len(products) == len(scratch):
+            result = _accumulate(enc_utils, result, products, out)
+            products = []
+
+    if products:
+        result = _accumulate(enc_utils, result, products, out)
+    if result is None:
+        return enc_utils.encrypt_num(0.0, out=out)
+    if _needs_relinearization(enc_utils, result):
+        enc_utils.relinearize(result, out=result)
+    return result
+
+
+def _accumulate(enc_utils, result: Ciphertext, products: List[Ciphertext], out: Ciphertext = None) -> Ciphertext:
+    """
+    Adds products (scratch ciphertexts) to the partial sum result, which is written into out when it is started
+    """
+    if result is None:
+        return enc_utils.sum_enc_array(products, out=out)
+    for product in products:
+        enc_utils.add(result, product, out=result)
+    return result
+
+
+def reduce_sum(enc_utils, items: List[Ciphertext], out: Ciphertext = None) -> Ciphertext:
+    """
+    Sum of ciphertexts as a balanced tree: while there are more items than workers of the executor of enc_utils, the
+    items are split into one block per worker, summed in parallel with add_many; the last level is summed here.
+    Without an executor it is a single add_many.
+    :param items: ciphertexts to sum
+    :param out: ciphertext to write the result into (must not be one of items)
+    :return: encrypted sum
+    """
+    from seal_regression.executor import chunk_slices
+    executor = _executor(enc_utils)
+    while executor.n_workers > 1 and len(items) > executor.n_workers:
+        items = executor.map(enc_utils, 'sum_enc_array',
+                             [items[chunk] for chunk in chunk_slices(len(items), executor.n_workers)])
+    return enc_utils.sum_enc_array(items, out=out)
+
+
+def sum_vectors(enc_utils, vectors: List[List[Ciphertext]]) -> List[Ciphertext]:
+    """
+    Sums of many vectors (e.g. rows or columns of a matrix), every sum is one add_many task of the executor
+    """
+    return _executor(enc_utils).map(enc_utils, 'sum_enc_array', vectors)
+
+
+def matmul(enc_utils, rows: List[List], columns: List[List]) -> List[List[Ciphertext]]:
+    """
+    All dot products of rows and columns, every product is one dot kernel task of the executor
+    :param rows: rows of the left operand (lists of ciphertexts or plaintexts)
+    :param columns: columns of the right operand
+    :return: nested list of shape (len(rows), len(columns))
+    """
+    products = _executor(enc_utils).map(enc_utils, 'dot', [row for row in rows for _ in columns],
+                                        [column for _ in rows for column in columns])
+    return [products[i * len(columns):(i + 1) * len(columns)] for i in range(len(rows))]
+
+
+def matvec(enc_utils, rows: List[List], vector: List) -> List[Ciphertext]:
+    """
+    Products of rows with one vector, split across workers if enc_utils has an executor
+    :param rows: list of rows (lists of ciphertexts or plaintexts)
+    :param vector: list of ciphertexts or plaintexts, e.g. pre-encoded weights
+    :return: list of encrypted dot products
+    """
+    return _executor(enc_utils).map(enc_utils, 'dot', rows, len(rows) * [vector])
@@ -0,0 +1,112 @@
+from seal_regression.serialization import to_bytes, from_bytes
+import hashlib
+import json
+import os
+import shutil
+
+
+class KeyStore:
+    def __init__(self, directory: str, save_secret_key=False):
+        """
+        On-disk cache of keys, saved with SEAL serialization. Keys are stored per encryption parameters (hash of
+        them) and per key pair (hash of its public key), so that jobs with the same parameters never overwrite each
+        other's keys. Evaluation and Galois keys are generated once per key pair, and workers (see ProcessExecutor)
+        load public and evaluation keys of their key pair instead of receiving them. Key files are readable by the
+        owner only.
+        :param directory: directory of the store, created if missing
+        :param save_secret_key: if True, the secret key is written to disk as well and its key pair becomes the current
+        one of the parameters: later key holders load it and skip key generation (and evaluation/Galois key
+        generation). By default the secret key stays in memory, so every key holder generates a new key pair and
+        the store only shares its keys with workers of the same run: it does not make startup faster
+
+        Example:
+        >> store = KeyStore('~/.seal_regression/keys', save_secret_key=True)
+        >> context = FracContext(key_store=store)  # keygen on the first run only
+        """
+        self.directory = os.path.expanduser(directory)
+        self.save_secret_key = save_secret_key
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+
+    @staticmethod
+    def params_hash(primes, poly_modulus, plain_modulus) -> str:
+        """
+        Hash of encryption parameters, keys depend on. Encoder configuration (integer_coeff_count,
+        fraction_coeff_count, base) does not change keys and is checked separately, e.g. in saved arrays
+        """
+        description = json.dumps({'poly_modulus': poly_modulus, 'coeff_modulus': [int(p) for p in primes],
+                                  'plain_modulus': int(plain_modulus)}, sort_keys=True)
+        return hashlib.sha256(description.encode()).hexdigest()[:16]
+
+    @staticmethod
+    def key_id(public_key) -> str:
+        """
+        Identity of a key pair: hash of its serialized public key
+        """
+        return hashlib.sha256(to_bytes(public_key)).hexdigest()[:16]
+
+    def _path(self, params_hash: str, key_id: str, name: str) -> str:
+        return os.path.join(self.directory, params_hash, key_id, name)
+
+    def _write(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        # Written to a temporary file first, so that concurrent readers never see a partial file
+        fd = os.open(path + '.tmp', os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+
+    def has(self, params_hash: str, key_id: str, name: str) -> bool:
+        return os.path.exists(self._path(params_hash, key_id, name))
+
+    def load(self, params_hash: str, key_id: str, name: str, obj):
+        """
+        Loads stored key into obj
+        :param params_hash: result of params_hash
+        :param key_id: result of key_id
+        :param name: name of the key, e.g. 'public_key'
+        :param obj: empty SEAL object of the right type
+        :return: obj, or None if the key is not stored
+        """
+        if not self.has(params_hash, key_id, name):
+            return None
+        with open(self._path(params_hash, key_id, name), 'rb') as f:
+            return from_bytes(f.read(), obj)
+
+    def current_key_id(self, params_hash: str) -> str:
+        """
+        :return: key pair, whose secret key was saved last for the parameters, or None
+        """
+        path = os.path.join(self.directory, params_hash, 'current')
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return f.read().strip()
+
+    def save_params(self, params_hash: str, config: dict):
+        """
+        Saves FracContext arguments next to the keys, so that the context can be recreated from the store
+        """
+        path = os.path.join(self.directory, params_hash, 'params.json')
+        self._write(path, json.dumps(config, indent=2, sort_keys=True).encode())
+
+    def load_params(self, params_hash: str) -> dict:
+        with open(os.path.join(self.directory, params_hash, 'params.json')) as f:
+            return json.load(f)
+
+    def clear(self, params_hash: str, key_id: str = None):
+        """
+        Removes stored keys of a key pair, or of all key pairs of the parameters if key_id is None
+        """
+        if key_id is None:
+            shutil.rmtree(os.path.join(self.directory, params_hash), ignore_errors=True)
+            return
+        shutil.rmtree(os.path.join(self.directory, params_hash, key_id), ignore_errors=True)
+        if self.current_key_id(params_hash) == key_id:
+            os.remove(os.path.join(self.directory, params_hash, 'current'))
+
+    def save(self, params_hash: str, key_id: str, name: str, obj):
+        if name == 'secret_key' and not self.save_secret_key:
+            return
+        self._write(self._path(params_hash, key_id, name), to_bytes(obj))
+        if name == 'secret_key':
+            self._write(os.path.join(self.directory, params_hash, 'current'), key_id.encode())
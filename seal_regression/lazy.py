@@ -0,0 +1,309 @@
+from seal_regression.encarray import EncArray
+from seal_regression.fractions_utils import FractionalEncoderUtils, FractionalDecryptorUtils
+from seal_regression._seal import Ciphertext, Plaintext
+import numpy as np
+import heapq
+import threading
+import weakref
+from typing import List
+
+COMMUTATIVE_OPS = ('add', 'mul')
+
+# One expression graph per encoder utils, so that lazy arrays over the same context share common subexpressions
+_default_graphs = weakref.WeakKeyDictionary()
+
+
+def _hashable_index(item):
+    if type(item) == slice:
+        return 'slice', item.start, item.stop, item.step
+    if type(item) == tuple:
+        return tuple(_hashable_index(ele) for ele in item)
+    return item
+
+
+class Node:
+    def __init__(self, op: str, children: tuple = (), arg=None, leaf: EncArray = None):
+        """
+        Node of expression graph: either a leaf holding an evaluated EncArray, or an operation over child nodes
+        :param op: 'leaf', 'add', 'sub', 'mul', 'matmul', 'sum', 'T' or 'getitem'
+        :param children: operand nodes
+        :param arg: index for 'getitem', axis for 'sum'
+        :param leaf: array for 'leaf', read when the graph is evaluated (in-place changes of it are visible)
+        """
+        self.op = op
+        self.children = children
+        self.arg = arg
+        self.leaf = leaf
+        self.n_consumers = 0
+        for child in children:
+            child.n_consumers += 1
+
+        if op == 'leaf':
+            self.shape, self.dtype, self.depth = tuple(leaf.shape), leaf.dtype, 0
+        else:
+            self.shape = self._infer_shape()
+            self.dtype = Ciphertext if any(child.dtype == Ciphertext for child in children) else Plaintext
+            depths = [child.depth for child in children]
+            # Multiplicative depth of ciphertext-ciphertext products, used to order multiplications
+            ct_product = op in ('mul', 'matmul') and all(child.dtype == Ciphertext for child in children)
+            self.depth = max(depths) + 1 if ct_product else max(depths)
+
+    def _infer_shape(self) -> tuple:
+        shapes = [child.shape for child in self.children]
+        if self.op in ('add', 'sub', 'mul'):
+            if shapes[0] != shapes[1]:
+                raise ValueError(f'Dimensions are not equal: {shapes[0]} and {shapes[1]}')
+            return shapes[0]
+        elif self.op == 'matmul':
+            # 1D operands are vectors, as in EncArray.__matmul__
+            if not 1 <= len(shapes[0]) <= 2 or not 1 <= len(shapes[1]) <= 2 or shapes[0][-1] != shapes[1][0]:
+                raise ValueError(f'Dimensions are not aligned: {shapes[0]} and {shapes[1]}')
+            return shapes[0][:-1] + shapes[1][1:]
+        elif self.op == 'sum':
+            if self.arg is None or len(shapes[0]) == 1:
+                return ()
+            if len(shapes[0]) != 2 or self.arg not in (0, 1):
+                raise ValueError('Sum along an axis is supported for 2D arrays and axis 0 or 1 only')
+            return shapes[0][1 - self.arg],
+        elif self.op == 'T':
+            return shapes[0][::-1]
+        # Zero-stride view of a single element: the index is applied to the shape without allocating the array
+        return np.broadcast_to(np.empty(()), shapes[0])[self.arg].shape
+
+
+class ExpressionGraph:
+    def __init__(self, enc_utils: FractionalEncoderUtils):
+        """
+        Interning table of expression nodes. Structurally identical expressions (e.g. X.T[j] built in every iteration
+        of a loop) are mapped to the same node, so they are evaluated only once per evaluation. Values are not kept
+        between evaluations: leaves may be changed in place (e.g. weights -= step), so every evaluation reads their
+        current ciphertexts. Expressions sharing subexpressions are evaluated together with evaluate_many. Nodes are
+        held weakly and disappear together with the last lazy array referencing them.
+        :param enc_utils: Fractional utils class providing basic operations on cyphertext
+        """
+        self.enc_utils = enc_utils
+        self.nodes = weakref.WeakValueDictionary()
+        # The graph is shared by all lazy arrays of enc_utils, so the memo of an evaluation is per thread
+        self._local = threading.local()
+
+    @staticmethod
+    def default(enc_utils: FractionalEncoderUtils):
+        """
+        Expression graph shared by all lazy arrays of enc_utils
+        """
+        if enc_utils not in _default_graphs:
+            _default_graphs[enc_utils] = ExpressionGraph(enc_utils)
+        return _default_graphs[enc_utils]
+
+    def leaf(self, array: EncArray) -> Node:
+        key = ('leaf', id(array))
+        node = self.nodes.get(key)
+        if node is None:
+            node = Node('leaf', leaf=array)
+            self.nodes[key] = node
+        return node
+
+    def node(self, op: str, children: tuple, arg=None) -> Node:
+        child_keys = [id(child) for child in children]
+        if op in COMMUTATIVE_OPS:
+            child_keys.sort()
+        key = (op, tuple(child_keys), _hashable_index(arg))
+        node = self.nodes.get(key)
+        if node is None:
+            node = Node(op, children, arg)
+            self.nodes[key] = node
+        return node
+
+    def evaluate(self, node: Node) -> EncArray:
+        """
+        Evaluates node, computing every subexpression once
+        """
+        return self.evaluate_many([node])[0]
+
+    def evaluate_many(self, nodes: List[Node]) -> List[EncArray]:
+        """
+        Evaluates nodes together, so that subexpressions shared between them are computed once
+        """
+        self._local.values = {}
+        try:
+            return [self._evaluate(node) for node in nodes]
+        finally:
+            self._local.values = None
+
+    def _evaluate(self, node: Node) -> EncArray:
+        if node.op == 'leaf':
+            return node.leaf
+        # Memoized for the current evaluation only, keyed by id: nodes stay alive while it runs
+        values = self._local.values
+        if id(node) not in values:
+            values[id(node)] = getattr(self, f'_evaluate_{node.op}')(node)
+        return values[id(node)]
+
+    def _flatten(self, node: Node, op: str) -> List[Node]:
+        # Chains of the same operation, which are not shared with other expressions, are fused
+        terms = []
+        for child in node.children:
+            if child.op == op and id(child) not in self._local.values and child.n_consumers == 1:
+                terms.extend(self._flatten(child, op))
+            else:
+                terms.append(child)
+        return terms
+
+    def _evaluate_add(self, node: Node) -> EncArray:
+        terms = [self._evaluate(term) for term in self._flatten(node, 'add')]
+        ciphers = [term.enc_arr for term in terms if term.dtype == Ciphertext]
+        plains = [term.enc_arr for term in terms if term.dtype == Plaintext]
+        if len(ciphers) == 0:
+            raise ValueError('Not supported operation: sum of encoded arrays')
+        result = self._add_many(ciphers)
+        for plain in plains:
+            EncArray._recur_apply(result, plain, fun=self.enc_utils.add_plain, out=result)
+        return EncArray._wrap(result, self.enc_utils)
+
+    def _add_many(self, arrays: List):
+        # One add_many call per element instead of a chain of binary additions
+        if type(arrays[0]) != list:
+            return self.enc_utils.sum_enc_array(arrays)
+        return [self._add_many([array[i] for array in arrays]) for i in range(len(arrays[0]))]
+
+    def _evaluate_sub(self, node: Node) -> EncArray:
+        a, b = [self._evaluate(child) for child in node.children]
+        if a.dtype != Ciphertext or b.dtype != Ciphertext:
+            raise ValueError('Not supported operation: subtraction with encoded arrays')
+        return EncArray._wrap(EncArray._recur_apply(a.enc_arr, b.enc_arr, fun=self.enc_utils.subtract), self.enc_utils)
+
+    def _evaluate_mul(self, node: Node) -> EncArray:
+        factors = self._flatten(node, 'mul')
+        plains = [self._evaluate(factor) for factor in factors if factor.dtype == Plaintext]
+        ciphers = [factor for factor in factors if factor.dtype == Ciphertext]
+        if len(ciphers) == 0:
+            raise ValueError('Not supported operation: product of encoded arrays')
+
+        # Balanced product tree: the two shallowest operands are multiplied first, which keeps the multiplicative
+        # depth (and so noise consumption) of a k-factor product at log2(k) instead of k - 1
+        heap = [(factor.depth, i, self._evaluate(factor)) for i, factor in enumerate(ciphers)]
+        heapq.heapify(heap)
+        counter, owned = len(heap), False
+        while len(heap) > 1:
+            depth_a, _, a = heapq.heappop(heap)
+            depth_b, _, b = heapq.heappop(heap)
+            heapq.heappush(heap, (max(depth_a, depth_b) + 1, counter, a * b))
+            counter, owned = counter + 1, True
+        result = heap[0][2]
+
+        # Plaintext factors do not increase ciphertext size, they are applied last and in place
+        for plain in plains:
+            if owned:
+                result.multiply(plain, out=result)
+            else:
+                result, owned = result * plain, True
+        return result
+
+    def _evaluate_matmul(self, node: Node) -> EncArray:
+        return self._evaluate(node.children[0]) @ self._evaluate(node.children[1])
+
+    def _evaluate_sum(self, node: Node) -> EncArray:
+        return self._evaluate(node.children[0]).sum(node.arg)
+
+    def _evaluate_T(self, node: Node) -> EncArray:
+        return self._evaluate(node.children[0]).T
+
+    def _evaluate_getitem(self, node: Node) -> EncArray:
+        return self._evaluate(node.children[0])[node.arg]
+
+
+class LazyEncArray:
+    def __init__(self, node: Node, graph: ExpressionGraph):
+        """
+        Deferred EncArray: operations build an expression graph, which is evaluated on evaluate() or decrypt_array().
+        Identical subexpressions are computed once, chains of additions are fused into add_many calls and chains of
+        multiplications are evaluated as balanced product trees.
+        :param node: expression node
+        :param graph: expression graph the node belongs to
+
+        Example:
+        >> X_lazy, y_lazy, w_lazy = X.lazy(), y.lazy(), w.lazy()
+        >> residual = [(w_lazy * X_lazy[i]).sum() for i in range(len(X))]  # built, not computed
+        >> gradient = [...]  # naive per-feature loop
+        >> gradient = LazyEncArray.evaluate_many(gradient)  # X.T[j] and the residual are evaluated once
+        >> gradient[0].decrypt_array(decode_utils)
+        """
+        self.node = node
+        self.graph = graph
+
+    @property
+    def shape(self) -> tuple:
+        return self.node.shape
+
+    @property
+    def ndim(self) -> int:
+        return len(self.node.shape)
+
+    @property
+    def dtype(self):
+        return self.node.dtype
+
+    def __len__(self):
+        return self.node.shape[0]
+
+    def _as_node(self, o) -> Node:
+        if type(o) == EncArray:
+            return self.graph.leaf(o)
+        if o.graph is not self.graph:
+            raise ValueError('Lazy arrays belong to different expression graphs')
+        return o.node
+
+    def _new(self, op: str, children: tuple, arg=None):
+        return LazyEncArray(self.graph.node(op, children, arg), self.graph)
+
+    def __add__(self, o):
+        return self._new('add', (self.node, self._as_node(o)))
+
+    def __sub__(self, o):
+        return self._new('sub', (self.node, self._as_node(o)))
+
+    def __mul__(self, o):
+        return self._new('mul', (self.node, self._as_node(o)))
+
+    def __matmul__(self, o):
+        return self._new('matmul', (self.node, self._as_node(o)))
+
+    def sum(self, axis: int = None):
+        return self._new('sum', (self.node,), axis)
+
+    @property
+    def T(self):
+        if self.ndim == 1:
+            return self
+        return self._new('T', (self.node,))
+
+    def __getitem__(self, item):
+        return self._new('getitem', (self.node,), item)
+
+    def evaluate(self) -> EncArray:
+        """
+        Computes the expression
+        :return: encrypted result
+        """
+        return self.graph.evaluate(self.node)
+
+    @staticmethod
+    def evaluate_many(arrays: List['LazyEncArray']) -> List[EncArray]:
+        """
+        Computes several expressions of the same graph, shared subexpressions are computed once
+        :return: encrypted results
+
+        Example:
+        >> gradient = LazyEncArray.evaluate_many([(X_lazy.T[j] * residual).sum() for j in range(n_features)])
+        """
+        if len({id(array.graph) for array in arrays}) > 1:
+            raise ValueError('Lazy arrays belong to different expression graphs')
+        return arrays[0].graph.evaluate_many([array.node for array in arrays]) if arrays else []
+
+    def decrypt_array(self, decode_utils: FractionalDecryptorUtils):
+        """
+        Computes the expression and decrypts the result
+        :param decode_utils: Decoder class initiliazed with the same context as encoder
+        :returns: decrypted array
+        """
+        return self.evaluate().decrypt_array(decode_utils)
@@ -1,7 +1,18 @@
 from seal_regression.encarray import EncArray
+from seal_regression.gradient import GramGradientEngine, ResidualGradientEngine
+from seal_regression.packed import PackedEncArray, BatchDecryptorUtils, fixed_point_scale_bits, magnitude_bits
+from seal_regression.refresh import Refresher
+from seal_regression.stream import prefetched, rebatch
+from seal_regression.profiler import scope
+from seal_regression.simulation import SimArray, SimGradientEngine
+from seal_regression.optimizers import Optimizer
 from seal_regression.fractions_utils import FractionalEncoderUtils, FracContext, FractionalDecryptorUtils
 import numpy as np
-from seal import Plaintext
+from seal_regression._seal import Plaintext
+from time import time
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class SecureLinearRegression:
@@ -37,81 +48,290 @@ class SecureLinearRegression:
         """
         self.weigths = None
         self.coef = None
+        self.optimizer = None
+        self.op_counts = []
+        self.history = []
+        self._previous_budget = None
 
-    def fit_unencrypted(self, X, y, lr=0.2, n_iter=10, verbose=False):
+    def fit_unencrypted(self, X, y, lr=0.2, n_iter=10, verbose=False, optimizer: Optimizer = None):
         """
         Gradient-descent based least-squares parameter estimation for unencrypted data (for comparison).
         :param X: unencrypted design matrix
         :param y: unencrypted target variable
         :param lr: learning rate
         :param n_iter: number of iterations
+        :param optimizer: update rule (seal_regression.optimizers), default is gradient descent with lr
         """
         X = np.array(X)
-        y = np.array(y)
+        y = np.array(y)[:, 0]
 
         self.weigths = np.array(X.shape[1] * [0.0])
         self.coef = np.array(X.shape[1] * [lr / X.shape[0]])
+        if optimizer is not None:
+            optimizer.start(self.weigths, X.shape[0])
 
         for it in (range(n_iter)):
-            gradient = []
-            for j in range(X.shape[1]):
-                loss = []
-                for i in range(X.shape[0]):
-                    loss.append(((self.weigths * X[i]).sum() - y[i][0]))
-                loss = np.array(loss)
-                gradient.append((loss * X.T[j]).sum())
-            gradient = np.array(gradient)
+            point = self.weigths if optimizer is None else optimizer.point(self.weigths)
+            gradient = X.T @ (X @ point - y)
             if verbose:
-                print(f'Iteration: {it}. Gradient: {gradient}')
+                logger.info(f'Iteration: {it}. Gradient: {gradient}')
 
-            self.weigths = self.weigths - self.coef * gradient
+            if optimizer is None:
+                self.weigths = self.weigths - self.coef * gradient
+            else:
+                self.weigths = optimizer.update(self.weigths, point, gradient)
         # print(f'Real result: {(np.linalg.inv(X.T@X) @X.T @ y).T[0]}')
 
     def fit(self, X: EncArray, y: EncArray, decode_utils: FractionalDecryptorUtils = None, init_weights: EncArray = None,
-            lr=0.2, n_iter=10, verbose=False):
+            lr=0.2, n_iter=10, verbose=False, gradient_engine=None, refresher: Refresher = None, refresh_threshold=10,
+            mode='residual', optimizer: Optimizer = None):
         """
         Gradient-descent based least-squares parameter estimation for encrypted data.
-        :param X: encrypted design matrix
+        :param X: encrypted design matrix, EncArray or PackedEncArray in 'columns' layout
         :param y: encrypted target variable
         :param decode_utils: decoder utils for monitoring
         :param init_weights: encrypted initial value for weights
         :param lr: learning rate
         :param n_iter: number of iterations
-        :param verbose: if True, noise budget and size is printed after each iteration
+        :param verbose: if True, gradient, noise budget and size are logged (INFO level of the
+        seal_regression.linear_regression logger) after each iteration
+        :param gradient_engine: object computing X^T (X w - y) with gradient(weights) method, e.g.
+        ShardedGradientEngine or GramGradientEngine with appended rows. Default is chosen by mode
+        :param refresher: re-encryption protocol (e.g. KeyHolderRefresher), which tracks the noise budget of weights.
+        If given, weights are refreshed as soon as the budget expected after the next iteration drops below
+        refresh_threshold, or after refresher.max_iterations updates (growth of plaintext coefficients), so fit can
+        run any number of iterations
+        :param refresh_threshold: noise budget margin in bits
+        :param mode: 'residual' computes X^T (X w - y) every iteration (ResidualGradientEngine), 'gram' precomputes
+        X^T X and X^T y once and makes iterations independent of the sample size (GramGradientEngine). Ignored if
+        gradient_engine is given
+        :param optimizer: update rule (seal_regression.optimizers), e.g. Nesterov or ChebyshevInverse to reach the
+        same loss in fewer iterations. Default is gradient descent with lr
+
+        Number of homomorphic operations of every iteration is stored in op_counts, time of every iteration and size
+        of weights after it (see FractionalEncoderUtils relinearization policy) are stored in history.
         """
-        # Ininitializing weights
+        if isinstance(X, PackedEncArray):
+            return self._fit_packed(X, y, decode_utils, init_weights, lr, n_iter, verbose, refresher)
+
+        # Ininitializing weights, of the same array type as X (EncArray or SimArray)
         if init_weights is None:
-            self.weigths = EncArray(X.shape[1] * [0.0], enc_utils=X.enc_utils)
+            self.weigths = type(X)(X.shape[1] * [0.0], enc_utils=X.enc_utils)
         else:
-            self.weigths = init_weights
+            # Weights are updated in place, so the caller's array is left untouched
+            self.weigths = init_weights.copy()
+
+        engine = gradient_engine
+        if engine is None:
+            if mode not in ('residual', 'gram'):
+                raise ValueError(f'Unknown mode: {mode}')
+            if isinstance(X, SimArray):
+                engine = SimGradientEngine(X, y, mode)
+            else:
+                engine = ResidualGradientEngine(X, y) if mode == 'residual' else GramGradientEngine(X, y)
 
-        # Learning weight divided by sample size
-        if type(self.coef) != EncArray:
-            self.coef = EncArray(X.shape[1] * [lr / X.shape[0]], enc_utils=X.enc_utils, dtype=Plaintext)
+        # Learning weight divided by sample size (engine may hold more rows than X), encodings are cached by enc_utils
+        self.coef = type(X)(X.shape[1] * [lr / engine.n_samples], enc_utils=X.enc_utils, dtype=Plaintext)
+        self.optimizer = optimizer
+        if optimizer is not None:
+            optimizer.start(self.weigths, engine.n_samples)
 
         # Gradient descent
+        self.op_counts = []
+        self.history = []
+        self._previous_budget = refresher.noise_budget(self.weigths) if refresher is not None else None
+        for it in (range(n_iter)):
+            self._step(engine, it, decode_utils, verbose, refresher, refresh_threshold)
+
+    def _step(self, engine, it, decode_utils=None, verbose=False, refresher: Refresher = None, refresh_threshold=10):
+        """
+        One gradient descent update of weights with self.coef, followed by a refresh if the noise budget runs low
+        """
+        with scope(f'iteration {it}'):
+            return self._update(engine, it, decode_utils, verbose, refresher, refresh_threshold)
+
+    def _update(self, engine, it, decode_utils=None, verbose=False, refresher: Refresher = None, refresh_threshold=10):
+        start = time()
+        point = self.weigths if self.optimizer is None else self.optimizer.point(self.weigths)
+        gradient = engine.gradient(point)
+        self.op_counts.append(engine.last_op_counts)
+        if verbose:
+            logger.info(f'Iteration: {it}. Gradient: {gradient.decrypt_array(decode_utils)}. '
+                        f'Noise budget: {self.weigths.noise_budget(decode_utils)}. '
+                        f'Size of weights: {self.weigths.mem_size()}. '
+                        f'HE operations: {engine.last_op_counts}')
+        else:
+            logger.debug(f'Iteration: {it}')
+        if self.optimizer is None:
+            self.weigths -= self.coef.multiply(gradient, out=gradient)
+        else:
+            self.weigths = self.optimizer.update(self.weigths, point, gradient)
+        if isinstance(gradient, EncArray):
+            # Gradient is a temporary, its ciphertexts are recycled if enc_utils has a pool
+            gradient.enc_utils.release(gradient._flat())
+        record = {'time': time() - start, 'weights_size': self.weigths.mem_size(),
+                  'relinearizations': engine.last_op_counts.get('relinearize', 0)}
+
+        if refresher is not None:
+            refresher.step()
+            budget = refresher.noise_budget(self.weigths)
+            budget_drop = self._previous_budget - budget
+            record['noise_budget'] = budget
+            if budget - budget_drop < refresh_threshold or refresher.needs_refresh():
+                logger.info(f'Noise budget of weights: {budget}, iterations since encryption: '
+                            f'{refresher.iterations}. Refreshing weights')
+                self.weigths = refresher.refresh(self.weigths)
+                refresher.reset()
+                if self.optimizer is not None:
+                    self.optimizer.restart(self.weigths)
+                record['refreshed'] = True
+                budget = refresher.noise_budget(self.weigths)
+            self._previous_budget = budget
+        self.history.append(record)
+        return record
+
+    def partial_fit(self, X: EncArray, y: EncArray, decode_utils: FractionalDecryptorUtils = None,
+                    init_weights: EncArray = None, lr=0.2, verbose=False, refresher: Refresher = None,
+                    refresh_threshold=10):
+        """
+        One mini-batch gradient descent update of the current weights (zeros or init_weights on the first call).
+        The gradient is averaged over the batch, so batches of different size can be mixed.
+        :param X: encrypted mini-batch of the design matrix, shape (m, d)
+        :param y: encrypted target variable of the mini-batch, shape (m, 1)
+        Other parameters are the same as in fit
+        :return: self
+        """
+        if self.weigths is None or init_weights is not None:
+            self.weigths = type(X)(X.shape[1] * [0.0], enc_utils=X.enc_utils) if init_weights is None \
+                else init_weights.copy()
+            self.op_counts = []
+            self.history = []
+            self._previous_budget = refresher.noise_budget(self.weigths) if refresher is not None else None
+        elif refresher is not None and self._previous_budget is None:
+            self._previous_budget = refresher.noise_budget(self.weigths)
+
+        self.coef = type(X)(X.shape[1] * [lr / X.shape[0]], enc_utils=X.enc_utils, dtype=Plaintext)
+        self.optimizer = None
+        engine = SimGradientEngine(X, y) if isinstance(X, SimArray) else ResidualGradientEngine(X, y)
+        record = self._step(engine, len(self.history), decode_utils, verbose, refresher,
+                            refresh_threshold)
+        record['batch_size'] = X.shape[0]
+        return self
+
+    def fit_stream(self, batches, decode_utils: FractionalDecryptorUtils = None, init_weights: EncArray = None,
+                   lr=0.2, n_epochs=1, batch_size: int = None, prefetch=1, verbose=False, refresher: Refresher = None,
+                   refresh_threshold=10):
+        """
+        Mini-batch gradient descent over a stream of encrypted batches, e.g. loaded lazily from disk. Only the batch
+        being processed and at most prefetch batches, loaded ahead by a background thread, are held in memory
+        (prefetch=0 holds a single batch).
+        :param batches: iterable of (X, y) pairs of EncArrays, or a function returning such an iterable (required
+        for n_epochs > 1, e.g. a generator function)
+        :param decode_utils: decoder utils for monitoring
+        :param init_weights: encrypted initial value for weights, default are the current weights (or zeros)
+        :param lr: learning rate
+        :param n_epochs: number of passes over batches
+        :param batch_size: if given, incoming batches are split or merged into batches of this number of rows
+        :param prefetch: number of batches, loaded ahead while the current one is processed; 0 loads in the
+        calling thread
+        Other parameters are the same as in fit
+        :return: self
+
+        Example:
+        >> def batches():
+        >>     for path in shard_paths:
+        >>         yield load_shard(path)  # (X_enc, y_enc) of one shard
+        >> model.fit_stream(batches, n_epochs=3, batch_size=64)
+        """
+        if not callable(batches) and n_epochs > 1:
+            raise ValueError('batches must be a function returning an iterable for n_epochs > 1')
+        for epoch in range(n_epochs):
+            stream = batches() if callable(batches) else batches
+            if batch_size is not None:
+                stream = rebatch(stream, batch_size)
+            for X, y in prefetched(stream, prefetch):
+                self.partial_fit(X, y, decode_utils, init_weights, lr, verbose, refresher, refresh_threshold)
+                init_weights = None
+        return self
+
+    def _fit_packed(self, X: PackedEncArray, y: PackedEncArray, decode_utils: BatchDecryptorUtils = None,
+                    init_weights: PackedEncArray = None, lr=0.2, n_iter=10, verbose=False,
+                    refresher: Refresher = None):
+        """
+        Gradient descent over slot-packed data. Weights are kept in 'broadcast' layout, so that both X @ w and
+        X.T @ residual need only d ciphertext multiplications per iteration. The scheme can not rescale, so the
+        fixed-point scale of weights grows by scale of X (twice) plus scale of lr / n every iteration; lr / n is
+        encoded at a scale, which keeps enc_utils.scale_bits significant bits of it. Whenever the next iteration would
+        exceed the plain modulus (scale plus the integer bits of X^T @ r, a sum of n values bounded by
+        enc_utils.max_value), weights are re-encrypted at the initial scale by the refresher (e.g. KeyHolderRefresher
+        with BatchDecryptorUtils and BatchEncoderUtils).
+        """
+        if X.layout != 'columns':
+            raise ValueError('Packed design matrix has to be in the columns layout')
+        enc_utils = X.enc_utils
+        if init_weights is None:
+            self.weigths = PackedEncArray(X.shape[1] * [0.0], enc_utils, layout='broadcast')
+        else:
+            self.weigths = init_weights
+
+        coef = lr / X.shape[0]
+        self.coef = PackedEncArray(X.shape[1] * [coef], enc_utils, layout='broadcast', dtype=Plaintext,
+                                   scale_bits=fixed_point_scale_bits(coef, enc_utils.scale_bits))
+
+        targets = y.column(0) if y.ndim == 2 else y
+        X_T = X.T
+        # Scale of weights after an iteration: scales of X (in X @ w and X^T @ r) and lr / n are added to it
+        scale_growth = 2 * X.scale_bits + self.coef.scale_bits
+        # X^T @ r sums n products, whose integer part needs more bits than a single value
+        headroom = magnitude_bits(enc_utils.max_value, X.shape[0]) - magnitude_bits(enc_utils.max_value)
+        if enc_utils.scale_bits + scale_growth + headroom > enc_utils.max_scale_bits:
+            raise ValueError(f'One iteration needs a fixed-point scale of 2^{enc_utils.scale_bits + scale_growth} '
+                             f'and {headroom} bits for sums of {X.shape[0]} rows, plain modulus allows '
+                             f'2^{enc_utils.max_scale_bits}: use smaller scale_bits or larger plain modulus')
+        self.op_counts = []
         for it in (range(n_iter)):
-            gradient = []
-            for j in range(X.shape[1]):
-                loss = []
-                for i in range(X.shape[0]):
-                    loss.append(((self.weigths * X[i]).sum() - y[i][0]).enc_arr)
-                loss = EncArray(loss, enc_utils=X.enc_utils)
-                gradient.append((loss * X.T[j]).sum().enc_arr)
-            gradient = EncArray(gradient, enc_utils=X.enc_utils)
+            if self.weigths.scale_bits + scale_growth + headroom > enc_utils.max_scale_bits:
+                if refresher is None:
+                    raise ValueError(f'Fixed-point scale of weights would overflow the plain modulus at iteration '
+                                     f'{it}, pass a refresher to re-encrypt them')
+                logger.info(f'Scale of weights: 2^{self.weigths.scale_bits}. Refreshing weights')
+                self.weigths = refresher.refresh(self.weigths)
+                refresher.reset()
+            counts_before = enc_utils.op_counts.copy()
+            residual = X @ self.weigths - targets
+            gradient = X_T @ residual
+            self.op_counts.append(dict(enc_utils.op_counts - counts_before))
             if verbose:
-                print(f'Iteration: {it}. Gradient: {gradient.decrypt_array(decode_utils)}. '
-                      f'Noise budget: {self.weigths.noise_budget(decode_utils)}. '
-                      f'Size of weights: {self.weigths.mem_size()}')
+                logger.info(f'Iteration: {it}. Gradient: {gradient.decrypt_array(decode_utils)}. '
+                            f'Noise budget: {self.weigths.noise_budget(decode_utils)}. '
+                            f'Scale of weights: 2^{self.weigths.scale_bits}. '
+                            f'HE operations: {self.op_counts[-1]}')
             else:
-                print(f'Iteration: {it}')
+                logger.debug(f'Iteration: {it}')
             self.weigths = self.weigths - self.coef * gradient
 
-    def predict(self, X: EncArray) -> EncArray:
+    def predict(self, X: EncArray, weights: EncArray = None) -> EncArray:
         """
-        Prediction for data X.
-        :param X: encrypted design matrix
+        Prediction for data X. Either X or the weights may be only encoded (Plaintext dtype), then the products are
+        computed with multiply_plain.
+        :param X: encrypted (or encoded) design matrix
+        :param weights: encrypted or encoded weights (e.g. from encoded_weights), by default the fitted weights
         :return: predicted target
         """
-        weights_extended = EncArray([self.weigths.enc_arr], X.enc_utils)
-        return X @ weights_extended
+        weights = self.weigths if weights is None else weights
+        return X @ weights
+
+    def encoded_weights(self, decode_utils: FractionalDecryptorUtils, encode_utils: FractionalEncoderUtils = None) \
+            -> EncArray:
+        """
+        Decrypts the fitted weights and encodes them as plaintexts, for a model owner scoring encrypted data of others
+        :param decode_utils: decryptor of the weights
+        :param encode_utils: encoder utils of the data to score, by default the ones of the weights
+        :return: EncArray of Plaintext dtype
+
+        Example:
+        >> weights = model.encoded_weights(decode_utils)
+        >> model.predict(X_enc, weights)
+        """
+        encode_utils = encode_utils or self.weigths.enc_utils
+        return EncArray.from_numpy(self.weigths.decrypt_array(decode_utils), encode_utils, dtype=Plaintext)
@@ -1,13 +1,18 @@
 from seal_regression.fractions_utils import FracContext, FractionalEncoderUtils, FractionalDecryptorUtils
 from seal_regression.encarray import EncArray
 from seal_regression.linear_regression import SecureLinearRegression
+from seal_regression.keystore import KeyStore
+from seal_regression.optimizers import GradientDescent
+from seal_regression.refresh import KeyHolderRefresher
+from seal_regression.simulation import SimUtils
 
 from sklearn.datasets import make_regression
 import numpy as np
+import logging
 
 
-def generate_dataset(n_samples, n_features, noise, add_intercept=True):
-    X, y = make_regression(n_samples=n_samples, n_features=n_features, noise=noise)
+def generate_dataset(n_samples, n_features, noise, add_intercept=True, random_state=None):
+    X, y = make_regression(n_samples=n_samples, n_features=n_features, noise=noise, random_state=random_state)
     X = (X - np.mean(X, axis=0)) / np.std(X, axis=0)
     if add_intercept:
         X = np.hstack((X, np.ones((X.shape[0], 1))))
@@ -17,12 +22,16 @@ def generate_dataset(n_samples, n_features, noise, add_intercept=True):
 
 
 def main():
-    context = FracContext(poly_modulus="1x^1024 + 1", coef_modulus_n_primes=20, plain_modulus=1 << 32)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    # Public and evaluation keys are stored for worker processes of this run. The secret key stays in memory, so a
+    # new key pair is generated on every run (KeyStore(..., save_secret_key=True) would reuse it)
+    context = FracContext(poly_modulus="1x^1024 + 1", coef_modulus_n_primes=20, plain_modulus=1 << 32,
+                          key_store=KeyStore('~/.seal_regression/keys', save_secret_key=False))
     encode_utils = FractionalEncoderUtils(context)
     decode_utils = FractionalDecryptorUtils(context)
 
     X, y = generate_dataset(7, 1, 15)
-    X_enc, y_enc = EncArray(X.tolist(), enc_utils=encode_utils), EncArray(y.tolist(), enc_utils=encode_utils)
+    X_enc, y_enc = EncArray.from_numpy(X, encode_utils), EncArray.from_numpy(y, encode_utils)
     print(f'X shape: {X.shape}, y shape: {y.shape}')
 
     print(f'=========== Simple unencrypted LR ===========')
@@ -31,18 +40,17 @@ def main():
     print(f'Estimated parameters: {model.weigths}')
 
     print(f'================= Secure LR ==================')
-    n_runs = 5
-    init_weights = None
-    for run in range(n_runs):
-        print(f'RUN {run+1}/{n_runs}: ')
-        model.fit(X_enc, y_enc, decode_utils, init_weights, n_iter=7, verbose=True)
-
-        weights = model.weigths.decrypt_array(decode_utils)
-        print(f'Estimated parameters: {weights}')
-        print(f'Prediction: {model.predict(X_enc).decrypt_array(decode_utils)}. Real values: {y.T}')
-
-        # Reencprypting weights
-        init_weights = EncArray(weights, enc_utils=encode_utils)
+    # Weights are decrypted and re-encrypted by the key holder before their plaintext coefficients outgrow the plain
+    # modulus (they grow with every update), or earlier, if their noise budget runs low
+    cost = GradientDescent(0.2).step_cost(SimUtils(**context.config()), *X.shape,
+                                          max_value=max(np.abs(X).max(), np.abs(y).max()))
+    refresher = KeyHolderRefresher(decode_utils, encode_utils, max_iterations=cost['max_steps'])
+    model.fit(X_enc, y_enc, decode_utils, lr=0.2, n_iter=35, verbose=True, refresher=refresher)
+
+    weights = model.weigths.decrypt_array(decode_utils)
+    print(f'Estimated parameters: {weights}. Number of refreshes: {refresher.n_refreshes}')
+    print(f'Prediction: {model.predict(X_enc).decrypt_array(decode_utils)}. Real values: {y.T}')
+    context.key_store.clear(context.params_hash, context.key_id)
 
 
 if __name__ == '__main__':
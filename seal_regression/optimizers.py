@@ -0,0 +1,240 @@
+from seal_regression.simulation import SimUtils
+from seal_regression._seal import Plaintext
+from abc import ABC, abstractmethod
+from math import cos, log2, pi
+from typing import List
+import numpy as np
+
+
+def _plain(weights, values):
+    """
+    Encoded (or plain NumPy) array of values, matching the array type of weights
+    """
+    if isinstance(weights, np.ndarray):
+        return np.asarray(values, dtype=float)
+    return type(weights)(list(values), enc_utils=weights.enc_utils, dtype=Plaintext)
+
+
+def gradient_cost(sim_utils: SimUtils, n_samples: int, n_features: int, mode='residual') -> dict:
+    """
+    Estimated cost of one gradient X^T (X w - y) of SecureLinearRegression.fit
+    :param sim_utils: cost model with encryption parameters, e.g. SimUtils(**context.config())
+    :param mode: 'residual' or 'gram', see SecureLinearRegression.fit
+    :return: multiplicative depth and noise budget consumption in bits
+    """
+    add_cost = sim_utils.noise_model.add_cost
+    if mode == 'residual':
+        return {'depth': 2, 'noise_bits': 2 * sim_utils.multiply_cost() + add_cost(n_features) + add_cost(n_samples)
+                + add_cost(2)}
+    return {'depth': 1, 'noise_bits': sim_utils.multiply_cost() + add_cost(n_features) + add_cost(2)}
+
+
+class Optimizer(ABC):
+    """
+    Update rule of SecureLinearRegression.fit. Every step evaluates one gradient at point(weights) and computes the
+    new weights with update. Works on EncArray, SimArray and NumPy arrays (fit_unencrypted).
+    """
+
+    def start(self, weights, n_samples: int):
+        """
+        Called before the first step
+        :param weights: initial weights
+        :param n_samples: number of rows, the gradient is summed over
+        """
+        self.n_samples = n_samples
+
+    def point(self, weights):
+        """
+        :return: point to evaluate the gradient at
+        """
+        return weights
+
+    @abstractmethod
+    def update(self, weights, point, gradient):
+        """
+        :return: new weights, ciphertexts of weights, point and gradient may be overwritten
+        """
+
+    def restart(self, weights):
+        """
+        Called after weights were refreshed (re-encrypted): state derived from the old weights is dropped
+        """
+        pass
+
+    def plain_multiplications(self) -> int:
+        """
+        Number of chained plaintext multiplications on the path of weights per step
+        """
+        return 1
+
+    def summed_terms(self) -> int:
+        """
+        Number of terms with comparable plaintext coefficients, which are summed into the weights per step
+        """
+        return 1
+
+    @abstractmethod
+    def plain_factors(self, n_samples: int) -> List[float]:
+        """
+        Plain factors weights are multiplied by, for the noise and coefficient growth estimates of plaintext
+        multiplications
+        :param n_samples: number of rows, the gradient is summed over
+        """
+
+    def step_cost(self, sim_utils: SimUtils, n_samples: int, n_features: int, mode='residual', max_value=1.0) -> dict:
+        """
+        Estimated cost of one step: ciphertext multiplicative depth, plaintext multiplications, noise budget
+        consumption of weights in bits (gradient, plaintext multiplications and additions) and growth of their plaintext
+        coefficients in bits. Plaintext coefficients usually run out first: weights decrypt correctly for about
+        max_steps steps, after that they have to be refreshed (see Refresher)
+        :param sim_utils: cost model with encryption parameters, e.g. SimUtils(**context.config())
+        :param n_samples: number of rows
+        :param n_features: number of columns
+        :param mode: gradient mode, see SecureLinearRegression.fit
+        :param max_value: bound of absolute values of X, y and weights
+        """
+        gradient = gradient_cost(sim_utils, n_samples, n_features, mode)
+        factors = np.asarray(self.plain_factors(n_samples))
+        multiply_plain = float(np.max(sim_utils.multiply_plain_cost(factors)))
+        n_plain = self.plain_multiplications()
+        # Both gradient modes multiply two encodings of data into weights and sum n_samples and n_features products
+        coeff_bits = 2 * float(sim_utils.coeff_growth(max_value)) + 0.5 * log2(n_samples) + 0.5 * log2(n_features) + \
+            n_plain * float(np.max(sim_utils.coeff_growth(np.maximum(np.abs(factors), max_value)))) + \
+            0.5 * log2(self.summed_terms())
+        return {'depth': gradient['depth'], 'plain_multiplications': n_plain,
+                'noise_bits': gradient['noise_bits'] + n_plain * (multiply_plain + sim_utils.noise_model.add_cost(2)),
+                'coeff_bits': coeff_bits, 'max_steps': int((sim_utils.plain_bits - 1) // coeff_bits)}
+
+
+class GradientDescent(Optimizer):
+    def __init__(self, lr=0.2):
+        """
+        Plain gradient descent w <- w - lr / n * gradient, the default update of SecureLinearRegression.fit
+        :param lr: learning rate
+        """
+        self.lr = lr
+
+    def _coef(self, weights):
+        return _plain(weights, len(weights) * [self.lr / self.n_samples])
+
+    def update(self, weights, point, gradient):
+        weights -= self._coef(weights) * gradient
+        return weights
+
+    def plain_factors(self, n_samples: int) -> List[float]:
+        return [self.lr / n_samples]
+
+
+class DiagonalPreconditioned(GradientDescent):
+    def __init__(self, column_scales, lr=1.0):
+        """
+        Gradient descent with a per-feature learning rate lr / (n * s_j), where s_j is the mean square of column j.
+        The scales are known to the data owner in plaintext (e.g. from preprocessing) and reveal nothing about the
+        encrypted rows; they equalize the curvature of poorly scaled columns, which plain gradient descent has to
+        handle with a learning rate small enough for the largest column.
+        :param column_scales: mean squares of columns of X, e.g. from DiagonalPreconditioned.scales(X)
+        :param lr: learning rate, relative to the scales (1.0 is a Jacobi step)
+
+        Example:
+        >> optimizer = DiagonalPreconditioned(DiagonalPreconditioned.scales(X), lr=0.5)
+        >> model.fit(X_enc, y_enc, n_iter=5, optimizer=optimizer)
+        """
+        super().__init__(lr)
+        self.column_scales = np.asarray(column_scales, dtype=float)
+
+    @staticmethod
+    def scales(X) -> np.ndarray:
+        """
+        Mean squares of columns of unencrypted X
+        """
+        return np.mean(np.asarray(X, dtype=float) ** 2, axis=0)
+
+    def _coef(self, weights):
+        return _plain(weights, self.lr / (self.n_samples * self.column_scales))
+
+    def plain_factors(self, n_samples: int) -> List[float]:
+        return list(self.lr / (n_samples * self.column_scales))
+
+
+class Nesterov(GradientDescent):
+    def __init__(self, lr=0.2, momentum=0.5):
+        """
+        Nesterov accelerated gradient: the gradient is evaluated at the look-ahead point
+        y = w + momentum * (w - w_previous) and w <- y - lr / n * gradient(y). The next look-ahead point is computed as
+        w + momentum * (y - w_previous) - momentum * lr / n * gradient(y), so every term is multiplied by a single
+        plaintext factor and plaintext coefficients grow as in gradient descent. It costs two more (not chained)
+        plaintext multiplications per step than gradient descent and the same ciphertext depth, and converges with the
+        square root of the condition number instead of the condition number. Momentum is restarted, when weights are
+        refreshed, so the previous weights do not carry their lower noise budget into the look-ahead point.
+        :param lr: learning rate
+        :param momentum: momentum coefficient in [0, 1), e.g. (sqrt(k) - 1) / (sqrt(k) + 1) for condition number k
+        """
+        super().__init__(lr)
+        self.momentum = momentum
+        self.look_ahead = None
+
+    def start(self, weights, n_samples: int):
+        super().start(weights, n_samples)
+        self.restart(weights)
+
+    def restart(self, weights):
+        self.look_ahead = None
+
+    def point(self, weights):
+        if self.look_ahead is None:
+            return weights.copy()
+        return self.look_ahead
+
+    def update(self, weights, point, gradient):
+        momentum = _plain(weights, len(weights) * [self.momentum])
+        momentum_coef = _plain(weights, len(weights) * [self.momentum * self.lr / self.n_samples])
+        step = momentum * (point - weights)
+        weights = point - self._coef(point) * gradient
+        self.look_ahead = weights + step
+        self.look_ahead -= momentum_coef * gradient
+        return weights
+
+    def summed_terms(self) -> int:
+        # The look-ahead point sums the gradient and the momentum term
+        return 2
+
+    def plain_factors(self, n_samples: int) -> List[float]:
+        return [self.lr / n_samples, self.momentum, self.momentum * self.lr / n_samples]
+
+
+class ChebyshevInverse(GradientDescent):
+    def __init__(self, eigenvalue_bounds: tuple, n_steps: int):
+        """
+        Fixed-step polynomial approximation of the inverse of X^T X / n (Chebyshev semi-iterative method): step k
+        uses learning rate 1 / r_k, where r_k are the roots of the Chebyshev polynomial of degree n_steps, mapped to
+        the eigenvalue interval. After n_steps the error is multiplied by the minimax polynomial on that interval, so
+        it takes about sqrt(k) instead of k steps for condition number k. Every step costs the same as a gradient
+        descent step, only the plaintext learning rate changes; steps repeat cyclically after n_steps.
+        :param eigenvalue_bounds: (smallest, largest) eigenvalue of X^T X / n, e.g. from column scales known to the
+        data owner: the largest is at most sum of mean squares of columns
+        :param n_steps: degree of the polynomial, i.e. number of encrypted iterations
+        """
+        super().__init__()
+        self.eigenvalue_bounds = eigenvalue_bounds
+        self.n_steps = n_steps
+        low, high = eigenvalue_bounds
+        roots = [(high + low) / 2 + (high - low) / 2 * cos(pi * (2 * k + 1) / (2 * n_steps)) for k in range(n_steps)]
+        # Large and small steps alternate, so that intermediate weights stay bounded (no long run of large steps)
+        roots.sort()
+        self.rates = [1.0 / roots[(k // 2) if k % 2 == 0 else (n_steps - 1 - k // 2)] for k in range(n_steps)]
+        self.step = 0
+
+    def start(self, weights, n_samples: int):
+        super().start(weights, n_samples)
+        self.step = 0
+
+    def _coef(self, weights):
+        return _plain(weights, len(weights) * [self.rates[self.step % self.n_steps] / self.n_samples])
+
+    def update(self, weights, point, gradient):
+        weights = super().update(weights, point, gradient)
+        self.step += 1
+        return weights
+
+    def plain_factors(self, n_samples: int) -> List[float]:
+        return [max(self.rates) / n_samples]
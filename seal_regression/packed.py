@@ -0,0 +1,455 @@
+from seal_regression.fractions_utils import FracContext
+from seal_regression._seal import Ciphertext, Decryptor, Encryptor, Plaintext, PolyCRTBuilder
+import numpy as np
+from copy import deepcopy
+from collections import Counter
+from math import ceil, log2
+from typing import List
+
+# Layouts of packed arrays:
+#   'packed'    - 1D array, all elements in the slots of a single ciphertext
+#   'broadcast' - 1D array, one ciphertext per element, the element is replicated in every slot
+#   'columns'   - 2D array, one ciphertext per column, rows are in the slots
+#   'rows'      - 2D array, one ciphertext per row, columns are in the slots
+LAYOUTS_1D = ('packed', 'broadcast')
+LAYOUTS_2D = ('columns', 'rows')
+
+
+def _is_prime(n: int) -> bool:
+    if n < 2:
+        return False
+    for p in (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37):
+        if n % p == 0:
+            return n == p
+    d, r = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        r += 1
+    for a in (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37):
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(r - 1):
+            x = pow(x, 2, n)
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def fixed_point_scale_bits(value: float, precision_bits: int) -> int:
+    """
+    Fixed-point scale, at which value keeps about precision_bits significant bits: small values (e.g. lr / n) need a
+    larger scale than precision_bits, otherwise round(value * 2^scale) loses most of its digits or becomes 0
+    :param value: number to encode
+    :param precision_bits: significant bits to keep
+    :return: scale bits, at least precision_bits
+    """
+    if value == 0:
+        return precision_bits
+    return precision_bits + max(0, ceil(-log2(abs(value))))
+
+
+def magnitude_bits(max_value: float, n_terms: int = 1) -> int:
+    """
+    Bits of the integer part of a sum of n_terms numbers, each at most max_value in absolute value
+    """
+    return max(0, ceil(log2(max(max_value, 1.0) * n_terms)))
+
+
+def batching_plain_modulus(poly_degree: int, bit_count: int) -> int:
+    """
+    Largest prime plain modulus with given bit count, which enables batching (t = 1 mod 2N)
+    :param poly_degree: N, degree of poly modulus (e.g. 4096 for "1x^4096 + 1")
+    :param bit_count: bit count of plain modulus, at most 60
+    :return: prime plain modulus
+
+    Example:
+    >> context = FracContext(poly_modulus="1x^4096 + 1", plain_modulus=batching_plain_modulus(4096, 40))
+    """
+    step = 2 * poly_degree
+    candidate = ((1 << bit_count) - 1) // step * step + 1
+    while candidate > (1 << (bit_count - 1)):
+        if _is_prime(candidate):
+            return candidate
+        candidate -= step
+    raise ValueError(f'No batching prime with {bit_count} bits for poly degree {poly_degree}')
+
+
+class BatchEncoderUtils:
+    def __init__(self, context: FracContext, scale_bits=12, decomposition_bit_count=30, max_value=4.0):
+        """
+        Class providing fixed-point encoding of vectors into the slots of a single plaintext (SEAL batching),
+        encryption and slot-wise operations over encrypted vectors.
+        :param context: Context initialising HE parameters, plain modulus has to be a prime equal to 1 mod 2N
+        :param scale_bits: fixed-point precision, numbers are encoded as round(x * 2^scale_bits). The scheme can not
+        rescale, so scales add up in products: one iteration of SecureLinearRegression.fit adds 2 * scale_bits (X in
+        X @ w and X^T @ r) plus the scale of lr / n (see fixed_point_scale_bits) to the scale of weights
+        :param decomposition_bit_count: decomposition bit count for evaluation and Galois keys
+        :param max_value: bound of absolute values of encoded numbers and results of operations; its integer bits are
+        reserved in the plain modulus, so that scaled values do not wrap around modulo t
+        """
+        self.context = context.context
+        if not self.context.qualifiers().enable_batching:
+            raise ValueError('Encryption parameters do not support batching, see batching_plain_modulus')
+        self.plain_modulus = self.context.plain_modulus().value()
+        self.scale_bits = scale_bits
+        self.max_value = max_value
+        # Sign bit, rounding bit and the integer part of values are kept free of the fixed-point scale
+        self.max_scale_bits = self.plain_modulus.bit_length() - 2 - magnitude_bits(max_value)
+
+        self.crtbuilder = PolyCRTBuilder(self.context)
+        self.slot_count = int(self.crtbuilder.slot_count())
+        self.row_size = self.slot_count // 2
+
+        self.encryptor = Encryptor(self.context, context.public_key)
+        self.evaluator = context.evaluator
+        self.ev_keys = context.evaluation_keys(decomposition_bit_count)
+        self.gal_keys = context.galois_keys(decomposition_bit_count)
+        # Number of homomorphic operations issued through this object, keyed by evaluator method
+        self.op_counts = Counter()
+
+    def encode(self, values: List[float], scale_bits: int) -> Plaintext:
+        """
+        :param values: at most slot_count numbers, remaining slots are filled with zeros
+        :param scale_bits: fixed-point precision
+        :return: batched plaintext
+        """
+        if len(values) > self.slot_count:
+            raise ValueError(f'Vector of length {len(values)} does not fit into {self.slot_count} slots')
+        slots = [int(round(value * (1 << scale_bits))) for value in values]
+        if slots and 2 * max(abs(slot) for slot in slots) >= self.plain_modulus:
+            raise ValueError(f'Values at fixed-point scale 2^{scale_bits} overflow the plain modulus')
+        slots = [slot % self.plain_modulus for slot in slots]
+        slots += (self.slot_count - len(slots)) * [0]
+        plain = Plaintext()
+        self.crtbuilder.compose(slots, plain)
+        return plain
+
+    def encrypt(self, values: List[float], scale_bits: int) -> Ciphertext:
+        encrypted = Ciphertext()
+        self.encryptor.encrypt(self.encode(values, scale_bits), encrypted)
+        return encrypted
+
+    def add(self, a: Ciphertext, b: Ciphertext) -> Ciphertext:
+        a = deepcopy(a)
+        self.evaluator.add(a, b)
+        self.op_counts['add'] += 1
+        return a
+
+    def add_plain(self, a: Ciphertext, b: Plaintext) -> Ciphertext:
+        a = deepcopy(a)
+        self.evaluator.add_plain(a, b)
+        self.op_counts['add_plain'] += 1
+        return a
+
+    def subtract(self, a: Ciphertext, b: Ciphertext) -> Ciphertext:
+        a = deepcopy(a)
+        self.evaluator.sub(a, b)
+        self.op_counts['sub'] += 1
+        return a
+
+    def subtract_plain(self, a: Ciphertext, b: Plaintext) -> Ciphertext:
+        a = deepcopy(a)
+        self.evaluator.sub_plain(a, b)
+        self.op_counts['sub_plain'] += 1
+        return a
+
+    def multiply(self, a: Ciphertext, b: Ciphertext) -> Ciphertext:
+        """
+        Slot-wise product, relinearized back to size 2
+        """
+        a = deepcopy(a)
+        self.evaluator.multiply(a, b)
+        self.evaluator.relinearize(a, self.ev_keys)
+        self.op_counts['multiply'] += 1
+        self.op_counts['relinearize'] += 1
+        return a
+
+    def multiply_plain(self, a: Ciphertext, b: Plaintext) -> Ciphertext:
+        a = deepcopy(a)
+        self.evaluator.multiply_plain(a, b)
+        self.op_counts['multiply_plain'] += 1
+        return a
+
+    def sum_enc_array(self, array: List[Ciphertext]) -> Ciphertext:
+        encrypted_result = Ciphertext()
+        self.evaluator.add_many(array, encrypted_result)
+        self.op_counts['add'] += len(array) - 1
+        return encrypted_result
+
+    def rotate_sum(self, a: Ciphertext) -> Ciphertext:
+        """
+        Sum of all slots with log2(slot_count) rotations
+        :param a: encrypted vector
+        :return: ciphertext with the sum in every slot
+        """
+        result = deepcopy(a)
+        step = 1
+        while step < self.row_size:
+            rotated = deepcopy(result)
+            self.evaluator.rotate_rows(rotated, step, self.gal_keys)
+            self.evaluator.add(result, rotated)
+            step *= 2
+        rotated = deepcopy(result)
+        self.evaluator.rotate_columns(rotated, self.gal_keys)
+        self.evaluator.add(result, rotated)
+        self.op_counts['rotate'] += (self.row_size.bit_length() - 1) + 1
+        self.op_counts['add'] += (self.row_size.bit_length() - 1) + 1
+        return result
+
+
+class BatchDecryptorUtils:
+    def __init__(self, context: FracContext):
+        """
+        Class providing decryption of batched ciphertexts
+        :param context: Context initialising HE parameters
+        """
+        self.context = context.context
+        self.decryptor = Decryptor(self.context, context.secret_key)
+        self.crtbuilder = PolyCRTBuilder(self.context)
+        self.slot_count = int(self.crtbuilder.slot_count())
+        self.plain_modulus = self.context.plain_modulus().value()
+
+    def decrypt(self, encrypted: Ciphertext, scale_bits: int) -> List[float]:
+        """
+        :param encrypted: batched ciphertext
+        :param scale_bits: fixed-point precision of the ciphertext
+        :return: values of all slots
+        """
+        plain = Plaintext()
+        self.decryptor.decrypt(encrypted, plain)
+        self.crtbuilder.decompose(plain)
+        result = []
+        for i in range(self.slot_count):
+            slot = plain.coeff_at(i) if i < plain.coeff_count() else 0
+            if slot > self.plain_modulus // 2:
+                slot -= self.plain_modulus
+            result.append(slot / (1 << scale_bits))
+        return result
+
+
+class PackedEncArray:
+    def __init__(self, arr, enc_utils: BatchEncoderUtils, layout=None, dtype=Ciphertext, scale_bits=None):
+        """
+        Array of fixed-point numbers, packed into the slots of SEAL batched ciphertexts. A (n x d) design matrix in
+        'columns' layout takes d ciphertexts instead of n·d, and every operation works on whole columns at once.
+        :param arr: 1D or 2D array of floats
+        :param enc_utils: batching utils providing encoding and slot-wise operations
+        :param layout: 'packed' or 'broadcast' for 1D arrays, 'columns' or 'rows' for 2D arrays. Default: 'packed'
+        for 1D and 'columns' for 2D
+        :param dtype: type of data in array (Plaintext or Ciphertext)
+        :param scale_bits: fixed-point precision, default is enc_utils.scale_bits
+
+        Examples:
+        >> context = FracContext(poly_modulus="1x^4096 + 1", plain_modulus=batching_plain_modulus(4096, 50))
+        >> batch_utils = BatchEncoderUtils(context)
+        >> X_packed = PackedEncArray(X, batch_utils)  # one ciphertext per column
+        >> w_packed = PackedEncArray([0.5, 1.0], batch_utils, layout='broadcast')
+        >> (X_packed @ w_packed).decrypt_array(BatchDecryptorUtils(context))
+        """
+        self.enc_utils = enc_utils
+        self.dtype = dtype
+        self.scale_bits = enc_utils.scale_bits if scale_bits is None else scale_bits
+        values = np.array(arr, dtype=float)
+        self.shape = values.shape
+        self.ndim = len(self.shape)
+        if layout is None:
+            layout = 'packed' if self.ndim == 1 else 'columns'
+        if (self.ndim == 1 and layout not in LAYOUTS_1D) or (self.ndim == 2 and layout not in LAYOUTS_2D):
+            raise ValueError(f'Layout {layout} is not supported for {self.ndim}D arrays')
+        self.layout = layout
+
+        # Plaintext arrays keep their values to be re-encoded with another scale
+        self.values = values if dtype == Plaintext else None
+        self.cts = self._encode_values(values, self.scale_bits)
+
+    def _encode_values(self, values: np.ndarray, scale_bits: int) -> List:
+        if self.layout == 'packed':
+            vectors = [values.tolist()]
+        elif self.layout == 'broadcast':
+            vectors = [self.enc_utils.slot_count * [value] for value in values.tolist()]
+        elif self.layout == 'columns':
+            vectors = values.T.tolist()
+        else:
+            vectors = values.tolist()
+        if self.dtype == Plaintext:
+            return [self.enc_utils.encode(vector, scale_bits) for vector in vectors]
+        return [self.enc_utils.encrypt(vector, scale_bits) for vector in vectors]
+
+    @classmethod
+    def _wrap(cls, cts, shape, layout, scale_bits, enc_utils, dtype=Ciphertext, values=None):
+        array = cls.__new__(cls)
+        array.enc_utils = enc_utils
+        array.dtype = dtype
+        array.scale_bits = scale_bits
+        array.shape = tuple(shape)
+        array.ndim = len(array.shape)
+        array.layout = layout
+        array.values = values
+        array.cts = cts
+        return array
+
+    def _with_scale(self, scale_bits: int) -> List:
+        """
+        Ciphertexts (or plaintexts) of the array, brought to a higher fixed-point scale
+        """
+        if scale_bits == self.scale_bits:
+            return self.cts
+        if scale_bits < self.scale_bits:
+            raise ValueError('Fixed-point scale can not be decreased without decryption')
+        if self.dtype == Plaintext:
+            return self._encode_values(self.values, scale_bits)
+        factor = self.enc_utils.encode(self.enc_utils.slot_count * [1.0], scale_bits - self.scale_bits)
+        return [self.enc_utils.multiply_plain(ct, factor) for ct in self.cts]
+
+    def _check_compatible(self, o):
+        if tuple(self.shape) != tuple(o.shape) or self.layout != o.layout:
+            raise ValueError(f'Incompatible arrays: {self.shape} ({self.layout}) and {o.shape} ({o.layout})')
+
+    def _check_scale(self, scale_bits):
+        if scale_bits > self.enc_utils.max_scale_bits:
+            raise ValueError(f'Fixed-point scale 2^{scale_bits} exceeds plain modulus capacity '
+                             f'(2^{self.enc_utils.max_scale_bits}), results would overflow')
+
+    def _multiply(self, a, a_dtype, b, b_dtype) -> Ciphertext:
+        if a_dtype == Ciphertext and b_dtype == Ciphertext:
+            return self.enc_utils.multiply(a, b)
+        elif a_dtype == Ciphertext:
+            return self.enc_utils.multiply_plain(a, b)
+        return self.enc_utils.multiply_plain(b, a)
+
+    def __add__(self, o):
+        """
+        Slot-wise sum of 2 packed arrays with equal shape and layout
+        """
+        return self._add_or_subtract(o, subtract=False)
+
+    def __sub__(self, o):
+        """
+        Slot-wise difference of 2 packed arrays with equal shape and layout
+        """
+        return self._add_or_subtract(o, subtract=True)
+
+    def _add_or_subtract(self, o, subtract):
+        self._check_compatible(o)
+        if self.dtype == Plaintext and o.dtype == Plaintext:
+            raise ValueError('Not supported operation for two plaintext arrays')
+        scale_bits = max(self.scale_bits, o.scale_bits)
+        a, b = self._with_scale(scale_bits), o._with_scale(scale_bits)
+        if self.dtype == Ciphertext and o.dtype == Ciphertext:
+            fun = self.enc_utils.subtract if subtract else self.enc_utils.add
+            result = [fun(ct_a, ct_b) for ct_a, ct_b in zip(a, b)]
+        elif self.dtype == Ciphertext:
+            fun = self.enc_utils.subtract_plain if subtract else self.enc_utils.add_plain
+            result = [fun(ct_a, plain_b) for ct_a, plain_b in zip(a, b)]
+        elif subtract:
+            # plain - cipher = -(cipher - plain)
+            result = [self.enc_utils.subtract_plain(ct_b, plain_a) for plain_a, ct_b in zip(a, b)]
+            for ct in result:
+                self.enc_utils.evaluator.negate(ct)
+        else:
+            result = [self.enc_utils.add_plain(ct_b, plain_a) for plain_a, ct_b in zip(a, b)]
+        return PackedEncArray._wrap(result, self.shape, self.layout, scale_bits, self.enc_utils)
+
+    def __mul__(self, o):
+        """
+        Slot-wise multiplication of 2 packed arrays with equal shape and layout. Scales of operands are added.
+        """
+        self._check_compatible(o)
+        scale_bits = self.scale_bits + o.scale_bits
+        self._check_scale(scale_bits)
+        result = [self._multiply(ct_a, self.dtype, ct_b, o.dtype) for ct_a, ct_b in zip(self.cts, o.cts)]
+        return PackedEncArray._wrap(result, self.shape, self.layout, scale_bits, self.enc_utils)
+
+    def sum(self):
+        """
+        Sum of elements of 1D array
+        :return: 1D array of length 1 in 'broadcast' layout
+        """
+        if self.ndim != 1:
+            raise ValueError('Sum is supported for 1D arrays only')
+        if self.layout == 'packed':
+            result = self.enc_utils.rotate_sum(self.cts[0])
+        else:
+            result = self.enc_utils.sum_enc_array(self.cts)
+        return PackedEncArray._wrap([result], (1,), 'broadcast', self.scale_bits, self.enc_utils)
+
+    def __matmul__(self, other):
+        """
+        Matrix-vector multiplication. Supported combinations:
+        - (n x d) 'columns' @ (d) 'broadcast' -> (n) 'packed', d multiplications, no rotations
+        - (m x n) 'rows' @ (n) 'packed' -> (m) 'broadcast', m multiplications and rotation sums
+        Since X.T of a 'columns' matrix is a 'rows' matrix, both X @ w and X.T @ r are available for the same X.
+        """
+        if self.ndim != 2 or other.ndim != 1 or self.shape[1] != other.shape[0]:
+            raise ValueError(f'Dimensions are not aligned: {self.shape} and {other.shape}')
+        scale_bits = self.scale_bits + other.scale_bits
+        self._check_scale(scale_bits)
+        if self.layout == 'columns' and other.layout == 'broadcast':
+            products = [self._multiply(column, self.dtype, ele, other.dtype)
+                        for column, ele in zip(self.cts, other.cts)]
+            result = [self.enc_utils.sum_enc_array(products)]
+            return PackedEncArray._wrap(result, (self.shape[0],), 'packed', scale_bits, self.enc_utils)
+        elif self.layout == 'rows' and other.layout == 'packed':
+            result = [self.enc_utils.rotate_sum(self._multiply(row, self.dtype, other.cts[0], other.dtype))
+                      for row in self.cts]
+            return PackedEncArray._wrap(result, (self.shape[0],), 'broadcast', scale_bits, self.enc_utils)
+        raise ValueError(f'Not supported layouts: {self.layout} @ {other.layout}')
+
+    @property
+    def T(self):
+        """
+        Transposed array, no homomorphic operations needed: a 'columns' matrix becomes a 'rows' matrix
+        """
+        if self.ndim != 2:
+            return self
+        layout = 'rows' if self.layout == 'columns' else 'columns'
+        values = self.values.T if self.values is not None else None
+        return PackedEncArray._wrap(self.cts, self.shape[::-1], layout, self.scale_bits, self.enc_utils, self.dtype,
+                                    values)
+
+    def column(self, j):
+        """
+        Column of a 'columns' matrix as a 1D 'packed' array (ciphertext is shared)
+        """
+        if self.layout != 'columns':
+            raise ValueError('Column access is supported for the columns layout only')
+        values = self.values[:, j] if self.values is not None else None
+        return PackedEncArray._wrap([self.cts[j]], (self.shape[0],), 'packed', self.scale_bits, self.enc_utils,
+                                    self.dtype, values)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def decrypt_array(self, decode_utils: BatchDecryptorUtils):
+        """
+        Decrypts current array object
+        :param decode_utils: Decryptor class initiliazed with the same context as encoder
+        :returns: decrypted array as nested lists
+        """
+        vectors = [decode_utils.decrypt(ct, self.scale_bits) for ct in self.cts]
+        if self.layout == 'packed':
+            return vectors[0][:self.shape[0]]
+        elif self.layout == 'broadcast':
+            return [vector[0] for vector in vectors]
+        elif self.layout == 'columns':
+            return [list(row) for row in zip(*[vector[:self.shape[0]] for vector in vectors])]
+        return [vector[:self.shape[1]] for vector in vectors]
+
+    def noise_budget(self, decode_utils: BatchDecryptorUtils):
+        """
+        :return: left amount of budget in bits for every ciphertext in array
+        """
+        return [decode_utils.decryptor.invariant_noise_budget(ct) for ct in self.cts]
+
+    def mem_size(self) -> int:
+        """
+        Sum of all ciphertexts' sizes in array
+        """
+        return sum(ct.size() for ct in self.cts)
+
+    @property
+    def n_ciphertexts(self) -> int:
+        return len(self.cts)
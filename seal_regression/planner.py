@@ -0,0 +1,211 @@
+from seal_regression.fractions_utils import FracContext, FractionalEncoderUtils, FractionalDecryptorUtils
+from seal_regression._seal import Plaintext
+from math import ceil, log, log2
+
+POLY_DEGREES = [1024, 2048, 4096, 8192, 16384, 32768]
+# Largest coefficient modulus (in bits) for 128-bit security, as recommended by SEAL
+MAX_COEFF_BITS_128 = {1024: 35, 2048: 54, 4096: 109, 8192: 218, 16384: 438, 32768: 881}
+PRIME_BITS = 60  # bit count of FracContext.primes
+MAX_PLAIN_BITS = 60
+
+
+class NoiseModel:
+    def __init__(self, fresh_offset=-7.5, multiply_offset=-10.8, multiply_plain_offset=0.0, coeff_growth_offset=-2.0):
+        """
+        Heuristic noise budget model of the FV scheme (in bits):
+        - fresh ciphertext: log2(q) - log2(t) - log2(N) - fresh_offset
+        - ciphertext multiplication consumes log2(t) + 2 * log2(N) + multiply_offset
+        - plaintext multiplication consumes log2(L) + multiply_plain_offset, where L is the number of non-zero
+          plaintext coefficients (SEAL treats coefficients above t / 2, i.e. negative FractionalEncoder digits, as
+          negative numbers, so their magnitude is 1)
+        - sum of k ciphertexts consumes log2(k)
+        Plaintext coefficients of a product of two L-digit numbers grow by 0.5 * log2(L) + coeff_growth_offset bits
+        (digits have random signs), they have to stay below t / 2.
+        Default offsets are fitted to the measurements in notebooks/perfromance_results.ipynb (20 to 80 primes,
+        N = 1024 to 8192, t = 2^32: fresh budget about 1164 bits out of 1200, 93 to 106 bits per iteration of fit,
+        growing with N) and to 7 iterations of fit decrypting correctly with t = 2^32 and the default encoder.
+        Offsets can be measured on other parameters with ParameterPlanner.calibrate.
+        """
+        self.fresh_offset = fresh_offset
+        self.multiply_offset = multiply_offset
+        self.multiply_plain_offset = multiply_plain_offset
+        self.coeff_growth_offset = coeff_growth_offset
+
+    def fresh_budget(self, coeff_bits, plain_bits, poly_degree) -> float:
+        return coeff_bits - plain_bits - log2(poly_degree) - self.fresh_offset
+
+    def multiply_cost(self, plain_bits, poly_degree) -> float:
+        return plain_bits + 2 * log2(poly_degree) + self.multiply_offset
+
+    def multiply_plain_cost(self, n_coeffs) -> float:
+        return log2(max(n_coeffs, 1)) + self.multiply_plain_offset
+
+    @staticmethod
+    def add_cost(n_terms) -> float:
+        return log2(max(n_terms, 1))
+
+    def product_coeff_growth(self, n_coeffs) -> float:
+        return 0.5 * log2(max(n_coeffs, 1)) + self.coeff_growth_offset
+
+    def __repr__(self):
+        return f'NoiseModel(fresh_offset={self.fresh_offset:.1f}, multiply_offset={self.multiply_offset:.1f}, ' \
+               f'multiply_plain_offset={self.multiply_plain_offset:.1f}, ' \
+               f'coeff_growth_offset={self.coeff_growth_offset:.1f})'
+
+
+class Plan:
+    def __init__(self, poly_degree, n_primes, plain_bits, integer_coeff_count, fraction_coeff_count, base,
+                 iteration_cost, fresh_budget, final_budget, depth):
+        """
+        Encryption parameters, chosen by ParameterPlanner, with estimates they are based on
+        """
+        self.poly_degree = poly_degree
+        self.n_primes = n_primes
+        self.plain_bits = plain_bits
+        self.integer_coeff_count = integer_coeff_count
+        self.fraction_coeff_count = fraction_coeff_count
+        self.base = base
+        self.iteration_cost = iteration_cost
+        self.fresh_budget = fresh_budget
+        self.final_budget = final_budget
+        self.depth = depth
+
+    @property
+    def cost(self) -> float:
+        """
+        Relative cost of one homomorphic operation: NTT over every prime of the coefficient modulus
+        """
+        return self.poly_degree * log2(self.poly_degree) * self.n_primes
+
+    def config(self) -> dict:
+        """
+        Arguments of FracContext
+        """
+        return dict(poly_modulus=f'1x^{self.poly_degree} + 1', coef_modulus_n_primes=self.n_primes,
+                    plain_modulus=1 << self.plain_bits, integer_coeff_count=self.integer_coeff_count,
+                    fraction_coeff_count=self.fraction_coeff_count, base=self.base)
+
+    def context(self, **kwargs) -> FracContext:
+        return FracContext(**self.config(), **kwargs)
+
+    def __repr__(self):
+        return f'Plan({self.config()}, depth={self.depth}, noise budget: fresh {self.fresh_budget:.0f} bits, ' \
+               f'per iteration {self.iteration_cost:.0f} bits, left {self.final_budget:.0f} bits)'
+
+
+class ParameterPlanner:
+    def __init__(self, noise_model: NoiseModel = None, security_level: int = None, base=3):
+        """
+        Picks the cheapest encryption parameters for SecureLinearRegression.fit/predict on a given workload
+        :param noise_model: noise budget model, default NoiseModel()
+        :param security_level: 128 to limit coefficient modulus by SEAL security recommendations, None to only
+        limit it by the number of available primes (as the FracContext defaults do)
+        :param base: base of FractionalEncoder expansion
+
+        Example:
+        >> planner = ParameterPlanner()
+        >> planner.calibrate()  # optional, measures real noise consumption
+        >> plan = planner.plan(n_samples=100, n_features=3, n_iter=10, precision_bits=16)
+        >> context = plan.context()
+        """
+        self.noise_model = NoiseModel() if noise_model is None else noise_model
+        self.security_level = security_level
+        self.base = base
+
+    def _digits(self, value) -> int:
+        return max(1, ceil(log(max(value, 1.0) * 2, self.base)) + 1)
+
+    def plan(self, n_samples, n_features, n_iter, precision_bits=20, max_value=4.0, margin_bits=10,
+             with_predict=True) -> Plan:
+        """
+        :param n_samples: number of rows of the design matrix
+        :param n_features: number of columns of the design matrix (with intercept)
+        :param n_iter: number of fit iterations without re-encryption of weights
+        :param precision_bits: required precision of fractional part, in bits
+        :param max_value: largest absolute value of (standardized) data and weights
+        :param margin_bits: noise budget left after the last operation
+        :param with_predict: if True, budget for predict on the trained weights is included
+        :return: cheapest feasible plan
+        """
+        fraction_coeff_count = ceil(precision_bits / log2(self.base))
+        n_coeffs = self._digits(max_value) + fraction_coeff_count
+
+        # Per iteration weights go through 2 ciphertext multiplications (X w, X^T r), sums over d and n terms,
+        # subtraction of y and a plaintext multiplication by lr / n followed by subtraction from weights
+        depth = 2 * n_iter + (1 if with_predict else 0)
+        plain_depth = n_iter
+        # Integer parts grow from the lowest and fractional parts from the highest polynomial coefficient, every
+        # factor of a product shifts them by its own digit count. The integer part has to hold the digits of all
+        # factors of the deepest product (and the largest value, a gradient entry: sum of n products); they must
+        # not meet the fractional part
+        n_factors = depth + plain_depth + 1
+        integer_coeff_count = max(self._digits(n_samples * n_features * max_value ** 3),
+                                  n_factors * self._digits(max_value))
+        layout_coeffs = integer_coeff_count + n_factors * fraction_coeff_count
+        # Plaintext coefficients of weights grow with 3 products and sums over n and d terms per iteration
+        coeff_growth = 3 * self.noise_model.product_coeff_growth(n_coeffs) + 0.5 * log2(n_samples * n_features)
+        plain_bits = max(16, ceil(n_iter * coeff_growth + 0.5 * log2(n_samples * n_features) + 2))
+        if plain_bits > MAX_PLAIN_BITS:
+            raise ValueError(f'Plain modulus of {plain_bits} bits needed, use re-encryption with fewer iterations')
+
+        best = None
+        for poly_degree in POLY_DEGREES:
+            if layout_coeffs > poly_degree:
+                continue
+            model = self.noise_model
+            iteration_cost = 2 * model.multiply_cost(plain_bits, poly_degree) + \
+                model.multiply_plain_cost(n_coeffs) + \
+                model.add_cost(n_features) + model.add_cost(n_samples) + 2
+            predict_cost = model.multiply_cost(plain_bits, poly_degree) + model.add_cost(n_features)
+            needed_budget = n_iter * iteration_cost + (predict_cost if with_predict else 0) + margin_bits
+            coeff_bits = needed_budget + plain_bits + log2(poly_degree) + model.fresh_offset
+            n_primes = ceil(coeff_bits / PRIME_BITS)
+            if n_primes > len(FracContext.primes):
+                continue
+            if self.security_level == 128 and n_primes * PRIME_BITS > MAX_COEFF_BITS_128[poly_degree]:
+                continue
+            fresh_budget = model.fresh_budget(n_primes * PRIME_BITS, plain_bits, poly_degree)
+            plan = Plan(poly_degree, n_primes, plain_bits, integer_coeff_count, fraction_coeff_count, self.base,
+                        iteration_cost, fresh_budget, fresh_budget - needed_budget + margin_bits, depth)
+            if best is None or plan.cost < best.cost:
+                best = plan
+        if best is None:
+            raise ValueError('No feasible parameters, use re-encryption with fewer iterations')
+        return best
+
+    def calibrate(self, context: FracContext = None, value=0.7) -> NoiseModel:
+        """
+        Measures noise consumption of real operations and adjusts offsets of the noise model
+        :param context: context to measure on, default FracContext()
+        :param value: number to encrypt
+        :return: calibrated noise model
+        """
+        context = FracContext(verbose=False) if context is None else context
+        encode_utils = FractionalEncoderUtils(context)
+        decode_utils = FractionalDecryptorUtils(context)
+        budget = decode_utils.decryptor.invariant_noise_budget
+
+        poly_degree = context.context.poly_modulus().coeff_count() - 1
+        coeff_bits = context.context.total_coeff_modulus().significant_bit_count()
+        plain_bits = log2(context.context.plain_modulus().value())
+        n_coeffs = self._digits(value) + context.fraction_coeff_count
+
+        fresh = encode_utils.encrypt_num(value)
+        fresh_budget = budget(fresh)
+        product = encode_utils.multiply(fresh, fresh)
+        product_budget = budget(product)
+        plain_product_budget = budget(encode_utils.multiply_plain(fresh, encode_utils.encode_num(value)))
+
+        model = self.noise_model
+        model.fresh_offset = coeff_bits - plain_bits - log2(poly_degree) - fresh_budget
+        model.multiply_offset = (fresh_budget - product_budget) - plain_bits - 2 * log2(poly_degree)
+        model.multiply_plain_offset = (fresh_budget - plain_product_budget) - log2(n_coeffs)
+
+        # Largest plaintext coefficient of the product, coefficients above t / 2 are negative
+        plain = Plaintext()
+        decode_utils.decryptor.decrypt(product, plain)
+        plain_modulus = context.context.plain_modulus().value()
+        max_coeff = max([min(plain.coeff_at(i), plain_modulus - plain.coeff_at(i)) for i in range(plain.coeff_count())]
+                        + [1])
+        model.coeff_growth_offset = log2(max_coeff) - 0.5 * log2(n_coeffs)
+        return model
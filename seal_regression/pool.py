@@ -0,0 +1,143 @@
+from seal_regression.profiler import Profiler
+from seal_regression._seal import Ciphertext
+from seal_regression import kernels
+from collections import defaultdict
+from typing import Callable, List
+import threading
+import weakref
+
+
+class CiphertextPool:
+    def __init__(self, max_free=4096):
+        """
+        Free list of ciphertexts, which FractionalEncoderUtils reuses for results of operations instead of allocating
+        new ones. Results are copied into recycled ciphertexts with add_many (see FractionalEncoderUtils.assign),
+        which still copies the operand through a temporary vector, so the pool does not save copies. Temporaries are
+        returned with FractionalEncoderUtils.release, e.g. the gradient after every update of
+        SecureLinearRegression.fit, so the number of resident ciphertexts stays bounded.
+        :param max_free: largest number of free ciphertexts kept, released ciphertexts above it are dropped
+
+        Example:
+        >> encode_utils = FractionalEncoderUtils(context, pool=CiphertextPool())
+        >> model.fit(X_enc, y_enc, n_iter=10)
+        >> encode_utils.pool.stats()
+        {'allocated': 120, 'reused': 2400, 'free': 60, 'in_use': 60}
+        """
+        self.max_free = max_free
+        self._free = []
+        self._lock = threading.Lock()
+        self.n_allocated = 0
+        self.n_reused = 0
+
+    def acquire(self, allocate: Callable[[], Ciphertext]) -> Ciphertext:
+        """
+        :param allocate: function allocating a new ciphertext, called if the pool is empty
+        :return: free ciphertext, its content is undefined
+        """
+        with self._lock:
+            if self._free:
+                self.n_reused += 1
+                return self._free.pop()
+            self.n_allocated += 1
+        return allocate()
+
+    def release(self, ciphertexts: List[Ciphertext]):
+        """
+        Returns ciphertexts to the pool, they must not be used by the caller afterwards
+        """
+        with self._lock:
+            seen = {id(ciphertext) for ciphertext in self._free}
+            for ciphertext in ciphertexts:
+                if len(self._free) >= self.max_free:
+                    break
+                # Views share ciphertexts, so the same one may be released twice
+                if type(ciphertext) == Ciphertext and id(ciphertext) not in seen:
+                    seen.add(id(ciphertext))
+                    self._free.append(ciphertext)
+
+    def free(self) -> List[Ciphertext]:
+        """
+        :return: copy of the free list
+        """
+        with self._lock:
+            return list(self._free)
+
+    def stats(self) -> dict:
+        return {'allocated': self.n_allocated, 'reused': self.n_reused, 'free': len(self._free),
+                'in_use': self.n_allocated - len(self._free)}
+
+    def clear(self):
+        with self._lock:
+            self._free = []
+
+    def __repr__(self):
+        return f'CiphertextPool({self.stats()})'
+
+
+class MemoryProfiler(Profiler):
+    def __init__(self):
+        """
+        Profiler, which also tracks ciphertexts in use: every ciphertext, returned by a profiled operation, is
+        referenced weakly, and the largest number of them in use at once is recorded per scope (e.g. per iteration of
+        SecureLinearRegression.fit). Ciphertexts on the free list of the CiphertextPool of profiled encoder utils do not
+        count, scratch ciphertexts of the dot kernel (see kernels.scratch_count) do.
+
+        Example:
+        >> profiler = MemoryProfiler()
+        >> with profiler.profile(encode_utils):
+        >>     model.fit(X_enc, y_enc, n_iter=5)
+        >> profiler.peaks()
+        {'iteration 0': 212, 'iteration 1': 215, ...}
+        """
+        super().__init__(trace=False)
+        self._resident = weakref.WeakSet()
+        self._peaks = defaultdict(int)
+        self._pools = []
+
+    def attach(self, encode_utils=None, decode_utils=None):
+        super().attach(encode_utils, decode_utils)
+        if encode_utils is not None and encode_utils.pool is not None:
+            self._pools.append(encode_utils.pool)
+
+    def detach(self):
+        super().detach()
+        self._pools = []
+
+    def in_use(self) -> int:
+        """
+        :return: number of ciphertexts in use: resident ciphertexts, returned by profiled operations, which are not on
+        the free list of a pool, plus scratch ciphertexts
+        """
+        free = sum(1 for pool in self._pools for ciphertext in pool.free() if ciphertext in self._resident)
+        return len(self._resident) - free + kernels.scratch_count()
+
+    def _record(self, name: str, start: float, elapsed: float, children: float, result=None, allocated=False,
+                is_scope=False):
+        super()._record(name, start, elapsed, children, result, allocated, is_scope)
+        if type(result) == Ciphertext:
+            with self._lock:
+                self._resident.add(result)
+                in_use = self.in_use()
+                path = ''
+                for scope_name, _, scope_flag in self._stack():
+                    if scope_flag:
+                        path = f'{path}/{scope_name}' if path else scope_name
+                        self._peaks[path] = max(self._peaks[path], in_use)
+                self._peaks['root'] = max(self._peaks['root'], in_use)
+
+    def peaks(self) -> dict:
+        """
+        :return: {scope path: largest number of ciphertexts in use}
+        """
+        return dict(self._peaks)
+
+    def allocations(self) -> dict:
+        """
+        :return: {scope path: number of ciphertexts allocated by operations}
+        """
+        return {path: sum(entry['allocations'] for entry in ops.values()) for path, ops in self.summary().items()}
+
+    def reset(self):
+        super().reset()
+        self._resident = weakref.WeakSet()
+        self._peaks = defaultdict(int)
@@ -0,0 +1,270 @@
+from seal_regression._seal import Ciphertext
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter
+import json
+import threading
+
+# Methods of FractionalEncoderUtils, which are timed
+ENCODER_OPS = ['encode', 'encrypt_num', 'add', 'add_plain', 'subtract', 'multiply', 'multiply_plain', 'relinearize',
+               'sum_enc_array', 'dot']
+# Methods of FractionalDecryptorUtils, which are timed
+DECRYPTOR_OPS = ['decrypt']
+# Operations, which allocate a new ciphertext unless out is given
+_ALLOCATING_OPS = {'encrypt_num', 'add', 'add_plain', 'subtract', 'multiply', 'multiply_plain', 'relinearize'}
+
+# Profiler, which scope() reports to
+_active = None
+# Wrapped methods, shared by all profilers attached to the same object: (id(object), name) -> [wrapper,
+# {profiler: number of attach calls}]
+_wrappers = {}
+_wrappers_lock = threading.Lock()
+
+
+@contextmanager
+def _no_scope():
+    yield
+
+
+def scope(name: str):
+    """
+    Attributes operations inside the with block to a named scope of the active profiler; does nothing if no profiler
+    is active
+    Example:
+    >> with scope('prediction'):
+    >>     model.predict(X_enc)
+    """
+    return _no_scope() if _active is None else _active.scope(name)
+
+
+def current_scopes() -> list:
+    """
+    Names of scopes open in the calling thread of the active profiler, to pass to inherit_scopes in another thread
+    """
+    return [] if _active is None else _active.scope_names()
+
+
+def inherit_scopes(names: list):
+    """
+    Opens scopes of another thread (see current_scopes) in the calling thread, e.g. in executor workers, so that their
+    operations are attributed to the scope of the caller; the scopes are not timed again
+    """
+    return _no_scope() if _active is None or not names else _active.inherit(names)
+
+
+def _timed(obj, name: str):
+    """
+    Wrapper of a method, which times every call for all profilers attached to obj
+    """
+    method = getattr(obj, name)
+    key = (id(obj), name)
+
+    @wraps(method)
+    def timed(*args, **kwargs):
+        profilers = list(_wrappers[key][1])
+        stacks = [profiler._stack() for profiler in profilers]
+        for stack in stacks:
+            stack.append([name, 0.0, False])
+        start = perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        finally:
+            elapsed = perf_counter() - start
+            children = []
+            for stack in stacks:
+                children.append(stack.pop()[1])
+                if stack:
+                    stack[-1][1] += elapsed
+        # Operations returning one of their arguments (e.g. encrypt_num of a ciphertext) allocate nothing
+        allocated = name in _ALLOCATING_OPS and kwargs.get('out') is None and not any(result is arg for arg in args)
+        for profiler, nested in zip(profilers, children):
+            profiler._record(name, start, elapsed, nested, result, allocated=allocated)
+        return result
+
+    return timed
+
+
+class Profiler:
+    def __init__(self, trace=True):
+        """
+        Counts and times homomorphic operations of encoder/decoder utils, tracks sizes of resulting ciphertexts and
+        allocations. Operations are attributed to nested scopes: SecureLinearRegression.fit opens a scope per
+        iteration, users open their own with profiler.scope or scope().
+        Methods are wrapped only while profiling, so there is no overhead otherwise. Operations run by a
+        ProcessExecutor happen in worker processes and are not timed (op_counts of encoder utils still include them).
+        :param trace: if True, every call is recorded as a trace event (see chrome_trace)
+
+        Example:
+        >> profiler = Profiler()
+        >> with profiler.profile(encode_utils, decode_utils):
+        >>     model.fit(X_enc, y_enc, n_iter=5)
+        >> profiler.summary()['iteration 0']['multiply']
+        {'count': 42, 'total': 1.3, 'self': 1.1, 'allocations': 42, 'sizes': {3: 42}}
+        >> profiler.chrome_trace('fit_trace.json')  # chrome://tracing or speedscope
+        """
+        self.trace = trace
+        self.stats = defaultdict(lambda: defaultdict(lambda: {'count': 0, 'total': 0.0, 'self': 0.0,
+                                                              'allocations': 0, 'sizes': Counter()}))
+        self.events = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wrapped = []
+        self._start = perf_counter()
+
+    def _stack(self) -> list:
+        # Per thread stack of [name, time of nested calls, is scope], scopes of other threads are not visible
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def scope_names(self) -> list:
+        return [name for name, _, is_scope in self._stack() if is_scope]
+
+    @contextmanager
+    def inherit(self, names: list):
+        """
+        Opens scopes of another thread in the calling thread without timing them, see inherit_scopes
+        """
+        stack = self._stack()
+        depth = len(stack)
+        stack.extend([name, 0.0, True] for name in names)
+        try:
+            yield self
+        finally:
+            del stack[depth:]
+
+    def _scope_path(self) -> str:
+        return '/'.join(name for name, _, is_scope in self._stack() if is_scope) or 'root'
+
+    def _record(self, name: str, start: float, elapsed: float, children: float, result=None, allocated=False,
+                is_scope=False):
+        with self._lock:
+            if not is_scope:
+                entry = self.stats[self._scope_path()][name]
+                entry['count'] += 1
+                entry['total'] += elapsed
+                entry['self'] += elapsed - children
+                entry['allocations'] += int(allocated)
+                if type(result) == Ciphertext:
+                    entry['sizes'][result.size()] += 1
+            if self.trace:
+                self.events.append({'name': name, 'ph': 'X', 'ts': (start - self._start) * 1e6,
+                                    'dur': elapsed * 1e6, 'pid': 0, 'tid': threading.get_ident(),
+                                    'cat': 'scope' if is_scope else 'op'})
+
+    @contextmanager
+    def scope(self, name: str):
+        """
+        Attributes operations inside the with block to a named scope, scopes can be nested
+        """
+        stack = self._stack()
+        stack.append([name, 0.0, True])
+        start = perf_counter()
+        try:
+            yield self
+        finally:
+            elapsed = perf_counter() - start
+            stack.pop()
+            if stack:
+                stack[-1][1] += elapsed
+            self._record(name, start, elapsed, 0.0, is_scope=True)
+
+    def _wrap(self, obj, name: str):
+        with _wrappers_lock:
+            key = (id(obj), name)
+            if key not in _wrappers:
+                _wrappers[key] = [_timed(obj, name), {}]
+                # Instance attribute shadows the class method until the last profiler detaches
+                setattr(obj, name, _wrappers[key][0])
+            profilers = _wrappers[key][1]
+            profilers[self] = profilers.get(self, 0) + 1
+        self._wrapped.append((obj, name))
+
+    def _unwrap(self, obj, name: str):
+        with _wrappers_lock:
+            key = (id(obj), name)
+            profilers = _wrappers[key][1]
+            profilers[self] -= 1
+            if profilers[self] == 0:
+                del profilers[self]
+            if not profilers:
+                del _wrappers[key]
+                delattr(obj, name)
+
+    def attach(self, encode_utils=None, decode_utils=None):
+        """
+        Starts timing operations of encoder and decoder utils, and makes the profiler active for scope()
+        """
+        global _active
+        for utils, ops in ((encode_utils, ENCODER_OPS), (decode_utils, DECRYPTOR_OPS)):
+            if utils is not None:
+                for op in ops:
+                    self._wrap(utils, op)
+        _active = self
+
+    def detach(self):
+        """
+        Restores original methods
+        """
+        global _active
+        for obj, name in self._wrapped:
+            self._unwrap(obj, name)
+        self._wrapped = []
+        if _active is self:
+            _active = None
+
+    @contextmanager
+    def profile(self, encode_utils=None, decode_utils=None):
+        """
+        Profiles operations inside the with block
+        """
+        self.attach(encode_utils, decode_utils)
+        try:
+            yield self
+        finally:
+            self.detach()
+
+    def summary(self) -> dict:
+        """
+        :return: {scope path: {operation: {'count', 'total' (seconds), 'self' (seconds without nested operations),
+        'allocations', 'sizes' (number of results per ciphertext size)}}}
+        """
+        return {path: {op: dict(entry, sizes=dict(entry['sizes'])) for op, entry in ops.items()}
+                for path, ops in self.stats.items()}
+
+    def totals(self) -> dict:
+        """
+        Statistics per operation, summed over all scopes
+        """
+        totals = defaultdict(lambda: {'count': 0, 'total': 0.0, 'self': 0.0, 'allocations': 0, 'sizes': Counter()})
+        for ops in self.stats.values():
+            for op, entry in ops.items():
+                for key in ('count', 'total', 'self', 'allocations'):
+                    totals[op][key] += entry[key]
+                totals[op]['sizes'].update(entry['sizes'])
+        return {op: dict(entry, sizes=dict(entry['sizes'])) for op, entry in totals.items()}
+
+    def to_json(self, path: str = None) -> str:
+        """
+        Summary per scope and totals as JSON
+        :param path: if given, JSON is also written to the file
+        """
+        result = json.dumps({'scopes': self.summary(), 'totals': self.totals()}, indent=2)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(result)
+        return result
+
+    def chrome_trace(self, path: str):
+        """
+        Writes recorded calls in Chrome trace event format, which chrome://tracing, Perfetto and speedscope show as a
+        flame graph
+        """
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+
+    def reset(self):
+        self.stats.clear()
+        self.events = []
+        self._start = perf_counter()
@@ -0,0 +1,104 @@
+from seal_regression.encarray import EncArray
+from seal_regression.fractions_utils import FractionalEncoderUtils, FractionalDecryptorUtils
+from seal_regression.packed import PackedEncArray
+from abc import ABC, abstractmethod
+from typing import Optional
+import numpy as np
+
+
+class Refresher(ABC):
+    def __init__(self, max_iterations: Optional[int]):
+        """
+        Re-encryption protocol for SecureLinearRegression.fit: when the noise budget of the weights runs low, or
+        weights went through max_iterations updates since they were encrypted, the weights are sent to the key holder,
+        who decrypts and encrypts them again. Every update also grows plaintext coefficients of the weights
+        (FractionalEncoder has no rescaling), which the noise budget does not show: weights may stop decrypting
+        correctly while hundreds of bits of noise budget are left. The number of updates they survive depends on the
+        encryption parameters, the data and the update rule, see Optimizer.step_cost
+        :param max_iterations: number of updates after which weights are refreshed regardless of the noise budget,
+        e.g. GradientDescent(lr).step_cost(SimUtils(**context.config()), n_samples, n_features,
+        max_value=max_value)['max_steps']. None refreshes on the noise budget only (e.g. for PackedEncArray weights,
+        whose fixed-point scale fit tracks itself)
+        """
+        self.max_iterations = max_iterations
+        self.iterations = 0
+
+    @abstractmethod
+    def noise_budget(self, weights: EncArray) -> float:
+        """
+        :return: remaining (measured or estimated) noise budget of weights in bits
+        """
+
+    @abstractmethod
+    def refresh(self, weights: EncArray) -> EncArray:
+        """
+        :return: freshly encrypted weights
+        """
+
+    def step(self):
+        """
+        Called by fit after every weights update
+        """
+        self.iterations += 1
+
+    def needs_refresh(self) -> bool:
+        """
+        :return: True if weights reached max_iterations updates since they were encrypted
+        """
+        return self.max_iterations is not None and self.iterations >= self.max_iterations
+
+    def reset(self):
+        """
+        Called by fit after weights were refreshed
+        """
+        self.iterations = 0
+
+
+class KeyHolderRefresher(Refresher):
+    def __init__(self, decode_utils: FractionalDecryptorUtils, encode_utils: FractionalEncoderUtils,
+                 max_iterations: Optional[int]):
+        """
+        In-process stand-in for the key holder, measuring the noise budget exactly with the secret key
+        :param decode_utils: decryptor with the secret key
+        :param encode_utils: encoder to re-encrypt weights with
+        :param max_iterations: see Refresher
+        """
+        super().__init__(max_iterations)
+        self.decode_utils = decode_utils
+        self.encode_utils = encode_utils
+        self.n_refreshes = 0
+
+    def noise_budget(self, weights: EncArray) -> float:
+        return np.min(weights.noise_budget(self.decode_utils))
+
+    def refresh(self, weights: EncArray) -> EncArray:
+        self.n_refreshes += 1
+        if isinstance(weights, PackedEncArray):
+            # Re-encrypted at the initial fixed-point scale of encode_utils (BatchEncoderUtils)
+            return PackedEncArray(weights.decrypt_array(self.decode_utils), self.encode_utils, layout=weights.layout)
+        # type of weights is kept, so that simulated weights are refreshed in simulation
+        return type(weights)(weights.decrypt_array(self.decode_utils), enc_utils=self.encode_utils)
+
+
+class CallbackRefresher(Refresher):
+    def __init__(self, callback, fresh_budget: float, bits_per_iteration: float,
+                 max_iterations: Optional[int]):
+        """
+        Refresher for a remote key holder (client hook). Without the secret key the noise budget is estimated: every
+        iteration is assumed to consume a fixed number of bits (see planner or a KeyHolderRefresher run)
+        :param callback: function, which takes encrypted weights and returns them freshly encrypted
+        :param fresh_budget: noise budget of freshly encrypted weights in bits
+        :param bits_per_iteration: noise budget consumed by one iteration of fit
+        :param max_iterations: see Refresher
+        """
+        super().__init__(max_iterations)
+        self.callback = callback
+        self.fresh_budget = fresh_budget
+        self.bits_per_iteration = bits_per_iteration
+
+    def noise_budget(self, weights: EncArray) -> float:
+        return self.fresh_budget - self.bits_per_iteration * self.iterations
+
+    def refresh(self, weights: EncArray) -> EncArray:
+        self.reset()
+        return self.callback(weights)
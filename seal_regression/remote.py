@@ -0,0 +1,408 @@
+from seal_regression.encarray import EncArray
+from seal_regression.executor import attach_encoder_utils, export_encoder_utils
+from seal_regression.fractions_utils import FractionalEncoderUtils, FractionalDecryptorUtils, RelinearizationPolicy
+from seal_regression.gradient import GramGradientEngine
+from seal_regression.linear_regression import SecureLinearRegression
+from seal_regression.optimizers import GradientDescent
+from seal_regression.refresh import KeyHolderRefresher, Refresher
+from seal_regression.serialization import serialize, deserialize
+from seal_regression.simulation import SimUtils
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import AuthenticationError
+from time import time
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import numpy as np
+import os
+import struct
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Connections start with a mutual HMAC challenge on a shared authkey (as multiprocessing.connection does), after that
+# every message is a tuple, sent as a JSON header with the lengths of binary blobs (serialized SEAL objects), followed
+# by the blobs themselves. Nothing received is unpickled.
+# Client -> server: ('setup', utils), ('rows', X, y) per batch, ('train', lr, n_iter, refresh_threshold,
+#                   max_iterations)
+# Server -> client: ('noise_budget', weights) and ('refresh', weights) requests, answered with ('result', value), and
+#                   finally ('weights', weights, history) or ('error', message). The client never returns decrypted
+#                   values, only noise budgets and fresh encryptions
+_LENGTH = struct.Struct('<Q')
+_BLOB_KINDS = ('$c', '$p', '$b')  # ciphertext, plaintext, other bytes (keys)
+_CHALLENGE_SIZE = 32
+_MAX_HEADER = 1 << 30
+
+
+def _to_json(value, blobs: list):
+    """
+    Replaces serialized SEAL objects and bytes in value with indices of blobs
+    """
+    if type(value) == tuple and len(value) == 2 and value[0] in ('c', 'p') and type(value[1]) == bytes:
+        blobs.append(value[1])
+        return {'$' + value[0]: len(blobs) - 1}
+    if type(value) == bytes:
+        blobs.append(value)
+        return {'$b': len(blobs) - 1}
+    if isinstance(value, (list, tuple)):
+        return [_to_json(ele, blobs) for ele in value]
+    if isinstance(value, dict):
+        return {key: _to_json(ele, blobs) for key, ele in value.items()}
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    return value
+
+
+def _from_json(value, blobs: list):
+    """
+    Inverse of _to_json: serialized SEAL objects become ('c' | 'p', bytes) again, see serialization.deserialize
+    """
+    if type(value) == list:
+        return [_from_json(ele, blobs) for ele in value]
+    if type(value) == dict and len(value) == 1 and next(iter(value)) in _BLOB_KINDS:
+        kind, index = next(iter(value.items()))
+        return blobs[index] if kind == '$b' else (kind[1:], blobs[index])
+    if type(value) == dict:
+        return {key: _from_json(ele, blobs) for key, ele in value.items()}
+    return value
+
+
+async def _send(writer: asyncio.StreamWriter, message: tuple) -> int:
+    blobs = []
+    parts = [_to_json(part, blobs) for part in message]
+    header = json.dumps({'message': parts, 'blobs': [len(blob) for blob in blobs]}).encode()
+    writer.write(_LENGTH.pack(len(header)))
+    writer.write(header)
+    for blob in blobs:
+        writer.write(blob)
+    await writer.drain()
+    return _LENGTH.size + len(header) + sum(len(blob) for blob in blobs)
+
+
+async def _recv(reader: asyncio.StreamReader) -> tuple:
+    length, = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+    if length > _MAX_HEADER:
+        raise ValueError(f'Message header of {length} bytes is too long')
+    header = json.loads(await reader.readexactly(length))
+    blobs = [await reader.readexactly(size) for size in header['blobs']]
+    return tuple(_from_json(header['message'], blobs))
+
+
+def _digest(authkey: bytes, challenge: bytes) -> bytes:
+    return hmac.new(authkey, challenge, hashlib.sha256).digest()
+
+
+async def _deliver_challenge(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, authkey: bytes):
+    challenge = os.urandom(_CHALLENGE_SIZE)
+    writer.write(challenge)
+    await writer.drain()
+    response = await reader.readexactly(hashlib.sha256().digest_size)
+    if not hmac.compare_digest(response, _digest(authkey, challenge)):
+        raise AuthenticationError('Peer failed to authenticate')
+
+
+async def _answer_challenge(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, authkey: bytes):
+    challenge = await reader.readexactly(_CHALLENGE_SIZE)
+    writer.write(_digest(authkey, challenge))
+    await writer.drain()
+
+
+def _export_setup(enc_utils: FractionalEncoderUtils) -> tuple:
+    config, keys, utils_config = export_encoder_utils(enc_utils, use_key_store=False)
+    policy = utils_config['relin_policy']
+    return config, keys, dict(utils_config, relin_policy={'mode': policy.mode, 'max_size': policy.max_size})
+
+
+def _attach_setup(config: dict, keys: dict, utils_config: dict) -> FractionalEncoderUtils:
+    policy = RelinearizationPolicy(**utils_config['relin_policy'])
+    return attach_encoder_utils(config, keys, dict(utils_config, relin_policy=policy))
+
+
+class RemoteRefresher(Refresher):
+    def __init__(self, request, max_iterations: Optional[int]):
+        """
+        Refresher of the training server: noise budget and re-encryption are requested from the key-holding client
+        :param request: function, which sends a request message to the client and returns the result
+        :param max_iterations: see Refresher, the server cannot derive it without the data, so the client sends it
+        """
+        super().__init__(max_iterations)
+        self.request = request
+        self.n_refreshes = 0
+
+    def noise_budget(self, weights: EncArray) -> float:
+        return self.request('noise_budget', weights)
+
+    def refresh(self, weights: EncArray) -> EncArray:
+        self.n_refreshes += 1
+        return EncArray._wrap(self.request('refresh', weights), weights.enc_utils)
+
+
+class _Session:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, authkey: bytes,
+                 pipeline_depth: int):
+        """
+        Server side of one client connection. HE computations run in order on a single compute thread, so the event
+        loop keeps receiving batches while the previous ones are added to the Gram matrix.
+        """
+        self.reader, self.writer = reader, writer
+        self.authkey = authkey
+        self.pipeline_depth = pipeline_depth
+        self.loop = asyncio.get_running_loop()
+        self.compute = ThreadPoolExecutor(1)
+        self.enc_utils = None
+        self.engine = None
+        self.first_batch = None
+
+    def _ingest(self, rows, targets):
+        X = EncArray._wrap(deserialize(rows), self.enc_utils)
+        y = EncArray._wrap(deserialize(targets), self.enc_utils)
+        if self.engine is None:
+            self.engine = GramGradientEngine(X, y)
+            self.first_batch = X, y
+        else:
+            self.engine.append(X, y)
+        logger.debug(f'Received {X.shape[0]} rows, {self.engine.n_samples} in total')
+
+    async def _client_request(self, kind: str, weights: EncArray):
+        await _send(self.writer, (kind, serialize(weights.enc_arr)))
+        message = await _recv(self.reader)
+        return deserialize(message[1])
+
+    def _request(self, kind: str, weights: EncArray):
+        # Called from the compute thread, which waits while the event loop talks to the client
+        return asyncio.run_coroutine_threadsafe(self._client_request(kind, weights), self.loop).result()
+
+    def _train(self, lr: float, n_iter: int, refresh_threshold: float, max_iterations: Optional[int]):
+        X, y = self.first_batch
+        model = SecureLinearRegression()
+        model.fit(X, y, lr=lr, n_iter=n_iter, gradient_engine=self.engine,
+                  refresher=RemoteRefresher(self._request, max_iterations), refresh_threshold=refresh_threshold)
+        return model
+
+    async def run(self):
+        authenticated = False
+        try:
+            await _deliver_challenge(self.reader, self.writer, self.authkey)
+            await _answer_challenge(self.reader, self.writer, self.authkey)
+            authenticated = True
+            await self._serve()
+        except (AuthenticationError, asyncio.IncompleteReadError, ConnectionError) as e:
+            logger.warning(f'Connection from {self.writer.get_extra_info("peername")} dropped: {e!r}')
+        except Exception as e:
+            # Failed training or a malformed payload: the client gets the reason instead of a closed connection
+            logger.exception('Training session failed')
+            if authenticated:
+                try:
+                    await _send(self.writer, ('error', repr(e)))
+                except ConnectionError:
+                    pass
+        finally:
+            self.compute.shutdown()
+            self.writer.close()
+
+    async def _serve(self):
+        message = await _recv(self.reader)
+        if message[0] != 'setup':
+            await _send(self.writer, ('error', f'Expected setup, received {message[0]}'))
+            return
+        self.enc_utils = _attach_setup(*message[1])
+        pending = []
+        while True:
+            message = await _recv(self.reader)
+            if message[0] != 'rows':
+                break
+            # Batches, received while the compute thread is busy, wait in memory, at most pipeline_depth of them
+            pending = [future for future in pending if not future.done()]
+            if len(pending) >= self.pipeline_depth:
+                await pending[0]
+            pending.append(self.loop.run_in_executor(self.compute, self._ingest, message[1], message[2]))
+        await asyncio.gather(*pending)
+
+        if message[0] != 'train':
+            await _send(self.writer, ('error', f'Expected rows or train, received {message[0]}'))
+            return
+        if self.engine is None:
+            await _send(self.writer, ('error', 'No rows were sent before train'))
+            return
+        _, lr, n_iter, refresh_threshold, max_iterations = message
+        start = time()
+        model = await self.loop.run_in_executor(self.compute, self._train, lr, n_iter, refresh_threshold,
+                                                max_iterations)
+        logger.info(f'Trained on {self.engine.n_samples} rows in {time() - start:.2f} s')
+        await _send(self.writer, ('weights', serialize(model.weigths.enc_arr), model.history))
+
+
+async def start_server(host='localhost', port=0, pipeline_depth=2, authkey: bytes = None) -> asyncio.AbstractServer:
+    """
+    Starts the training server: clients stream encrypted rows, the server accumulates X^T X and X^T y
+    (GramGradientEngine) as the rows arrive and runs gradient descent once all rows are sent. The server never holds
+    the secret key; noise budget and refreshes of weights are requested from the client.
+    :param host: host to listen on
+    :param port: port to listen on, 0 picks a free port (see server.sockets[0].getsockname())
+    :param pipeline_depth: number of received batches, which may wait for computation
+    :param authkey: shared secret of the server and its clients, connections which do not prove it are dropped
+    :return: asyncio server
+    """
+    if authkey is None:
+        raise ValueError('Training server needs an authkey')
+
+    async def handle(reader, writer):
+        await _Session(reader, writer, authkey, pipeline_depth).run()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+class TrainingClient:
+    def __init__(self, encode_utils: FractionalEncoderUtils, decode_utils: FractionalDecryptorUtils,
+                 host='localhost', port: int = None, authkey: bytes = None):
+        """
+        Data owner: encrypts the data batch by batch and streams it to a training server, then answers noise budget
+        and refresh requests with the secret key. Encryption of the next batch runs in a background thread while the
+        current one is sent, and the server computes on earlier batches meanwhile.
+        :param encode_utils: encoder utils, whose public (and evaluation) keys are sent to the server
+        :param decode_utils: decryptor with the secret key, never leaves the client
+        :param host: server host
+        :param port: server port
+        :param authkey: shared secret of the server
+
+        Example:
+        >> client = TrainingClient(encode_utils, decode_utils, port=8765, authkey=b'secret')
+        >> weights = asyncio.run(client.train(X, y, batch_size=64, n_iter=10))
+        >> weights.decrypt_array(decode_utils)
+        >> client.stats
+        """
+        self.encode_utils = encode_utils
+        self.decode_utils = decode_utils
+        if authkey is None:
+            raise ValueError('Training client needs an authkey')
+        self.host, self.port = host, port
+        self.authkey = authkey
+        # Answers requests only, refreshes are scheduled by the server
+        self.key_holder = KeyHolderRefresher(decode_utils, encode_utils, max_iterations=None)
+        self.history = None
+        self.stats = None
+
+    def _encrypt_batch(self, X: np.ndarray, y: np.ndarray) -> tuple:
+        X_enc = EncArray.from_numpy(X, self.encode_utils)
+        y_enc = EncArray.from_numpy(y, self.encode_utils)
+        return serialize(X_enc.enc_arr), serialize(y_enc.enc_arr)
+
+    def _answer(self, kind: str, payload):
+        weights = EncArray._wrap(deserialize(payload), self.encode_utils)
+        if kind == 'noise_budget':
+            return float(self.key_holder.noise_budget(weights))
+        if kind == 'refresh':
+            return serialize(self.key_holder.refresh(weights).enc_arr)
+        raise ValueError(f'Unknown request: {kind}')
+
+    async def train(self, X, y, batch_size=64, lr=0.2, n_iter=10, refresh_threshold=10, pipeline_depth=2) \
+            -> EncArray:
+        """
+        Encrypts and sends the data, and waits for the trained weights
+        :param X: unencrypted design matrix of shape (n, d)
+        :param y: unencrypted target variable of shape (n, 1)
+        :param batch_size: number of rows per message
+        :param lr: learning rate
+        :param n_iter: number of iterations
+        :param refresh_threshold: noise budget margin in bits, see SecureLinearRegression.fit
+        :param pipeline_depth: number of encrypted batches, which may wait to be sent
+        :return: encrypted weights
+        """
+        X = np.asarray(X, dtype=float)
+        y = np.asarray(y, dtype=float).reshape(-1, 1)
+        loop = asyncio.get_running_loop()
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        encryptor = ThreadPoolExecutor(1)
+        stats = {'n_rows': X.shape[0], 'bytes_sent': 0, 'n_requests': 0}
+        start = time()
+        try:
+            await _answer_challenge(reader, writer, self.authkey)
+            await _deliver_challenge(reader, writer, self.authkey)
+            stats['bytes_sent'] += await _send(writer, ('setup', _export_setup(self.encode_utils)))
+            queue = asyncio.Queue(maxsize=pipeline_depth)
+
+            async def produce():
+                for batch_start in range(0, X.shape[0], batch_size):
+                    rows = slice(batch_start, batch_start + batch_size)
+                    await queue.put(await loop.run_in_executor(encryptor, self._encrypt_batch, X[rows], y[rows]))
+                await queue.put(None)
+
+            async def consume():
+                while True:
+                    batch = await queue.get()
+                    if batch is None:
+                        return
+                    stats['bytes_sent'] += await _send(writer, ('rows',) + batch)
+
+            await asyncio.gather(produce(), consume())
+            stats['upload_seconds'] = time() - start
+            # Growth of plaintext coefficients depends on the data, which only the client sees
+            cost = GradientDescent(lr).step_cost(SimUtils(**self.encode_utils.frac_context.config()), *X.shape,
+                                                 max_value=max(np.abs(X).max(), np.abs(y).max(), 1.0))
+            await _send(writer, ('train', lr, n_iter, refresh_threshold, cost['max_steps']))
+
+            while True:
+                message = await _recv(reader)
+                if message[0] == 'weights':
+                    break
+                if message[0] == 'error':
+                    raise RuntimeError(f'Training server: {message[1]}')
+                stats['n_requests'] += 1
+                result = await loop.run_in_executor(encryptor, self._answer, message[0], message[1])
+                await _send(writer, ('result', result))
+        finally:
+            encryptor.shutdown()
+            writer.close()
+
+        stats['seconds'] = time() - start
+        self.stats = stats
+        self.history = message[2]
+        return EncArray._wrap(deserialize(message[1]), self.encode_utils)
+
+
+def train_local(X, y, encode_utils: FractionalEncoderUtils, decode_utils: FractionalDecryptorUtils, **kwargs) \
+        -> EncArray:
+    """
+    Runs a training server and a client on localhost, e.g. for testing
+    :param kwargs: parameters of TrainingClient.train
+    :return: encrypted weights
+
+    Example:
+    >> weights = train_local(X, y, encode_utils, decode_utils, batch_size=16, n_iter=5)
+    """
+    authkey = os.urandom(32)
+
+    async def run():
+        server = await start_server('localhost', 0, authkey=authkey)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return await TrainingClient(encode_utils, decode_utils, 'localhost', port, authkey).train(X, y, **kwargs)
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    return asyncio.run(run())
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    parser = argparse.ArgumentParser(description='Training server for encrypted linear regression')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, required=True)
+    parser.add_argument('--pipeline_depth', type=int, default=2)
+    parser.add_argument('--authkey', required=True, help='shared secret, clients have to pass the same one')
+    args = parser.parse_args()
+
+    async def serve():
+        server = await start_server(args.host, args.port, args.pipeline_depth, args.authkey.encode())
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+if __name__ == '__main__':
+    main()
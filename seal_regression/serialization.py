@@ -0,0 +1,124 @@
+from seal_regression._seal import Ciphertext, Plaintext
+from typing import List
+import os
+import tempfile
+
+# PySEAL exposes only file-based save/load, so objects travel through a temporary file, kept in memory (tmpfs)
+# where available
+_TMP_DIR = '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) else None
+
+
+def _tmp_path() -> str:
+    fd, path = tempfile.mkstemp(prefix='seal_', dir=_TMP_DIR)
+    os.close(fd)
+    return path
+
+
+def to_bytes(obj) -> bytes:
+    """
+    Serializes SEAL object (Ciphertext, Plaintext, keys) with its save method
+    :param obj: SEAL object
+    :return: serialized object
+    """
+    path = _tmp_path()
+    try:
+        obj.save(path)
+        with open(path, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+
+def from_bytes(data: bytes, obj):
+    """
+    Loads serialized SEAL object into obj
+    :param data: result of to_bytes
+    :param obj: empty (or reused) SEAL object of the right type, e.g. Ciphertext()
+    :return: obj
+    """
+    path = _tmp_path()
+    try:
+        with open(path, 'wb') as f:
+            f.write(data)
+        obj.load(path)
+        return obj
+    finally:
+        os.remove(path)
+
+
+def to_bytes_many(objs: List) -> List[bytes]:
+    """
+    Serializes many SEAL objects through a single temporary file
+    """
+    path = _tmp_path()
+    try:
+        result = []
+        for obj in objs:
+            obj.save(path)
+            with open(path, 'rb') as f:
+                result.append(f.read())
+        return result
+    finally:
+        os.remove(path)
+
+
+def from_bytes_many(data: List, objs: List) -> List:
+    """
+    Loads many serialized SEAL objects through a single temporary file
+    :param data: serialized objects, bytes or buffers (e.g. memoryview slices of a memory map, which are not copied)
+    :param objs: empty (or reused) SEAL objects of the right type, one per serialized object
+    :return: objs
+    """
+    path = _tmp_path()
+    try:
+        for blob, obj in zip(data, objs):
+            with open(path, 'wb') as f:
+                f.write(blob)
+            obj.load(path)
+        return objs
+    finally:
+        os.remove(path)
+
+
+def serialize(value, memo: dict = None):
+    """
+    Serializes nested lists of ciphertexts, plaintexts and plain python numbers
+    :param memo: if given, every list, ciphertext and plaintext is serialized once, later occurrences of the same
+    object (e.g. weights repeated for every row) become references. The same memo has to be used for all values,
+    which are deserialized together
+    """
+    if memo is not None and type(value) in (list, Ciphertext, Plaintext):
+        if id(value) in memo:
+            return 'r', memo[id(value)]
+        memo[id(value)] = len(memo)
+    if type(value) == list:
+        return [serialize(ele, memo) for ele in value]
+    if type(value) == Ciphertext:
+        return 'c', to_bytes(value)
+    if type(value) == Plaintext:
+        return 'p', to_bytes(value)
+    return value
+
+
+def deserialize(value, out=None, memo: list = None):
+    """
+    Inverse of serialize
+    :param value: serialized nested lists
+    :param out: nested lists of already allocated ciphertexts to load into, if None new objects are allocated
+    :param memo: empty list, if values were serialized with a memo: referenced objects are deserialized once and shared
+    """
+    if type(value) == list:
+        result = []
+        if memo is not None:
+            memo.append(result)
+        result.extend(deserialize(ele, out[i] if out is not None else None, memo) for i, ele in enumerate(value))
+        return result
+    if type(value) == tuple and len(value) == 2 and value[0] == 'r' and memo is not None:
+        return memo[value[1]]
+    if type(value) == tuple and len(value) == 2 and value[0] in ('c', 'p'):
+        if out is None:
+            out = Ciphertext() if value[0] == 'c' else Plaintext()
+        if memo is not None:
+            memo.append(out)
+        return from_bytes(value[1], out)
+    return value
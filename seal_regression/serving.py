@@ -0,0 +1,77 @@
+from seal_regression.encarray import EncArray
+from seal_regression.fractions_utils import FractionalEncoderUtils
+from seal_regression import kernels
+from seal_regression._seal import Plaintext
+from typing import Iterable, List
+from time import perf_counter
+import numpy as np
+
+
+class BatchPredictor:
+    def __init__(self, weights, enc_utils: FractionalEncoderUtils):
+        """
+        Scores batches of encrypted rows with a fixed linear model. Plain weights are encoded once, so every product is
+        a multiply_plain and every prediction is one dot kernel (see kernels.dot), split across workers of the
+        executor of enc_utils.
+        :param weights: plain weights (list or NumPy array), or EncArray of encrypted or encoded weights
+        :param enc_utils: encoder utils of the rows to score
+
+        Example:
+        >> predictor = BatchPredictor(model.weigths.decrypt_array(decode_utils), encode_utils)
+        >> for X_batch in X_stored.batches(256):
+        >>     y_pred = predictor.predict(X_batch)
+        >> predictor.stats()
+        {'n_batches': 40, 'n_rows': 10000, 'mean_latency': 0.8, 'p50_latency': 0.79, 'p95_latency': 0.9,
+         'rows_per_second': 312.5}
+        """
+        self.enc_utils = enc_utils
+        if isinstance(weights, EncArray):
+            self.weights = weights.enc_arr
+        else:
+            self.weights = [enc_utils.encode(w) for w in np.asarray(weights, dtype=float).ravel()]
+        self._latencies = []
+        self._n_rows = 0
+
+    def predict(self, rows) -> EncArray:
+        """
+        :param rows: EncArray (or nested list) of encrypted rows, of shape (n_rows, n_features)
+        :return: encrypted predictions of shape (n_rows,)
+        """
+        rows = rows.enc_arr if isinstance(rows, EncArray) else rows
+        if any(len(row) != len(self.weights) for row in rows):
+            raise ValueError(f'Rows must have {len(self.weights)} features')
+        start = perf_counter()
+        predictions = kernels.matvec(self.enc_utils, rows, self.weights)
+        self._latencies.append(perf_counter() - start)
+        self._n_rows += len(rows)
+        return EncArray._wrap(predictions, self.enc_utils)
+
+    def predict_many(self, batches: Iterable) -> List[EncArray]:
+        """
+        Scores every batch, e.g. StoredEncArray.batches(batch_size)
+        """
+        return [self.predict(batch) for batch in batches]
+
+    @property
+    def encoded(self) -> bool:
+        """
+        True, if weights are plaintexts, i.e. products do not need relinearization
+        """
+        return all(type(w) == Plaintext for w in self.weights)
+
+    def stats(self) -> dict:
+        """
+        Latency (seconds per batch) and throughput of predict calls so far
+        """
+        if not self._latencies:
+            return {'n_batches': 0, 'n_rows': 0}
+        total = sum(self._latencies)
+        return {'n_batches': len(self._latencies), 'n_rows': self._n_rows,
+                'mean_latency': total / len(self._latencies),
+                'p50_latency': float(np.percentile(self._latencies, 50)),
+                'p95_latency': float(np.percentile(self._latencies, 95)),
+                'rows_per_second': self._n_rows / total if total > 0 else float('inf')}
+
+    def reset_stats(self):
+        self._latencies = []
+        self._n_rows = 0
@@ -0,0 +1,149 @@
+from seal_regression.encarray import EncArray
+from seal_regression.executor import attach_encoder_utils, chunk_slices, export_encoder_utils
+from seal_regression.gradient import ResidualGradientEngine
+from seal_regression.serialization import serialize, deserialize
+from collections import Counter
+from multiprocessing.connection import Client, Listener
+from typing import List
+import argparse
+import multiprocessing
+
+
+def _worker_loop(conn):
+    """
+    Shard worker: holds a row block of X and y, answers with partial gradients X_s^T (X_s w - y_s)
+    Messages: ('setup', utils, rows, targets) -> ('ready',)
+              ('gradient', weights) -> ('partial', gradient, op_counts)
+              ('stop',)
+    """
+    engine = None
+    while True:
+        message = conn.recv()
+        if message[0] == 'setup':
+            _, utils, rows, targets = message
+            enc_utils = attach_encoder_utils(*utils)
+            engine = ResidualGradientEngine(EncArray._wrap(deserialize(rows), enc_utils),
+                                            EncArray._wrap(deserialize(targets), enc_utils))
+            conn.send(('ready',))
+        elif message[0] == 'gradient':
+            weights = EncArray._wrap(deserialize(message[1]), engine.enc_utils)
+            partial = engine.gradient(weights)
+            conn.send(('partial', serialize(partial.enc_arr), engine.last_op_counts))
+        elif message[0] == 'stop':
+            conn.close()
+            return
+
+
+def serve_shard(address: tuple, authkey: bytes):
+    """
+    Runs a shard worker on this host, waiting for a coordinator to connect
+    :param address: (host, port) to listen on
+    :param authkey: shared secret, the same as the coordinator's
+    """
+    with Listener(address, authkey=authkey) as listener:
+        with listener.accept() as conn:
+            _worker_loop(conn)
+
+
+class ShardedGradientEngine:
+    def __init__(self, X: EncArray, y: EncArray, n_shards: int = 2, addresses: List[tuple] = None,
+                 authkey: bytes = None):
+        """
+        Data-parallel least-squares gradient. Row blocks of X and y are sent to shard workers, which compute partial
+        gradients with ResidualGradientEngine; the coordinator sums the partials with add_many. Workers are local
+        processes connected by pipes, or remote hosts running serve_shard, connected by sockets.
+        :param X: encrypted design matrix of shape (n, d)
+        :param y: encrypted target variable of shape (n, 1)
+        :param n_shards: number of local worker processes, ignored if addresses are given. Every shard gets at least
+        one row, so at most n shards are used
+        :param addresses: (host, port) of remote shard workers, at most n of them are used
+        :param authkey: shared secret of remote shard workers, required with addresses: messages are pickled, so only
+        authenticated peers may connect
+
+        Example:
+        >> engine = ShardedGradientEngine(X_enc, y_enc, n_shards=8)
+        >> model.fit(X_enc, y_enc, gradient_engine=engine)
+        >> engine.close()
+        """
+        self.enc_utils = X.enc_utils
+        self.n_samples, self.n_features = X.shape[0], X.shape[1]
+        self.last_op_counts = None
+        self.processes = []
+        if addresses is not None:
+            if authkey is None:
+                raise ValueError('Remote shard workers need an authkey')
+            self.connections = [Client(tuple(address), authkey=authkey) for address in addresses[:self.n_samples]]
+        else:
+            self.connections = []
+            for _ in range(max(1, min(n_shards, self.n_samples))):
+                conn, worker_conn = multiprocessing.Pipe()
+                process = multiprocessing.Process(target=_worker_loop, args=(worker_conn,), daemon=True)
+                process.start()
+                # Only the worker holds its end, so recv raises EOFError instead of hanging if the worker dies
+                worker_conn.close()
+                self.processes.append(process)
+                self.connections.append(conn)
+
+        utils = export_encoder_utils(self.enc_utils, use_key_store=addresses is None)
+        for conn, rows in zip(self.connections, chunk_slices(self.n_samples, len(self.connections))):
+            conn.send(('setup', utils, serialize(X.enc_arr[rows]), serialize(y.enc_arr[rows])))
+        for conn in self.connections:
+            conn.recv()
+
+    @property
+    def n_shards(self) -> int:
+        return len(self.connections)
+
+    def gradient(self, weights: EncArray) -> EncArray:
+        """
+        Gradient of the least-squares loss (not divided by the sample size), aggregated over all shards
+        :param weights: encrypted weights, 1D array of length d
+        :return: encrypted gradient, 1D array of length d
+        """
+        serialized_weights = serialize(weights.enc_arr)
+        for conn in self.connections:
+            conn.send(('gradient', serialized_weights))
+
+        op_counts = Counter()
+        partials = []
+        for conn in self.connections:
+            _, partial, shard_op_counts = conn.recv()
+            partials.append(deserialize(partial))
+            op_counts.update(shard_op_counts)
+
+        counts_before = self.enc_utils.op_counts.copy()
+        gradient = [self.enc_utils.sum_enc_array([partial[j] for partial in partials])
+                    for j in range(self.n_features)]
+        op_counts.update(self.enc_utils.op_counts - counts_before)
+        self.last_op_counts = dict(op_counts)
+        return EncArray._wrap(gradient, enc_utils=self.enc_utils)
+
+    def close(self):
+        """
+        Stops shard workers
+        """
+        for conn in self.connections:
+            conn.send(('stop',))
+            conn.close()
+        for process in self.processes:
+            process.join()
+        self.connections, self.processes = [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Shard worker for ShardedGradientEngine')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, required=True)
+    parser.add_argument('--authkey', required=True)
+    args = parser.parse_args()
+    serve_shard((args.host, args.port), args.authkey.encode())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,347 @@
+from seal_regression._seal import Ciphertext, Plaintext
+from seal_regression.fractions_utils import RelinearizationPolicy
+from seal_regression.planner import NoiseModel, PRIME_BITS
+from collections import Counter
+from math import log2
+import numpy as np
+
+
+class SimUtils:
+    def __init__(self, poly_modulus="1x^1024 + 1", coef_modulus_n_primes=20, plain_modulus=1 << 32,
+                 integer_coeff_count=64, fraction_coeff_count=32, base=3, relin_policy: RelinearizationPolicy = None,
+                 noise_model: NoiseModel = None):
+        """
+        Simulation backend: parameters of FracContext (so that SimUtils(**context.config()) or
+        SimUtils(**plan.config()) simulate the same run) with vectorized NumPy arithmetic instead of ciphertexts.
+        Values are rounded to the fractional precision of FractionalEncoder after encoding and every product.
+        Noise budget, ciphertext size and plaintext coefficient growth are estimated per element with the planner's
+        NoiseModel; elements, which would not decrypt correctly, decrypt to nan. SEAL is not needed. With the default
+        parameters the estimates follow notebooks/perfromance_results.ipynb (fresh budget and bits per iteration of
+        fit) and let weights decrypt for 7 iterations or more, after which they have to be refreshed (see Refresher).
+        SimUtils plays the role of both encoder and decoder utils.
+        :param relin_policy: relinearization policy of multiplications, default is RelinearizationPolicy('never')
+        :param noise_model: noise budget model, e.g. calibrated by ParameterPlanner.calibrate, default NoiseModel()
+
+        Example:
+        >> sim_utils = SimUtils(**context.config())
+        >> X_sim, y_sim = SimArray(X, sim_utils), SimArray(y, sim_utils)
+        >> model.fit(X_sim, y_sim, sim_utils, n_iter=10, lr=0.1)
+        >> model.weigths.decrypt_array(), model.weigths.noise_budget()
+        """
+        self.poly_modulus = poly_modulus
+        self.poly_degree = int(poly_modulus.split('^')[1].split()[0])
+        self.coef_modulus_n_primes = coef_modulus_n_primes
+        self.plain_bits = log2(plain_modulus)
+        self.integer_coeff_count = integer_coeff_count
+        self.fraction_coeff_count = fraction_coeff_count
+        self.base = base
+        self.relin_policy = RelinearizationPolicy('never') if relin_policy is None else relin_policy
+        self.noise_model = NoiseModel() if noise_model is None else noise_model
+        self.fresh_budget = self.noise_model.fresh_budget(coef_modulus_n_primes * PRIME_BITS, self.plain_bits,
+                                                          self.poly_degree)
+        self.scale = float(base) ** fraction_coeff_count
+        self.max_integer = float(base) ** integer_coeff_count / 2
+        self.executor = None
+        # Number of simulated homomorphic operations, keyed like FractionalEncoderUtils.op_counts
+        self.op_counts = Counter()
+
+    def quantize(self, values: np.ndarray) -> np.ndarray:
+        """
+        Rounds values to the precision of fraction_coeff_count digits
+        """
+        return np.round(values * self.scale) / self.scale
+
+    def n_coeffs(self, values: np.ndarray) -> np.ndarray:
+        """
+        Number of non-zero polynomial coefficients of encoded values
+        """
+        integer_digits = np.ceil(np.log(np.maximum(np.abs(values), 1.0) * 2) / np.log(self.base)) + 1
+        return integer_digits + self.fraction_coeff_count
+
+    def multiply_cost(self) -> float:
+        return self.noise_model.multiply_cost(self.plain_bits, self.poly_degree)
+
+    def multiply_plain_cost(self, plain_values: np.ndarray) -> np.ndarray:
+        return np.log2(self.n_coeffs(plain_values)) + self.noise_model.multiply_plain_offset
+
+    def coeff_growth(self, values: np.ndarray) -> np.ndarray:
+        return 0.5 * np.log2(self.n_coeffs(values)) + self.noise_model.coeff_growth_offset
+
+    @staticmethod
+    def sum_coeff_bits(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """
+        Bit count of plaintext coefficients of a sum: coefficients have random signs, so magnitudes add in squares
+        (two equal operands gain half a bit, a much smaller operand almost nothing)
+        """
+        return 0.5 * np.logaddexp2(2 * a, 2 * b)
+
+    def decrypt(self, array):
+        return array.decrypt_array()
+
+
+class SimArray:
+    def __init__(self, arr, enc_utils: SimUtils = None, dtype=Ciphertext):
+        """
+        Simulated EncArray: values with estimated noise budget, ciphertext size and plaintext coefficient bit count
+        per element. Supports the operations of EncArray, which SecureLinearRegression uses, with NumPy broadcasting.
+        :param arr: array of numbers (any shape) or SimArray to copy
+        :param enc_utils: simulation backend
+        :param dtype: Ciphertext to simulate encryption, Plaintext to simulate encoding
+        """
+        if isinstance(arr, SimArray):
+            self.enc_utils, self.dtype = arr.enc_utils, arr.dtype
+            self.values, self.budget = arr.values.copy(), arr.budget.copy()
+            self.size, self.coeff_bits = arr.size.copy(), arr.coeff_bits.copy()
+            return
+        self.enc_utils, self.dtype = enc_utils, dtype
+        self.values = enc_utils.quantize(np.array(arr, dtype=float))
+        encrypted = dtype == Ciphertext
+        self.budget = np.full(self.values.shape, enc_utils.fresh_budget if encrypted else np.inf)
+        self.size = np.full(self.values.shape, 2 if encrypted else 0)
+        self.coeff_bits = np.zeros(self.values.shape)
+
+    @classmethod
+    def _wrap(cls, values, budget, size, coeff_bits, enc_utils: SimUtils, dtype=Ciphertext):
+        array = cls.__new__(cls)
+        array.enc_utils, array.dtype = enc_utils, dtype
+        array.values, array.budget, array.size, array.coeff_bits = values, budget, size, coeff_bits
+        return array
+
+    @classmethod
+    def concatenate(cls, arrays):
+        """
+        Concatenation of arrays along the first axis
+        """
+        return cls._wrap(*[np.concatenate([getattr(array, field) for array in arrays])
+                           for field in ('values', 'budget', 'size', 'coeff_bits')],
+                         arrays[0].enc_utils, arrays[0].dtype)
+
+    @property
+    def shape(self) -> tuple:
+        return self.values.shape
+
+    @property
+    def ndim(self) -> int:
+        return self.values.ndim
+
+    def _count(self, op: str, n):
+        self.enc_utils.op_counts[op] += int(n)
+
+    def _relinearize(self, size: np.ndarray, mask: np.ndarray, n_per_element=1) -> np.ndarray:
+        self._count('relinearize', mask.sum() * n_per_element)
+        return np.where(mask, 2, size)
+
+    def _relinearize_product(self, size: np.ndarray, n_per_element=1) -> np.ndarray:
+        policy = self.enc_utils.relin_policy
+        if policy.mode == 'always':
+            return self._relinearize(size, np.ones(size.shape, dtype=bool), n_per_element)
+        if policy.mode == 'size':
+            return self._relinearize(size, size > policy.max_size, n_per_element)
+        return size
+
+    def _lazy_relinearize(self, *operands):
+        # Operands are relinearized in place, as FractionalEncoderUtils.multiply does in the 'lazy' policy
+        if self.enc_utils.relin_policy.mode == 'lazy':
+            for operand in operands:
+                if operand.dtype == Ciphertext:
+                    operand.size = operand._relinearize(operand.size, operand.size > 2)
+
+    def _binary(self, o, op: str):
+        utils = self.enc_utils
+        a_plain, b_plain = self.dtype == Plaintext, o.dtype == Plaintext
+        if a_plain and b_plain:
+            values = self.values * o.values if op == 'multiply' else \
+                self.values + o.values if op == 'add' else self.values - o.values
+            return SimArray._wrap(utils.quantize(values), np.minimum(self.budget, o.budget),
+                                  np.maximum(self.size, o.size), np.maximum(self.coeff_bits, o.coeff_bits), utils,
+                                  Plaintext)
+
+        n = np.broadcast(self.values, o.values).size
+        if op in ('add', 'subtract'):
+            values = self.values + o.values if op == 'add' else self.values - o.values
+            if a_plain or b_plain:
+                budget = np.minimum(self.budget, o.budget)
+                self._count('add_plain' if op == 'add' else 'sub_plain', n)
+            else:
+                budget = np.minimum(self.budget, o.budget) - self.enc_utils.noise_model.add_cost(2)
+                self._count('add' if op == 'add' else 'sub', n)
+            return SimArray._wrap(values, budget, np.maximum(self.size, o.size),
+                                  utils.sum_coeff_bits(self.coeff_bits, o.coeff_bits), utils)
+
+        values = utils.quantize(self.values * o.values)
+        coeff_bits = self.coeff_bits + o.coeff_bits + utils.coeff_growth(np.maximum(np.abs(self.values),
+                                                                                    np.abs(o.values)))
+        if a_plain or b_plain:
+            plain, cipher = (self, o) if a_plain else (o, self)
+            budget = cipher.budget - utils.multiply_plain_cost(plain.values)
+            size = np.broadcast_to(cipher.size, values.shape).copy()
+            self._count('multiply_plain', n)
+        else:
+            self._lazy_relinearize(self, o)
+            budget = np.minimum(self.budget, o.budget) - utils.multiply_cost()
+            size = self._relinearize_product(self.size + o.size - 1)
+            self._count('multiply', n)
+        return SimArray._wrap(values, budget, size, coeff_bits, utils)
+
+    def _assign(self, other):
+        self.values[...], self.budget[...] = other.values, other.budget
+        self.size[...], self.coeff_bits[...] = other.size, other.coeff_bits
+        self.dtype = other.dtype
+        return self
+
+    def multiply(self, o, out=None):
+        result = self._binary(o, 'multiply')
+        return result if out is None else out._assign(result)
+
+    def add(self, o, out=None):
+        result = self._binary(o, 'add')
+        return result if out is None else out._assign(result)
+
+    def subtract(self, o, out=None):
+        result = self._binary(o, 'subtract')
+        return result if out is None else out._assign(result)
+
+    def __mul__(self, o):
+        return self.multiply(o)
+
+    def __add__(self, o):
+        return self.add(o)
+
+    def __sub__(self, o):
+        return self.subtract(o)
+
+    def __imul__(self, o):
+        return self.multiply(o, out=self)
+
+    def __iadd__(self, o):
+        return self.add(o, out=self)
+
+    def __isub__(self, o):
+        return self.subtract(o, out=self)
+
+    def __matmul__(self, other):
+        """
+        Matrix (or matrix-vector) product, as dot products of rows and columns
+        """
+        utils = self.enc_utils
+        values = np.asarray(utils.quantize(self.values @ other.values))
+        k = self.shape[-1]
+        # Every output element is a sum of k products, so it inherits the worst element of its row and column
+        budget = np.minimum(self.budget.reshape(-1, k).min(axis=1)[:, None],
+                            other.budget.reshape(k, -1).min(axis=0)[None, :])
+        coeff_bits = self.coeff_bits.reshape(-1, k).max(axis=1)[:, None] + \
+            other.coeff_bits.reshape(k, -1).max(axis=0)[None, :] + 0.5 * log2(k) + \
+            utils.coeff_growth(max(np.abs(self.values).max(), np.abs(other.values).max()))
+        n_products = values.size * k
+        if self.dtype == Plaintext or other.dtype == Plaintext:
+            plain, cipher = (self, other) if self.dtype == Plaintext else (other, self)
+            budget = budget - utils.multiply_plain_cost(np.abs(plain.values).max())
+            size = np.full(budget.shape, cipher.size.max())
+            self._count('multiply_plain', n_products)
+        else:
+            self._lazy_relinearize(self, other)
+            budget = budget - utils.multiply_cost()
+            # Products are summed first and every output is relinearized once (see kernels.dot)
+            size = self._relinearize_product(np.full(budget.shape, self.size.max() + other.size.max() - 1))
+            self._count('multiply', n_products)
+        budget = budget - utils.noise_model.add_cost(k)
+        self._count('add', values.size * (k - 1))
+        shape = values.shape
+        return SimArray._wrap(values, budget.reshape(shape), size.reshape(shape), coeff_bits.reshape(shape), utils)
+
+    def sum(self, axis: int = None):
+        """
+        Sum of all elements, or along an axis
+        """
+        n = self.values.size if axis is None else self.values.shape[axis]
+        self._count('add', self.values.size - self.values.size // max(n, 1))
+        return SimArray._wrap(np.asarray(self.values.sum(axis=axis)),
+                              np.asarray(self.budget.min(axis=axis) - log2(max(n, 1))),
+                              np.asarray(self.size.max(axis=axis)),
+                              np.asarray(self.coeff_bits.max(axis=axis) + 0.5 * log2(max(n, 1))),
+                              self.enc_utils, self.dtype)
+
+    @property
+    def T(self):
+        return SimArray._wrap(self.values.T, self.budget.T, self.size.T, self.coeff_bits.T, self.enc_utils, self.dtype)
+
+    def __getitem__(self, item):
+        return SimArray._wrap(self.values[item], self.budget[item], self.size[item], self.coeff_bits[item],
+                              self.enc_utils, self.dtype)
+
+    def __len__(self):
+        return len(self.values)
+
+    def copy(self):
+        return SimArray(self)
+
+    def valid(self) -> np.ndarray:
+        """
+        Mask of elements, which would decrypt correctly: noise budget is left, and neither plaintext coefficients nor
+        the integer part overflow
+        """
+        if self.dtype == Plaintext:
+            return np.ones(self.shape, dtype=bool)
+        return (self.budget > 0) & (self.coeff_bits < self.enc_utils.plain_bits - 1) & \
+            (np.abs(self.values) < self.enc_utils.max_integer)
+
+    def decrypt_array(self, decode_utils=None) -> np.ndarray:
+        """
+        :param decode_utils: ignored, for compatibility with EncArray
+        :return: values, nan where decryption would fail
+        """
+        return np.where(self.valid(), self.values, np.nan)
+
+    def noise_budget(self, decode_utils=None) -> np.ndarray:
+        """
+        :param decode_utils: ignored, for compatibility with EncArray
+        :return: estimated noise budget of every element in bits
+        """
+        return np.floor(np.maximum(self.budget, 0))
+
+    def mem_size(self) -> int:
+        return int(self.size.sum())
+
+    def __repr__(self):
+        return f'SimArray({self.decrypt_array()}, noise budget {self.noise_budget()})'
+
+
+class SimGradientEngine:
+    def __init__(self, X: SimArray, y: SimArray, mode='residual'):
+        """
+        Least-squares gradient over simulated arrays, counterpart of ResidualGradientEngine ('residual') and
+        GramGradientEngine ('gram')
+        """
+        self.enc_utils = X.enc_utils
+        self.n_samples, self.n_features = X.shape[0], X.shape[1]
+        self.mode = mode
+        self.X = X
+        self.targets = y[:, 0] if y.ndim == 2 else y
+        if mode == 'gram':
+            self.gram = X.T @ X
+            self.moments = X.T @ self.targets
+        self.last_op_counts = None
+
+    def append(self, X: SimArray, y: SimArray):
+        """
+        Adds new rows, counterpart of GramGradientEngine.append ('gram': products of the new rows are added to the
+        Gram matrix and moments) and of a ResidualGradientEngine over all rows ('residual')
+        """
+        if X.shape[1] != self.n_features:
+            raise ValueError(f'Expected {self.n_features} features, got {X.shape[1]}')
+        targets = y[:, 0] if y.ndim == 2 else y
+        if self.mode == 'gram':
+            self.gram = self.gram + X.T @ X
+            self.moments = self.moments + X.T @ targets
+        self.X = SimArray.concatenate([self.X, X])
+        self.targets = SimArray.concatenate([self.targets, targets])
+        self.n_samples += X.shape[0]
+
+    def gradient(self, weights: SimArray) -> SimArray:
+        counts_before = self.enc_utils.op_counts.copy()
+        if self.mode == 'gram':
+            gradient = self.gram @ weights - self.moments
+        else:
+            gradient = self.X.T @ (self.X @ weights - self.targets)
+        self.last_op_counts = dict(self.enc_utils.op_counts - counts_before)
+        return gradient
@@ -0,0 +1,178 @@
+from seal_regression.encarray import EncArray
+from seal_regression.fractions_utils import FractionalEncoderUtils
+from seal_regression.serialization import to_bytes_many, from_bytes_many
+from seal_regression._seal import Ciphertext, Plaintext
+from typing import Iterator, List
+import json
+import mmap
+import numpy as np
+import operator
+import os
+import struct
+
+# File layout:
+#   MAGIC | header length (uint32) | JSON header | offsets (n + 1 uint64) | serialized elements
+# Elements are stored in row-major order, offsets are relative to the start of serialized elements
+MAGIC = b'SEALARR1'
+_DTYPES = {Ciphertext: 'ciphertext', Plaintext: 'plaintext'}
+
+
+def _encoder_config(enc_utils: FractionalEncoderUtils) -> dict:
+    # Values are decoded with the FractionalEncoder configuration, which is not part of the encryption parameters
+    context = enc_utils.frac_context
+    return {'integer_coeff_count': context.integer_coeff_count, 'fraction_coeff_count': context.fraction_coeff_count,
+            'base': context.base}
+
+
+def _flat_indices(shape: tuple, item) -> np.ndarray:
+    """
+    Row-major positions of the elements selected by a numpy-style index of integers, slices and Ellipsis, computed
+    from per-axis ranges, without an index array of the whole shape
+    :return: positions, in the shape of the selection
+    """
+    item = item if type(item) == tuple else (item,)
+    ellipses = [i for i, index in enumerate(item) if index is Ellipsis]
+    if len(ellipses) > 1:
+        raise IndexError('an index can only have a single ellipsis')
+    if ellipses:
+        i = ellipses[0]
+        item = item[:i] + (slice(None),) * (len(shape) - len(item) + 1) + item[i + 1:]
+    if len(item) > len(shape):
+        raise IndexError(f'too many indices for array of shape {shape}')
+    item = item + (slice(None),) * (len(shape) - len(item))
+
+    axes, selection_shape = [], []
+    for index, size in zip(item, shape):
+        if type(index) == slice:
+            axes.append(np.arange(*index.indices(size)))
+            selection_shape.append(len(axes[-1]))
+        else:
+            index = operator.index(index)
+            if not -size <= index < size:
+                raise IndexError(f'index {index} is out of bounds for axis with size {size}')
+            axes.append(np.array([index % size]))
+    return np.ravel_multi_index(np.ix_(*axes), shape).reshape(selection_shape)
+
+
+def save(array: EncArray, path: str, chunk_size=256):
+    """
+    Saves encrypted (or encoded) array. The file is written next to path and renamed at the end, so a checkpoint is
+    never left half-written.
+    :param array: array to save
+    :param path: file path
+    :param chunk_size: number of elements serialized at once
+    """
+    flat = EncArray._flatten(array.enc_arr)
+    header = json.dumps({'shape': list(array.shape), 'dtype': _DTYPES[array.dtype],
+                         'params_hash': array.enc_utils.frac_context.params_hash,
+                         'encoder': _encoder_config(array.enc_utils)}).encode()
+    offsets = np.zeros(len(flat) + 1, dtype='<u8')
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<I', len(header)) + header)
+        index_position = f.tell()
+        f.write(offsets.tobytes())  # placeholder, offsets are known after elements are written
+        for start in range(0, len(flat), chunk_size):
+            for i, blob in enumerate(to_bytes_many(flat[start:start + chunk_size])):
+                f.write(blob)
+                offsets[start + i + 1] = offsets[start + i] + len(blob)
+        f.seek(index_position)
+        f.write(offsets.tobytes())
+    os.replace(tmp_path, path)
+
+
+class StoredEncArray:
+    def __init__(self, path: str, enc_utils: FractionalEncoderUtils):
+        """
+        Memory-mapped array, saved by EncArray.save. Elements are deserialized only when accessed, straight from
+        the memory map, so single rows and columns can be read without loading the whole array.
+        :param path: file path
+        :param enc_utils: encoder utils with the same encryption parameters as the saved array
+
+        Example:
+        >> X_enc.save('X.enc')
+        >> X_stored = EncArray.load('X.enc', encode_utils, lazy=True)
+        >> X_stored[10]  # 10th row as EncArray
+        >> X_stored[:, 0]  # first column
+        >> for batch in X_stored.batches(64): ...
+        """
+        self.path = path
+        self.enc_utils = enc_utils
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f'{path} is not a saved EncArray')
+        header_length, = struct.unpack_from('<I', self._mmap, len(MAGIC))
+        header_start = len(MAGIC) + 4
+        header = json.loads(self._mmap[header_start:header_start + header_length].decode())
+        if header['params_hash'] != enc_utils.frac_context.params_hash:
+            self.close()
+            raise ValueError(f'{path} was saved with other encryption parameters')
+        if header.get('encoder') != _encoder_config(enc_utils):
+            self.close()
+            raise ValueError(f'{path} was saved with other encoder parameters: {header.get("encoder")}')
+
+        self.shape = tuple(header['shape'])
+        self.ndim = len(self.shape)
+        self.dtype = Ciphertext if header['dtype'] == 'ciphertext' else Plaintext
+        size = int(np.prod(self.shape))
+        index_start = header_start + header_length
+        self._offsets = np.frombuffer(self._mmap, dtype='<u8', count=size + 1, offset=index_start)
+        self._data_start = index_start + 8 * (size + 1)
+
+    def _read(self, flat_indices: List[int]) -> List:
+        view, blobs = memoryview(self._mmap), []
+        try:
+            blobs.extend(view[self._data_start + int(self._offsets[i]):self._data_start + int(self._offsets[i + 1])]
+                         for i in flat_indices)
+            return from_bytes_many(blobs, [self.dtype() for _ in blobs])
+        finally:
+            # Exported buffers would prevent closing the memory map
+            for blob in blobs:
+                blob.release()
+            view.release()
+
+    def __getitem__(self, item) -> EncArray:
+        """
+        Reads elements by numpy-style index (integers and slices), e.g. X[i], X[1:3], X[:, j]
+        :return: EncArray with loaded elements
+        """
+        indices = _flat_indices(self.shape, item)
+        elements = self._read(indices.ravel().tolist())
+        return EncArray._wrap(EncArray._unflatten(elements, indices.shape), self.enc_utils, self.dtype)
+
+    def row(self, i: int) -> EncArray:
+        return self[i]
+
+    def column(self, j: int) -> EncArray:
+        return self[:, j]
+
+    def batches(self, batch_size: int) -> Iterator[EncArray]:
+        """
+        Iterates over blocks of batch_size rows, e.g. for SecureLinearRegression.fit_stream
+        """
+        for start in range(0, self.shape[0], batch_size):
+            yield self[start:start + batch_size]
+
+    def load(self) -> EncArray:
+        """
+        Reads the whole array
+        """
+        return self[...]
+
+    def __len__(self):
+        return self.shape[0]
+
+    def close(self):
+        # Offsets are a view of the memory map and have to be released first
+        self._offsets = None
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,92 @@
+from seal_regression.encarray import EncArray
+from typing import Iterable, Iterator, List, Tuple
+from queue import Queue
+from threading import Event, Semaphore, Thread
+
+# Marks the end of a prefetched stream
+_END = object()
+
+
+def rebatch(batches: Iterable[Tuple[EncArray, EncArray]], batch_size: int) -> Iterator[Tuple[EncArray, EncArray]]:
+    """
+    Splits or merges a stream of (X, y) batches into batches of batch_size rows (the last one may be smaller).
+    Ciphertexts are not copied, rows are held only until their batch is complete.
+    :param batches: iterable of (X, y) pairs of EncArrays (or SimArrays) with any number of rows
+    :param batch_size: number of rows of output batches
+    """
+    if batch_size < 1:
+        raise ValueError('batch_size has to be positive')
+    pending, n_pending = [], 0
+    for X, y in batches:
+        pending.append((X, y))
+        n_pending += len(X)
+        while n_pending >= batch_size:
+            batch, n_rows = [], 0
+            while n_rows < batch_size:
+                X, y = pending.pop(0)
+                n_taken = min(len(X), batch_size - n_rows)
+                batch.append((X[:n_taken], y[:n_taken]))
+                if n_taken < len(X):
+                    pending.insert(0, (X[n_taken:], y[n_taken:]))
+                n_rows += n_taken
+            n_pending -= batch_size
+            yield _concatenate(batch)
+    if pending:
+        yield _concatenate(pending)
+
+
+def _concatenate(pieces: List[Tuple]) -> Tuple:
+    if len(pieces) == 1:
+        return pieces[0]
+    X, y = pieces[0]
+    return type(X).concatenate([X for X, _ in pieces]), type(y).concatenate([y for _, y in pieces])
+
+
+def prefetched(iterable: Iterable, depth=1) -> Iterator:
+    """
+    Iterates over iterable, while a background thread loads next items, so that I/O (e.g. reading ciphertexts from
+    disk) overlaps with computation. Besides the item being processed, at most depth items are loaded at any time.
+    Exceptions of the loader are re-raised in the consumer.
+    :param iterable: source of items
+    :param depth: maximal number of items loaded ahead, 0 disables the thread
+    """
+    if depth <= 0:
+        yield from iterable
+        return
+
+    queue = Queue()
+    slots = Semaphore(depth)
+    stopped = Event()
+
+    def load():
+        try:
+            iterator = iter(iterable)
+            while True:
+                # Waits for a free slot, gives up once the consumer has stopped iterating
+                while not slots.acquire(timeout=0.1):
+                    if stopped.is_set():
+                        return
+                if stopped.is_set():
+                    return
+                item = next(iterator, _END)
+                queue.put((item, None))
+                if item is _END:
+                    return
+        except BaseException as e:
+            queue.put((_END, e))
+
+    thread = Thread(target=load, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = queue.get()
+            if error is not None:
+                raise error
+            if item is _END:
+                return
+            yield item
+            # Processed item is dropped before the next one may be loaded
+            del item
+            slots.release()
+    finally:
+        stopped.set()
@@ -12,6 +12,6 @@ setup(
     author_email='v.melnychuk@campus.lmu.de, d.davletshina@campus.lmu.de',
     description='Implementation of Linear Regression on encrypted data with PySEAL',
     install_requires=reqs,
-    packages=['seal_regression'],
+    packages=['seal_regression', 'seal_regression.benchmarks'],
     scripts=['install_pyseal.sh'],
 )
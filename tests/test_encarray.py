@@ -0,0 +1,131 @@
+import pytest
+
+pytest.importorskip('seal')
+
+from seal_regression.fractions_utils import FracContext, FractionalDecryptorUtils, FractionalEncoderUtils, \
+    RelinearizationPolicy
+from seal_regression.encarray import EncArray
+from seal_regression.linear_regression import SecureLinearRegression
+from seal_regression.pool import CiphertextPool, MemoryProfiler
+from seal_regression._seal import Plaintext
+
+import numpy as np
+
+
+@pytest.fixture(scope='module')
+def context():
+    return FracContext(verbose=False)
+
+
+@pytest.fixture(scope='module')
+def encode_utils(context):
+    return FractionalEncoderUtils(context)
+
+
+@pytest.fixture(scope='module')
+def decode_utils(context):
+    return FractionalDecryptorUtils(context)
+
+
+@pytest.fixture
+def values():
+    return np.arange(6, dtype=float).reshape(3, 2) / 4
+
+
+def test_from_numpy(encode_utils, decode_utils, values):
+    X_enc = EncArray.from_numpy(values, encode_utils)
+    assert X_enc.shape == (3, 2)
+    assert X_enc.encryption_stats['n_elements'] == 6
+    np.testing.assert_allclose(X_enc.decrypt_array(decode_utils), values, atol=1e-6)
+
+
+def test_transpose_is_view(encode_utils, decode_utils, values):
+    X_enc = EncArray.from_numpy(values, encode_utils)
+    assert X_enc.T.shape == (2, 3)
+    assert X_enc.T.enc_arr[1][2] is X_enc.enc_arr[2][1]
+    np.testing.assert_allclose(X_enc.T.decrypt_array(decode_utils), values.T, atol=1e-6)
+
+
+def test_slices_are_views(encode_utils, decode_utils, values):
+    X_enc = EncArray.from_numpy(values, encode_utils)
+    column = X_enc[1:, 1]
+    assert column.shape == (2,)
+    assert column.enc_arr[0] is X_enc.enc_arr[1][1]
+    np.testing.assert_allclose(column.decrypt_array(decode_utils), values[1:, 1], atol=1e-6)
+    np.testing.assert_allclose(X_enc[2].decrypt_array(decode_utils), values[2], atol=1e-6)
+
+
+def test_out(encode_utils, decode_utils, values):
+    a, b = EncArray.from_numpy(values, encode_utils), EncArray.from_numpy(2 * values, encode_utils)
+    out = EncArray.from_numpy(np.zeros_like(values), encode_utils)
+    ciphertexts = out._flat()
+    assert a.add(b, out=out) is out
+    assert all(new is old for new, old in zip(out._flat(), ciphertexts))
+    np.testing.assert_allclose(out.decrypt_array(decode_utils), 3 * values, atol=1e-6)
+    a.multiply(b, out=a)
+    np.testing.assert_allclose(a.decrypt_array(decode_utils), 2 * values ** 2, atol=1e-6)
+
+
+def test_concatenate(encode_utils, decode_utils, values):
+    a, b = EncArray.from_numpy(values, encode_utils), EncArray.from_numpy(values[:1], encode_utils)
+    joined = EncArray.concatenate([a, b])
+    assert joined.shape == (4, 2)
+    assert joined.enc_arr[3][0] is b.enc_arr[0][0]
+    np.testing.assert_allclose(joined.decrypt_array(decode_utils), np.vstack([values, values[:1]]), atol=1e-6)
+
+
+def test_invalid_arguments(encode_utils, values):
+    with pytest.raises(ValueError):
+        EncArray([1.0], encode_utils, dtype=float)
+    plain = EncArray.from_numpy(values, encode_utils, dtype=Plaintext)
+    with pytest.raises(ValueError):
+        plain @ plain.T
+    with pytest.raises(ValueError):
+        EncArray.from_numpy(values, encode_utils) @ EncArray.from_numpy(values, encode_utils)
+
+
+def test_fit_with_pool(context, decode_utils):
+    rng = np.random.RandomState(0)
+    X = np.hstack([rng.uniform(-1, 1, (6, 1)), np.ones((6, 1))])
+    y = (X @ np.array([0.5, 0.2])).reshape(-1, 1)
+    pool = CiphertextPool()
+    weights = []
+    for encode_utils in (FractionalEncoderUtils(context), FractionalEncoderUtils(context, pool=pool)):
+        model = SecureLinearRegression()
+        profiler = MemoryProfiler()
+        with profiler.profile(encode_utils):
+            model.fit(EncArray.from_numpy(X, encode_utils), EncArray.from_numpy(y, encode_utils), n_iter=2)
+        weights.append(model.weigths.decrypt_array(decode_utils))
+        assert profiler.peaks()['iteration 1'] > 0
+    np.testing.assert_allclose(weights[0], weights[1], atol=1e-6)
+    assert pool.stats()['reused'] > 0
+
+
+def test_lazy_evaluation(encode_utils, decode_utils, values):
+    from concurrent.futures import ThreadPoolExecutor
+    a, b = EncArray.from_numpy(values, encode_utils), EncArray.from_numpy(2 * values, encode_utils)
+    a_lazy, b_lazy = a.lazy(), b.lazy()
+    assert a_lazy[1:, [0, 1]].shape == values[1:, [0, 1]].shape
+    np.testing.assert_allclose((a_lazy - b_lazy).decrypt_array(decode_utils), -values, atol=1e-6)
+    with pytest.raises(ValueError):
+        (a_lazy - EncArray.from_numpy(values, encode_utils, dtype=Plaintext)).evaluate()
+
+    # Threads evaluate expressions of the same shared graph at once
+    expressions = [(a_lazy * b_lazy + a_lazy)[i].sum() for i in range(len(values))]
+    with ThreadPoolExecutor(3) as pool:
+        results = list(pool.map(lambda expression: expression.decrypt_array(decode_utils), expressions))
+    np.testing.assert_allclose(results, (2 * values ** 2 + values).sum(axis=1), atol=1e-6)
+
+
+def test_lazy_multiply_releases_copies(context, decode_utils):
+    pool = CiphertextPool()
+    encode_utils = FractionalEncoderUtils(context, relin_policy=RelinearizationPolicy('lazy'), pool=pool)
+    a, b = encode_utils.encrypt_num(0.5), encode_utils.encrypt_num(2.0)
+    a3, b3 = encode_utils.multiply(a, b), encode_utils.multiply(b, b)
+    assert a3.size() == 3 and b3.size() == 3
+    in_use = pool.stats()['in_use']
+    product = encode_utils.multiply(a3, b3)
+    # One private copy holds the product, the other one is back in the pool
+    assert pool.stats()['in_use'] == in_use + 1
+    assert a3.size() == 3 and b3.size() == 3
+    assert decode_utils.decrypt(product) == pytest.approx(4.0, abs=1e-4)
@@ -0,0 +1,41 @@
+from seal_regression.executor import chunk_slices
+from seal_regression.serialization import deserialize, serialize
+
+import pytest
+
+
+@pytest.mark.parametrize('n_tasks, n_chunks, lengths', [
+    (10, 3, [3, 3, 4]),
+    (4, 4, [1, 1, 1, 1]),
+    (2, 5, [1, 1]),
+    (0, 3, [0]),
+])
+def test_chunk_slices(n_tasks, n_chunks, lengths):
+    slices = chunk_slices(n_tasks, n_chunks)
+    assert [len(range(n_tasks)[chunk]) for chunk in slices] == lengths
+    assert [i for chunk in slices for i in range(n_tasks)[chunk]] == list(range(n_tasks))
+
+
+def test_serialize_memo_round_trip():
+    row = [0.5, 2]
+    value = [row, row, [row, 3.0]]
+    assert deserialize(serialize(value)) == value
+
+    serialized = serialize(value, memo={})
+    # Repeated lists are serialized once, later occurrences are references
+    assert serialized[1] == ('r', 1) and serialized[2][0] == ('r', 1)
+    result = deserialize(serialized, memo=[])
+    assert result == value
+    assert result[0] is result[1] is result[2][0]
+
+
+def test_serialize_memo_shares_ciphertexts():
+    pytest.importorskip('seal')
+    from seal_regression.fractions_utils import FracContext, FractionalDecryptorUtils, FractionalEncoderUtils
+
+    context = FracContext(verbose=False)
+    encode_utils, decode_utils = FractionalEncoderUtils(context), FractionalDecryptorUtils(context)
+    weight = encode_utils.encrypt_num(0.5)
+    result = deserialize(serialize([[weight, 1.0], [weight, 2.0]], memo={}), memo=[])
+    assert result[0][0] is result[1][0]
+    assert decode_utils.decrypt(result[1][0]) == pytest.approx(0.5, abs=1e-6)
@@ -0,0 +1,75 @@
+from seal_regression.simulation import SimArray, SimGradientEngine, SimUtils
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def dataset():
+    rng = np.random.RandomState(0)
+    X = np.hstack([rng.uniform(-1, 1, (5, 2)), np.ones((5, 1))])
+    y = (X @ np.array([0.5, -0.3, 0.2])).reshape(-1, 1)
+    return X, y
+
+
+def residual_op_counts(n, d):
+    # Residual: n dot products of length d and n subtractions, gradient: d dot products of length n
+    return {'multiply': 2 * n * d, 'add': n * (d - 1) + d * (n - 1), 'sub': n}
+
+
+def test_residual_op_counts(dataset):
+    X, y = dataset
+    sim_utils = SimUtils()
+    engine = SimGradientEngine(SimArray(X, sim_utils), SimArray(y, sim_utils))
+    engine.gradient(SimArray(np.zeros(X.shape[1]), sim_utils))
+    assert engine.last_op_counts == residual_op_counts(*X.shape)
+
+
+def test_residual_engine_op_counts(dataset):
+    pytest.importorskip('seal')
+    from seal_regression.encarray import EncArray
+    from seal_regression.fractions_utils import FracContext, FractionalDecryptorUtils, FractionalEncoderUtils
+    from seal_regression.gradient import ResidualGradientEngine
+
+    X, y = dataset
+    context = FracContext(verbose=False)
+    encode_utils, decode_utils = FractionalEncoderUtils(context), FractionalDecryptorUtils(context)
+    engine = ResidualGradientEngine(EncArray.from_numpy(X, encode_utils), EncArray.from_numpy(y, encode_utils))
+    weights = np.array([0.25, 0.5, -0.5])
+    gradient = engine.gradient(EncArray.from_numpy(weights, encode_utils))
+    assert engine.last_op_counts == residual_op_counts(*X.shape)
+    np.testing.assert_allclose(gradient.decrypt_array(decode_utils), X.T @ (X @ weights - y[:, 0]), atol=1e-6)
+
+
+@pytest.mark.parametrize('mode', ['gram', 'residual'])
+def test_append_matches_all_rows(dataset, mode):
+    X, y = dataset
+    sim_utils = SimUtils()
+    engine = SimGradientEngine(SimArray(X[:2], sim_utils), SimArray(y[:2], sim_utils), mode)
+    engine.append(SimArray(X[2:], sim_utils), SimArray(y[2:], sim_utils))
+    expected = SimGradientEngine(SimArray(X, sim_utils), SimArray(y, sim_utils), mode)
+    assert engine.n_samples == expected.n_samples == len(X)
+
+    weights = SimArray(np.array([0.25, 0.5, -0.5]), sim_utils)
+    np.testing.assert_allclose(engine.gradient(weights).decrypt_array(), expected.gradient(weights).decrypt_array(),
+                               atol=1e-8)
+    with pytest.raises(ValueError):
+        engine.append(SimArray(X[:, :2], sim_utils), SimArray(y, sim_utils))
+
+
+def test_gram_engine_append(dataset):
+    pytest.importorskip('seal')
+    from seal_regression.encarray import EncArray
+    from seal_regression.fractions_utils import FracContext, FractionalDecryptorUtils, FractionalEncoderUtils
+    from seal_regression.gradient import GramGradientEngine
+
+    X, y = dataset
+    context = FracContext(verbose=False)
+    encode_utils, decode_utils = FractionalEncoderUtils(context), FractionalDecryptorUtils(context)
+    engine = GramGradientEngine(EncArray.from_numpy(X[:2], encode_utils), EncArray.from_numpy(y[:2], encode_utils))
+    engine.append(EncArray.from_numpy(X[2:], encode_utils), EncArray.from_numpy(y[2:], encode_utils))
+    assert engine.n_samples == len(X)
+
+    weights = np.array([0.25, 0.5, -0.5])
+    gradient = engine.gradient(EncArray.from_numpy(weights, encode_utils))
+    np.testing.assert_allclose(gradient.decrypt_array(decode_utils), X.T @ (X @ weights - y[:, 0]), atol=1e-6)
@@ -0,0 +1,54 @@
+from seal_regression.keystore import KeyStore
+
+import pytest
+
+
+class Key:
+    """
+    Object with SEAL-like file serialization
+    """
+    def __init__(self, data=b''):
+        self.data = data
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.data)
+
+    def load(self, path):
+        with open(path, 'rb') as f:
+            self.data = f.read()
+
+
+@pytest.fixture
+def params_hash():
+    return KeyStore.params_hash([17, 19], '1x^1024 + 1', 256)
+
+
+def test_key_pairs_do_not_overwrite_each_other(tmp_path, params_hash):
+    store = KeyStore(str(tmp_path))
+    first, second = Key(b'first public key'), Key(b'second public key')
+    first_id, second_id = KeyStore.key_id(first), KeyStore.key_id(second)
+    assert first_id != second_id
+    store.save(params_hash, first_id, 'public_key', first)
+    store.save(params_hash, second_id, 'public_key', second)
+    assert store.load(params_hash, first_id, 'public_key', Key()).data == b'first public key'
+    assert store.load(params_hash, second_id, 'public_key', Key()).data == b'second public key'
+
+    store.clear(params_hash, second_id)
+    assert not store.has(params_hash, second_id, 'public_key')
+    assert store.has(params_hash, first_id, 'public_key')
+
+
+def test_secret_key_is_opt_in(tmp_path, params_hash):
+    key_id = KeyStore.key_id(Key(b'public key'))
+    store = KeyStore(str(tmp_path))
+    store.save(params_hash, key_id, 'secret_key', Key(b'secret key'))
+    assert not store.has(params_hash, key_id, 'secret_key')
+    assert store.current_key_id(params_hash) is None
+
+    store = KeyStore(str(tmp_path), save_secret_key=True)
+    store.save(params_hash, key_id, 'secret_key', Key(b'secret key'))
+    assert store.current_key_id(params_hash) == key_id
+    assert (tmp_path / params_hash / key_id / 'secret_key').stat().st_mode & 0o777 == 0o600
+    store.clear(params_hash, key_id)
+    assert store.current_key_id(params_hash) is None
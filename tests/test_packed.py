@@ -0,0 +1,44 @@
+from seal_regression.packed import fixed_point_scale_bits, magnitude_bits
+
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize('n_samples', [10, 1000, 5000, 100000])
+def test_learning_rate_keeps_precision(n_samples):
+    coef = 0.2 / n_samples
+    scale_bits = fixed_point_scale_bits(coef, 12)
+    encoded = round(coef * 2 ** scale_bits)
+    assert encoded != 0
+    assert abs(encoded / 2 ** scale_bits - coef) / coef < 2 ** -11
+
+
+def test_magnitude_bits():
+    assert magnitude_bits(0.5) == 0
+    assert magnitude_bits(4.0) == 2
+    assert magnitude_bits(4.0, 1000) == 12
+
+
+def test_fit_with_many_rows():
+    pytest.importorskip('seal')
+    from seal_regression.fractions_utils import FracContext
+    from seal_regression.linear_regression import SecureLinearRegression
+    from seal_regression.packed import BatchDecryptorUtils, BatchEncoderUtils, PackedEncArray, batching_plain_modulus
+    from seal_regression.refresh import KeyHolderRefresher
+
+    context = FracContext(poly_modulus="1x^4096 + 1", coef_modulus_n_primes=4,
+                          plain_modulus=batching_plain_modulus(4096, 60), verbose=False)
+    encode_utils, decode_utils = BatchEncoderUtils(context, scale_bits=6), BatchDecryptorUtils(context)
+    rng = np.random.RandomState(0)
+    X = np.hstack([rng.uniform(-1, 1, (2000, 1)), np.ones((2000, 1))])
+    y = X @ np.array([0.5, 0.2])
+
+    model = SecureLinearRegression()
+    model.fit(PackedEncArray(X, encode_utils), PackedEncArray(y, encode_utils), n_iter=3,
+              refresher=KeyHolderRefresher(decode_utils, encode_utils, max_iterations=None))
+    expected = SecureLinearRegression()
+    expected.fit_unencrypted(X, y.reshape(-1, 1), n_iter=3)
+    np.testing.assert_allclose(model.weigths.decrypt_array(decode_utils), expected.weigths, atol=0.05)
+
+    with pytest.raises(ValueError):
+        PackedEncArray([2.0 ** 60], encode_utils)
@@ -0,0 +1,33 @@
+from seal_regression.fractions_utils import PlaintextCache
+
+
+def test_lru_eviction():
+    cache = PlaintextCache(max_size=2)
+    encoded = []
+
+    def encoder(value):
+        def encode():
+            encoded.append(value)
+            return f'plain {value}'
+        return encode
+
+    assert cache.get('a', encoder('a')) == 'plain a'
+    cache.get('b', encoder('b'))
+    # 'a' becomes the most recently used entry, so 'b' is evicted by 'c'
+    assert cache.get('a', encoder('a')) == 'plain a'
+    cache.get('c', encoder('c'))
+    assert list(cache.entries) == ['a', 'c']
+    cache.get('b', encoder('b'))
+    assert list(cache.entries) == ['c', 'b']
+    assert encoded == ['a', 'b', 'c', 'b']
+    assert cache.stats() == dict(hits=1, misses=4, size=2, hit_rate=0.2)
+
+    cache.clear()
+    assert cache.stats() == dict(hits=0, misses=0, size=0, hit_rate=0.0)
+
+
+def test_disabled_cache():
+    cache = PlaintextCache(max_size=0)
+    assert cache.get('a', lambda: 'plain a') == 'plain a'
+    assert cache.get('a', lambda: 'plain a again') == 'plain a again'
+    assert cache.stats()['size'] == 0 and cache.stats()['misses'] == 2
@@ -0,0 +1,93 @@
+from seal_regression.remote import _answer_challenge, _deliver_challenge, _recv, _send, start_server
+from multiprocessing import AuthenticationError
+
+import asyncio
+import pytest
+
+
+def run_pair(server_side, client_side):
+    """
+    Runs server_side(reader, writer) and client_side(reader, writer) on the two ends of a localhost connection
+    """
+    async def run():
+        results = {}
+        served = asyncio.Event()
+
+        async def handle(reader, writer):
+            try:
+                results['server'] = await server_side(reader, writer)
+            except Exception as e:
+                results['server'] = e
+            finally:
+                writer.close()
+                served.set()
+
+        server = await asyncio.start_server(handle, 'localhost', 0)
+        reader, writer = await asyncio.open_connection('localhost', server.sockets[0].getsockname()[1])
+        try:
+            results['client'] = await client_side(reader, writer)
+        except Exception as e:
+            results['client'] = e
+        await served.wait()
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return results
+
+    return asyncio.run(run())
+
+
+def test_message_framing():
+    message = ('rows', [[('c', b'\x00\x01'), ('p', b'')], [('c', b'\xff' * 100), 0.5]], {'keys': b'key', 'n': 3})
+
+    async def server_side(reader, writer):
+        return await _recv(reader)
+
+    async def client_side(reader, writer):
+        return await _send(writer, message)
+
+    results = run_pair(server_side, client_side)
+    assert results['server'] == ('rows', [[('c', b'\x00\x01'), ('p', b'')], [('c', b'\xff' * 100), 0.5]],
+                                 {'keys': b'key', 'n': 3})
+    assert results['client'] > 103
+
+
+@pytest.mark.parametrize('client_key, authenticated', [(b'secret', True), (b'wrong', False)])
+def test_handshake(client_key, authenticated):
+    async def server_side(reader, writer):
+        await _deliver_challenge(reader, writer, b'secret')
+        await _answer_challenge(reader, writer, b'secret')
+
+    async def client_side(reader, writer):
+        await _answer_challenge(reader, writer, client_key)
+        await _deliver_challenge(reader, writer, client_key)
+
+    results = run_pair(server_side, client_side)
+    if authenticated:
+        assert results == {'server': None, 'client': None}
+    else:
+        assert isinstance(results['server'], AuthenticationError)
+
+
+def test_server_needs_authkey():
+    with pytest.raises(ValueError):
+        asyncio.run(start_server('localhost', 0))
+
+
+def test_server_reports_bad_payload():
+    async def run():
+        server = await start_server('localhost', 0, authkey=b'secret')
+        reader, writer = await asyncio.open_connection('localhost', server.sockets[0].getsockname()[1])
+        try:
+            await _answer_challenge(reader, writer, b'secret')
+            await _deliver_challenge(reader, writer, b'secret')
+            await _send(writer, ('setup', 'not a setup'))
+            return await _recv(reader)
+        finally:
+            writer.close()
+            server.close()
+            await server.wait_closed()
+
+    message = asyncio.run(run())
+    assert message[0] == 'error'
+    assert 'TypeError' in message[1]
@@ -0,0 +1,45 @@
+import pytest
+
+pytest.importorskip('seal')
+
+from seal_regression.fractions_utils import FracContext, FractionalDecryptorUtils, FractionalEncoderUtils
+from seal_regression.encarray import EncArray
+from seal_regression.gradient import ResidualGradientEngine
+from seal_regression.sharded import ShardedGradientEngine
+
+import numpy as np
+
+
+@pytest.fixture(scope='module')
+def context():
+    return FracContext(verbose=False)
+
+
+@pytest.fixture(scope='module')
+def encode_utils(context):
+    return FractionalEncoderUtils(context)
+
+
+@pytest.fixture(scope='module')
+def decode_utils(context):
+    return FractionalDecryptorUtils(context)
+
+
+@pytest.mark.parametrize('n_shards, expected_shards', [(2, 2), (5, 3)])
+def test_matches_residual_engine(encode_utils, decode_utils, n_shards, expected_shards):
+    rng = np.random.RandomState(0)
+    X = np.hstack([rng.uniform(-1, 1, (3, 1)), np.ones((3, 1))])
+    y = (X @ np.array([0.5, 0.2])).reshape(-1, 1)
+    weights = np.array([0.25, -0.5])
+    X_enc, y_enc = EncArray.from_numpy(X, encode_utils), EncArray.from_numpy(y, encode_utils)
+    weights_enc = EncArray.from_numpy(weights, encode_utils)
+
+    serial = ResidualGradientEngine(X_enc, y_enc)
+    expected = serial.gradient(weights_enc).decrypt_array(decode_utils)
+    # More shards than rows are clamped, every shard gets at least one row
+    with ShardedGradientEngine(X_enc, y_enc, n_shards=n_shards) as engine:
+        assert engine.n_shards == expected_shards
+        gradient = engine.gradient(weights_enc).decrypt_array(decode_utils)
+        assert engine.last_op_counts['multiply'] == serial.last_op_counts['multiply']
+    np.testing.assert_allclose(gradient, expected, atol=1e-6)
+    np.testing.assert_allclose(gradient, X.T @ (X @ weights - y[:, 0]), atol=1e-6)
@@ -0,0 +1,109 @@
+from seal_regression.linear_regression import SecureLinearRegression
+from seal_regression.optimizers import ChebyshevInverse, DiagonalPreconditioned, GradientDescent, Nesterov
+from seal_regression.refresh import KeyHolderRefresher
+from seal_regression.simulation import SimArray, SimUtils
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def dataset():
+    rng = np.random.RandomState(0)
+    X = np.hstack([rng.randn(10, 1), np.ones((10, 1))])
+    y = X @ np.array([0.5, 0.2]) + 0.1 * rng.randn(10)
+    return X, y.reshape(-1, 1)
+
+
+@pytest.fixture
+def sim_utils():
+    return SimUtils()
+
+
+def unencrypted_weights(X, y, n_iter, lr=0.2, optimizer=None):
+    model = SecureLinearRegression()
+    model.fit_unencrypted(X, y, lr=lr, n_iter=n_iter, optimizer=optimizer)
+    return model.weigths
+
+
+@pytest.mark.parametrize('mode', ['residual', 'gram'])
+def test_fit_matches_unencrypted(dataset, sim_utils, mode):
+    X, y = dataset
+    model = SecureLinearRegression()
+    model.fit(SimArray(X, sim_utils), SimArray(y, sim_utils), n_iter=5, mode=mode)
+    np.testing.assert_allclose(model.weigths.decrypt_array(), unencrypted_weights(X, y, 5), atol=1e-8)
+    assert len(model.history) == 5
+
+
+def test_noise_budget_follows_measurements(dataset, sim_utils):
+    # notebooks/perfromance_results.ipynb: 1071, 979, 886 bits after the first iterations (N = 1024, 20 primes)
+    X, y = dataset
+    budgets = []
+    for n_iter in (1, 2, 3):
+        model = SecureLinearRegression()
+        model.fit(SimArray(X, sim_utils), SimArray(y, sim_utils), n_iter=n_iter)
+        budgets.append(np.min(model.weigths.noise_budget()))
+    np.testing.assert_allclose(budgets, [1071, 979, 886], atol=5)
+
+
+def test_coefficient_overflow_and_refresh(dataset, sim_utils):
+    X, y = dataset
+    model = SecureLinearRegression()
+    model.fit(SimArray(X, sim_utils), SimArray(y, sim_utils), n_iter=7)
+    assert not np.isnan(model.weigths.decrypt_array()).any()
+
+    model.fit(SimArray(X, sim_utils), SimArray(y, sim_utils), n_iter=12)
+    assert np.isnan(model.weigths.decrypt_array()).all()
+
+    cost = GradientDescent(0.2).step_cost(sim_utils, *X.shape, max_value=max(np.abs(X).max(), np.abs(y).max()))
+    refresher = KeyHolderRefresher(sim_utils, sim_utils, max_iterations=cost['max_steps'])
+    model.fit(SimArray(X, sim_utils), SimArray(y, sim_utils), n_iter=12, refresher=refresher)
+    assert cost['max_steps'] < 12 and refresher.n_refreshes == 1
+    np.testing.assert_allclose(model.weigths.decrypt_array(), unencrypted_weights(X, y, 12), atol=1e-8)
+
+
+def test_predict(dataset, sim_utils):
+    X, y = dataset
+    model = SecureLinearRegression()
+    model.fit(SimArray(X, sim_utils), SimArray(y, sim_utils), n_iter=3)
+    prediction = model.predict(SimArray(X, sim_utils)).decrypt_array()
+    np.testing.assert_allclose(prediction, X @ model.weigths.decrypt_array(), atol=1e-8)
+
+
+def test_fit_stream(dataset, sim_utils):
+    X, y = dataset
+    batches = [(SimArray(X[start:start + 5], sim_utils), SimArray(y[start:start + 5], sim_utils))
+               for start in (0, 5)]
+    model = SecureLinearRegression()
+    model.fit_stream(batches, lr=0.2, prefetch=0)
+
+    weights = np.zeros(X.shape[1])
+    for start in (0, 5):
+        X_batch, y_batch = X[start:start + 5], y[start:start + 5, 0]
+        weights = weights - 0.2 / 5 * X_batch.T @ (X_batch @ weights - y_batch)
+    np.testing.assert_allclose(model.weigths.decrypt_array(), weights, atol=1e-8)
+
+
+@pytest.mark.parametrize('make_optimizer', [
+    lambda X: GradientDescent(0.3),
+    lambda X: DiagonalPreconditioned(DiagonalPreconditioned.scales(X), lr=0.5),
+    lambda X: ChebyshevInverse((0.5, 2.0), 4),
+    lambda X: Nesterov(0.3, momentum=0.5),
+])
+def test_optimizers(dataset, sim_utils, make_optimizer):
+    X, y = dataset
+    model = SecureLinearRegression()
+    model.fit(SimArray(X, sim_utils), SimArray(y, sim_utils), n_iter=4, optimizer=make_optimizer(X))
+    expected = unencrypted_weights(X, y, 4, optimizer=make_optimizer(X))
+    np.testing.assert_allclose(model.weigths.decrypt_array(), expected, atol=1e-8)
+
+
+@pytest.mark.parametrize('optimizer', [GradientDescent(0.3), Nesterov(0.3, momentum=0.5)])
+def test_step_cost_bounds_coefficient_growth(dataset, sim_utils, optimizer):
+    X, y = dataset
+    cost = optimizer.step_cost(sim_utils, *X.shape, max_value=np.abs(X).max())
+    assert not hasattr(optimizer, 'n_samples')
+    for n_iter, valid in ((cost['max_steps'], True), (cost['max_steps'] + 1, False)):
+        model = SecureLinearRegression()
+        model.fit(SimArray(X, sim_utils), SimArray(y, sim_utils), n_iter=n_iter, optimizer=optimizer)
+        assert not np.isnan(model.weigths.decrypt_array()).any() == valid
@@ -0,0 +1,29 @@
+from seal_regression.storage import _flat_indices
+
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize('shape, item', [
+    ((5, 3), 2),
+    ((5, 3), -1),
+    ((5, 3), slice(1, 4)),
+    ((5, 3), (slice(None), 1)),
+    ((5, 3), (slice(None, None, -2), slice(1, None))),
+    ((5, 3), (slice(7, 9), 0)),
+    ((5, 3), Ellipsis),
+    ((4, 3, 2), (Ellipsis, 1)),
+    ((4, 3, 2), (1, Ellipsis, slice(0, 1))),
+    ((), Ellipsis),
+])
+def test_flat_indices_match_numpy(shape, item):
+    expected = np.arange(int(np.prod(shape))).reshape(shape)[item]
+    indices = _flat_indices(shape, item)
+    assert indices.shape == expected.shape
+    np.testing.assert_array_equal(indices, expected)
+
+
+@pytest.mark.parametrize('item', [5, -6, (0, 0, 0), (Ellipsis, Ellipsis)])
+def test_flat_indices_errors(item):
+    with pytest.raises(IndexError):
+        _flat_indices((5, 3), item)
@@ -0,0 +1,56 @@
+from seal_regression.simulation import SimArray, SimUtils
+from seal_regression.stream import prefetched, rebatch
+
+import numpy as np
+import pytest
+import threading
+import time
+
+
+def test_rebatch_splits_and_merges():
+    sim_utils = SimUtils()
+    X = np.arange(14, dtype=float).reshape(7, 2)
+    y = np.arange(7, dtype=float).reshape(-1, 1)
+    batches = [(SimArray(X[start:stop], sim_utils), SimArray(y[start:stop], sim_utils))
+               for start, stop in ((0, 1), (1, 2), (2, 7))]
+    result = list(rebatch(batches, 3))
+    assert [len(X_batch) for X_batch, _ in result] == [3, 3, 1]
+    np.testing.assert_allclose(np.vstack([X_batch.decrypt_array() for X_batch, _ in result]), X)
+    np.testing.assert_allclose(np.vstack([y_batch.decrypt_array() for _, y_batch in result]), y)
+    with pytest.raises(ValueError):
+        list(rebatch(batches, 0))
+
+
+def test_prefetched_order():
+    assert list(prefetched(range(5), depth=2)) == list(range(5))
+    assert list(prefetched(range(5), depth=0)) == list(range(5))
+
+
+def test_prefetched_reraises():
+    def items():
+        yield 1
+        raise KeyError('broken batch')
+
+    consumed = []
+    with pytest.raises(KeyError):
+        for item in prefetched(items()):
+            consumed.append(item)
+    assert consumed == [1]
+
+
+def test_prefetched_stops_loading():
+    loaded = []
+
+    def items():
+        for i in range(100):
+            loaded.append(i)
+            yield i
+
+    n_threads = threading.active_count()
+    for item in prefetched(items(), depth=2):
+        if item == 1:
+            break
+    # Besides the consumed items, at most depth items were loaded ahead, and the loader gives up
+    time.sleep(0.3)
+    assert len(loaded) <= 4
+    assert threading.active_count() == n_threads